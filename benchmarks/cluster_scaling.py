@@ -0,0 +1,59 @@
+"""Measure order entry throughput of the cluster against the number of workers.
+
+Usage: python -m benchmarks.cluster_scaling [orders_per_pair] [--pairs N]
+"""
+import argparse
+import asyncio
+import time
+
+from exchange.core.cluster import ClusterExchange
+from exchange.core.entities import SymbolPair
+from exchange.core.entities.order import Order
+
+
+CLIENTS_PER_PAIR = 16
+
+
+async def trade(exchange: ClusterExchange, pair: SymbolPair, orders_number: int) -> None:
+    for i in range(orders_number):
+        side = Order.Side.Buy if i % 2 else Order.Side.Sell
+        await exchange.create_limit(pair, 1 + i % 10, side, 1, "benchmark")
+
+
+async def run(workers_number: int, pairs_number: int, orders_per_pair: int) -> float:
+    exchange = ClusterExchange(workers_number)
+    balances = {}
+    pairs = [SymbolPair(f"base{i}", "quote") for i in range(pairs_number)]
+    for pair in pairs:
+        exchange.create_pair(pair)
+        balances[pair.Base] = 10.0 ** 9
+    balances["quote"] = 10.0 ** 12
+    exchange.create_acc("benchmark", balances)
+    await exchange.start()
+
+    orders_per_client = orders_per_pair // CLIENTS_PER_PAIR
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            trade(exchange, pair, orders_per_client)
+            for pair in pairs
+            for _ in range(CLIENTS_PER_PAIR)
+        )
+    )
+    elapsed = time.perf_counter() - started
+    await exchange.stop()
+    return pairs_number * orders_per_client * CLIENTS_PER_PAIR / elapsed
+
+
+def main(orders_per_pair: int, pairs_number: int) -> None:
+    for workers_number in (1, 2, 4, 8):
+        throughput = asyncio.run(run(workers_number, pairs_number, orders_per_pair))
+        print(f"workers: {workers_number:3d}  throughput: {throughput:10.0f} orders/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("orders_per_pair", type=int, nargs="?", default=2000)
+    parser.add_argument("--pairs", type=int, default=8)
+    arguments = parser.parse_args()
+    main(arguments.orders_per_pair, arguments.pairs)
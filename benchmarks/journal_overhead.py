@@ -0,0 +1,73 @@
+"""Compare order entry throughput with and without the command journal.
+
+Usage: python -m benchmarks.journal_overhead [orders_number] [--clients N] [--repeats N]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import typing as t
+from contextlib import suppress
+
+from exchange.core.entities import SymbolPair
+from exchange.core.entities.order import Order
+from exchange.core.exchange import Exchange
+from exchange.core.journal import Journal
+
+
+PAIR = SymbolPair("btc", "usdt")
+
+
+async def trade(exchange: Exchange, orders_number: int) -> None:
+    for i in range(orders_number):
+        side = Order.Side.Buy if i % 2 else Order.Side.Sell
+        await exchange.create_limit(PAIR, 1 + i % 10, side, 1, "benchmark")
+
+
+async def run(orders_number: int, clients: int, path: t.Optional[str]) -> float:
+    exchange = Exchange()
+    exchange.create_pair(PAIR)
+    exchange.create_acc("benchmark", dict(btc=10.0 ** 9, usdt=10.0 ** 12))
+    journal = None
+    if path is not None:
+        exchange.journal = journal = Journal(path)
+        journal.start()
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(trade(exchange, orders_number // clients) for _ in range(clients))
+    )
+    elapsed = time.perf_counter() - started
+    if journal is not None:
+        exchange.journal = None
+        await journal.stop()
+    return orders_number // clients * clients / elapsed
+
+
+def main(orders_number: int, clients: int, repeats: int) -> None:
+    # runs alternate and the best of each is taken, so a slow period of the host
+    # doesn't count against one of them
+    baseline = throughput = 0.0
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "journal")
+        for _ in range(repeats):
+            baseline = max(baseline, asyncio.run(run(orders_number, clients, None)))
+            with suppress(FileNotFoundError):
+                os.remove(path)
+            throughput = max(
+                throughput, asyncio.run(run(orders_number, clients, path))
+            )
+        size = os.path.getsize(path)
+    print(f"without journal: {baseline:10.0f} orders/s")
+    print(f"with journal:    {throughput:10.0f} orders/s")
+    print(f"overhead: {(1 - throughput / baseline) * 100:.1f}%  journal: {size} bytes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("orders_number", type=int, nargs="?", default=50000)
+    parser.add_argument("--clients", type=int, default=256)
+    parser.add_argument("--repeats", type=int, default=5)
+    arguments = parser.parse_args()
+    main(arguments.orders_number, arguments.clients, arguments.repeats)
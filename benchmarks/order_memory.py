@@ -0,0 +1,44 @@
+"""Report memory used by resting orders.
+
+Usage: python -m benchmarks.order_memory [orders_number]
+"""
+import sys
+import tracemalloc
+from collections import defaultdict
+
+from exchange.core.entities import SymbolPair
+from exchange.core.entities.account import Account
+from exchange.core.entities.order import Order
+from exchange.core.entities.order_book import OrderBook
+
+
+def measure(orders_number: int) -> None:
+    pair = SymbolPair("btc", "usdt")
+    account = Account(name="benchmark", balance=defaultdict(float), open_orders={})
+
+    tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot()
+
+    orders = [
+        Order(1.5, Order.Side.Sell, pair, account, Order.Type.Limit, 1 + i % 1000)
+        for i in range(orders_number)
+    ]
+    orders_size = tracemalloc.get_traced_memory()[0]
+
+    order_book = OrderBook()
+    for order in orders:
+        order_book.add(order)
+    book_size = tracemalloc.get_traced_memory()[0]
+
+    stats = tracemalloc.take_snapshot().compare_to(snapshot, "lineno")
+    tracemalloc.stop()
+
+    print(f"orders: {orders_number}")
+    print(f"order records: {orders_size / orders_number:.1f} bytes/order")
+    print(f"resting in book: {book_size / orders_number:.1f} bytes/order")
+    for stat in stats[:5]:
+        print(stat)
+
+
+if __name__ == "__main__":
+    measure(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,60 @@
+"""Measure order entry throughput against the number of active symbol pairs.
+
+Usage: python -m benchmarks.pair_scaling [orders_per_pair] [--sequenced]
+"""
+import argparse
+import asyncio
+import time
+
+from exchange.core.entities import SymbolPair
+from exchange.core.entities.order import Order
+from exchange.core.exchange import Exchange
+
+
+CLIENTS_PER_PAIR = 4
+
+
+async def trade(exchange: Exchange, pair: SymbolPair, orders_number: int) -> None:
+    for i in range(orders_number):
+        side = Order.Side.Buy if i % 2 else Order.Side.Sell
+        await exchange.create_limit(pair, 1 + i % 10, side, 1, "benchmark")
+
+
+async def run(pairs_number: int, orders_per_pair: int, sequenced: bool) -> float:
+    exchange = Exchange()
+    balances = {}
+    pairs = [SymbolPair(f"base{i}", "quote") for i in range(pairs_number)]
+    for pair in pairs:
+        exchange.create_pair(pair)
+        balances[pair.Base] = 10.0 ** 9
+    balances["quote"] = 10.0 ** 12
+    exchange.create_acc("benchmark", balances)
+    if sequenced:
+        exchange.start_sequencers()
+
+    orders_per_client = orders_per_pair // CLIENTS_PER_PAIR
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            trade(exchange, pair, orders_per_client)
+            for pair in pairs
+            for _ in range(CLIENTS_PER_PAIR)
+        )
+    )
+    elapsed = time.perf_counter() - started
+    await exchange.stop_sequencers()
+    return pairs_number * orders_per_client * CLIENTS_PER_PAIR / elapsed
+
+
+def main(orders_per_pair: int, sequenced: bool) -> None:
+    for pairs_number in (1, 2, 4, 8, 16):
+        throughput = asyncio.run(run(pairs_number, orders_per_pair, sequenced))
+        print(f"pairs: {pairs_number:3d}  throughput: {throughput:10.0f} orders/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("orders_per_pair", type=int, nargs="?", default=2000)
+    parser.add_argument("--sequenced", action="store_true")
+    arguments = parser.parse_args()
+    main(arguments.orders_per_pair, arguments.sequenced)
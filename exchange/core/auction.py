@@ -0,0 +1,190 @@
+import typing as t
+from enum import Enum, auto
+
+import numpy as np
+
+from .entities.fixed_point import quote_units
+from .entities.order import Order
+from .match_model import MatchReport, MatchReportType, ReportOwnerType
+
+
+class Allocation(Enum):
+    # orders of the marginal price level are filled in the order they came
+    Time = auto()
+    # the marginal price level is shared in proportion to order amounts
+    ProRata = auto()
+
+
+class Clearing(t.NamedTuple):
+    # uniform price of the auction, None if nothing is executable
+    price_ticks: t.Optional[int]
+    volume_lots: int
+
+
+class _Side(t.NamedTuple):
+    # price ticks, left lots and orders of a side in the order they came
+    prices: np.ndarray
+    lots: np.ndarray
+    orders: t.List[Order]
+
+
+class CallAuction:
+    """Limit orders of a pair collected until the auction is uncrossed.
+
+    All executable orders are matched at once at the uniform clearing price,
+    which maximises executed volume. Orders better than the clearing price
+    are filled first, the marginal price level is allocated by ``allocation``.
+    Orders which were not filled stay in the auction for the next uncross.
+    """
+
+    allocation: Allocation
+
+    # orders in the order they came to the auction
+    _orders: t.Dict[int, Order]
+
+    def __init__(
+        self,
+        allocation: Allocation = Allocation.Time,
+        orders: t.Iterable[Order] = (),
+    ) -> None:
+        self.allocation = allocation
+        self._orders = {order.order_id: order for order in orders}
+
+    def add(self, order: Order) -> None:
+        order.mark_opened()
+        self._orders[order.order_id] = order
+
+    def cancel(self, order_id: int) -> t.Optional[Order]:
+        return self._orders.pop(order_id, None)
+
+    def cancel_many(self, order_ids: t.Iterable[int]) -> t.List[Order]:
+        orders = (self._orders.pop(order_id, None) for order_id in order_ids)
+        return [order for order in orders if order is not None]
+
+    def clear(self) -> t.List[Order]:
+        orders = list(self._orders.values())
+        self._orders.clear()
+        return orders
+
+    def clearing(self) -> Clearing:
+        return _clearing(self._side(Order.Side.Buy), self._side(Order.Side.Sell))
+
+    def uncross(self) -> t.Tuple[Clearing, t.List[MatchReport]]:
+        # every order is resting, so reports of an auction have only makers
+        buys = self._side(Order.Side.Buy)
+        sells = self._side(Order.Side.Sell)
+        clearing = price, volume = _clearing(buys, sells)
+        if price is None:
+            return clearing, []
+
+        reports = []
+        for side, is_buy in ((buys, True), (sells, False)):
+            lots = _allocate(side, is_buy, price, volume, self.allocation)
+            for index in np.flatnonzero(lots):
+                order = side.orders[index]
+                base_matched = int(lots[index])
+                order.filled_lots += base_matched
+
+                match_type = MatchReportType.Partial
+                if order.filled_lots == order.amount_lots:
+                    order.mark_closed()
+                    match_type = MatchReportType.Full
+                    del self._orders[order.order_id]
+
+                reports.append(
+                    MatchReport(
+                        ReportOwnerType.Maker,
+                        match_type,
+                        order,
+                        quote_units(base_matched, price),
+                        base_matched,
+                    )
+                )
+
+        return clearing, reports
+
+    def _side(self, side: Order.Side) -> _Side:
+        orders = [order for order in self._orders.values() if order.side == side]
+        prices = (order.price_ticks for order in orders)
+        lots = (order.left_lots for order in orders)
+        return _Side(
+            np.fromiter(prices, np.int64, len(orders)),
+            np.fromiter(lots, np.int64, len(orders)),
+            orders,
+        )
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __iter__(self) -> t.Iterator[Order]:
+        return iter(self._orders.values())
+
+
+def _clearing(buys: _Side, sells: _Side) -> Clearing:
+    if not buys.orders or not sells.orders:
+        return Clearing(None, 0)
+
+    # demand and supply curves at every price of the auction
+    prices = np.unique(np.concatenate((buys.prices, sells.prices)))
+
+    order = np.argsort(buys.prices)
+    cum_buys = np.concatenate(([0], np.cumsum(buys.lots[order])))
+    demand = cum_buys[-1] - cum_buys[np.searchsorted(buys.prices[order], prices)]
+
+    order = np.argsort(sells.prices)
+    cum_sells = np.concatenate(([0], np.cumsum(sells.lots[order])))
+    supply = cum_sells[np.searchsorted(sells.prices[order], prices, side="right")]
+
+    volume = np.minimum(demand, supply)
+    best_volume = volume.max()
+    if best_volume == 0:
+        return Clearing(None, 0)
+
+    # maximal volume, then minimal imbalance, then the middle of the remaining range
+    imbalance = np.where(volume == best_volume, np.abs(demand - supply), np.inf)
+    candidates = np.flatnonzero(imbalance == imbalance.min())
+    price = prices[candidates[(len(candidates) - 1) // 2]]
+    return Clearing(int(price), int(best_volume))
+
+
+def _allocate(
+    side: _Side, is_buy: bool, price: int, volume: int, allocation: Allocation
+) -> np.ndarray:
+    # lots filled of every order of the side
+    prices, lots = side.prices, side.lots
+    fills = np.zeros_like(lots)
+    eligible = np.flatnonzero(prices >= price if is_buy else prices <= price)
+    if not len(eligible):
+        return fills
+
+    # price priority, then time priority by the stable sort
+    keys = -prices[eligible] if is_buy else prices[eligible]
+    order = eligible[np.argsort(keys, kind="stable")]
+    sorted_prices = prices[order]
+    sorted_lots = lots[order]
+    cum_lots = np.cumsum(sorted_lots)
+    before = cum_lots - sorted_lots
+
+    if allocation == Allocation.Time:
+        fills[order] = np.clip(volume - before, 0, sorted_lots)
+        return fills
+
+    # whole levels are filled by price priority, the marginal one is shared pro rata
+    starts = np.flatnonzero(
+        np.concatenate(([True], sorted_prices[1:] != sorted_prices[:-1]))
+    )
+    ends = np.append(starts[1:], len(order))
+    level_totals = cum_lots[ends - 1] - before[starts]
+    level_fills = np.clip(volume - before[starts], 0, level_totals)
+
+    levels = np.repeat(np.arange(len(starts)), ends - starts)
+    # python integers, since the product of lots overflows 64 bits
+    shares = (
+        sorted_lots.astype(object) * level_fills[levels] // level_totals[levels]
+    ).astype(np.int64)
+
+    # lots lost by rounding down are given one by one by time priority
+    rests = level_fills - np.add.reduceat(shares, starts)
+    positions = np.arange(len(order)) - starts[levels]
+    fills[order] = shares + (positions < rests[levels])
+    return fills
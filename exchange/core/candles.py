@@ -0,0 +1,157 @@
+import typing as t
+
+import numpy as np
+
+from .errors import BadRequest
+from .match_model import Trade
+
+
+# milliseconds of supported candle intervals
+INTERVALS: t.Dict[str, int] = {
+    "1s": 1000,
+    "1m": 60 * 1000,
+    "5m": 5 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+    "1d": 24 * 60 * 60 * 1000,
+}
+
+BAR = np.dtype(
+    [
+        ("open_time", np.int64),
+        ("open", np.float64),
+        ("high", np.float64),
+        ("low", np.float64),
+        ("close", np.float64),
+        ("volume", np.float64),
+        ("quote_volume", np.float64),
+        ("trades", np.int64),
+    ]
+)
+
+# open, high, low, close, volume, quote volume and number of trades
+Summary = t.Tuple[float, float, float, float, float, float, int]
+
+
+def summarize(trades: t.Sequence[Trade]) -> Summary:
+    # trades of a match share the time, so statistics are updated once per match
+    prices = [trade[0] for trade in trades]
+    return (
+        prices[0],
+        max(prices),
+        min(prices),
+        prices[-1],
+        sum(trade[1] for trade in trades),
+        sum(trade[0] * trade[1] for trade in trades),
+        len(trades),
+    )
+
+
+class CandleSeries:
+    """OHLCV bars of one interval in a ring buffer of ``capacity`` bars.
+
+    Every bar is written twice, at its position and ``capacity`` rows later,
+    so the last bars are always a contiguous slice of the buffer. Bars
+    are created by trades only, intervals without trades have no bar.
+    """
+
+    interval_ms: int
+    capacity: int
+
+    _bars: np.ndarray
+    # number of bars opened so far
+    _count: int
+    # the last bar, updated as a python list and copied to the buffer
+    _current: t.List[float]
+
+    def __init__(self, interval_ms: int, capacity: int = 1000) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity has to be positive")
+
+        self.interval_ms = interval_ms
+        self.capacity = capacity
+        self._bars = np.zeros(2 * capacity, BAR)
+        self._count = 0
+        self._current = []
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def add(self, time_ms: int, summary: Summary) -> None:
+        _, high, low, close, volume, quote_volume, trades = summary
+        open_time = time_ms - time_ms % self.interval_ms
+
+        bar = self._current
+        # trades of an earlier time, e.g. after a clock step back, update the last bar
+        if not bar or open_time > bar[0]:
+            self._count += 1
+            bar[:] = [open_time, *summary]
+        else:
+            bar[2] = max(bar[2], high)
+            bar[3] = min(bar[3], low)
+            bar[4] = close
+            bar[5] += volume
+            bar[6] += quote_volume
+            bar[7] += trades
+
+        position = (self._count - 1) % self.capacity
+        row = tuple(bar)
+        self._bars[position] = row
+        self._bars[position + self.capacity] = row
+
+    def last(
+        self,
+        limit: int,
+        start_ms: t.Optional[int] = None,
+        end_ms: t.Optional[int] = None,
+    ) -> np.ndarray:
+        # read only view of up to `limit` latest bars opened in [start_ms, end_ms]
+        size = len(self)
+        end = (self._count - 1) % self.capacity + self.capacity + 1
+        bars = self._bars[end - size : end]
+
+        if start_ms is not None or end_ms is not None:
+            open_times = bars["open_time"]
+            first, stop = 0, size
+            if start_ms is not None:
+                first = int(np.searchsorted(open_times, start_ms))
+            if end_ms is not None:
+                stop = int(np.searchsorted(open_times, end_ms, side="right"))
+            bars = bars[first:stop]
+            # the earliest bars of the range are served first, like in a scan
+            if start_ms is not None:
+                bars = bars[:limit]
+
+        bars = bars[max(len(bars) - limit, 0) :]
+        bars.flags.writeable = False
+        return bars
+
+
+class Candles:
+    """Candle series of every supported interval of a pair."""
+
+    series: t.Dict[str, CandleSeries]
+
+    def __init__(self, capacity: int = 1000) -> None:
+        self.series = {
+            name: CandleSeries(interval_ms, capacity)
+            for name, interval_ms in INTERVALS.items()
+        }
+
+    def add(self, time_ms: int, summary: Summary) -> None:
+        for series in self.series.values():
+            series.add(time_ms, summary)
+
+    def last(
+        self,
+        interval: str,
+        limit: int,
+        start_ms: t.Optional[int] = None,
+        end_ms: t.Optional[int] = None,
+    ) -> np.ndarray:
+        try:
+            series = self.series[interval]
+        except KeyError:
+            raise BadRequest(
+                f"Interval expected one of {', '.join(INTERVALS)}, got {interval}"
+            )
+        return series.last(limit, start_ms, end_ms)
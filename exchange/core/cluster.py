@@ -0,0 +1,654 @@
+"""Matching spread over engine worker processes.
+
+Every worker process owns order books of a group of symbol pairs and runs
+MatchModel on them in its own interpreter, so pairs of different groups are
+matched in parallel. The gateway process stays the owner of the ledger:
+funds are frozen before a command is forwarded to the worker and match
+reports sent back by the worker are applied to balances in the order the
+worker produced them.
+"""
+import asyncio
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import typing as t
+from functools import partial
+from multiprocessing.connection import Connection
+
+from .auction import Allocation
+from .commands import Command, CommandResult
+from .entities.account import Account
+from .entities.balance import Balance
+from .entities.order import Order
+from .entities.order_book import Depth, OrderBook
+from .entities.order_id import OrderIdGenerator
+from .entities.symbol_pair import SymbolPair
+from .errors import (
+    AuctionError,
+    ExchangeNotAvailable,
+    InsufficientFunds,
+    OrderCancellationError,
+    OrderCreationError,
+    PairAlreadyExisted,
+    PairDeletionError,
+    UnsupportedPairs,
+)
+from .exchange import BookChange, Exchange, ExchangeEvent, LevelAmount
+from .journal import Kind
+from .match_model import (
+    MatchModel,
+    MatchReport,
+    MatchReportType,
+    ReportOwnerType,
+)
+
+
+T = t.TypeVar("T")
+
+# owner type, match type, order id, quote units and base lots of a match report
+RawReport = t.Tuple[ReportOwnerType, MatchReportType, int, int, int]
+# taker status, quote units required by market buy, reports of the match,
+# version of the order book and amounts of the levels changed by the match
+RawMatch = t.Tuple[Order.Status, int, t.List[RawReport], int, t.List[LevelAmount]]
+# applies (is succeeded, payload) response of a worker to the gateway state
+ResultHandler = t.Callable[[bool, t.Any], t.Awaitable[T]]
+
+# accounts are known only to the gateway, orders of engine refer to this stub
+_REMOTE_ACCOUNT = Account(name="", balance=Balance(), open_orders={})
+# attempts of a market buy to reserve funds for asks changing under it
+_MARKET_BUY_ATTEMPTS = 3
+
+
+class StaleEstimate(Exception):
+    """Asks became more expensive than the funds reserved for a market buy."""
+
+    @property
+    def required(self) -> int:
+        return t.cast(int, self.args[0])
+
+
+class Engine:
+    """Order books of the pairs served by one worker process."""
+
+    order_books: t.Dict[SymbolPair, OrderBook]
+
+    def __init__(self) -> None:
+        self.order_books = {}
+
+    def create_pair(self, pair: SymbolPair) -> None:
+        self.order_books[pair] = OrderBook()
+
+    def delete_pair(self, pair: SymbolPair) -> None:
+        self.order_books.pop(pair, None)
+
+    def clear_order_book(self, pair: SymbolPair) -> None:
+        self.order_books[pair] = OrderBook()
+
+    def depth(self, pair: SymbolPair, limit: int) -> Depth:
+        return self._order_book(pair).depth(limit)
+
+    def estimate(self, pair: SymbolPair, amount_lots: int) -> int:
+        # quote units a market buy of `amount_lots` costs at the moment
+        return self._order_book(pair).Asks.sweep_base(amount_lots).quote
+
+    def cancel(self, pair: SymbolPair, order_id: int) -> t.Optional[BookChange]:
+        # None if the order is not in the book anymore
+        order_book = self._order_book(pair)
+        order = order_book.cancel(order_id)
+        if order is None:
+            return None
+        return self._book_change(order_book, (order,))
+
+    def cancel_many(
+        self, pair: SymbolPair, order_ids: t.Optional[t.List[int]]
+    ) -> t.Tuple[t.List[int], BookChange]:
+        # without order ids all orders of the pair are cancelled
+        order_book = self._order_book(pair)
+        if order_ids is None:
+            orders = order_book.clear()
+        else:
+            orders = order_book.cancel_many(order_ids)
+        return (
+            [order.order_id for order in orders],
+            self._book_change(order_book, orders),
+        )
+
+    def limit(
+        self,
+        pair: SymbolPair,
+        order_id: int,
+        side: Order.Side,
+        price_ticks: int,
+        amount_lots: int,
+    ) -> RawMatch:
+        order_book = self._order_book(pair)
+        order = self._order(pair, order_id, side, Order.Type.Limit, amount_lots)
+        order.price_ticks = price_ticks
+
+        reports = MatchModel.limit_match_sync(order, order_book)
+        return self._result(order_book, order, 0, reports)
+
+    def market(
+        self,
+        pair: SymbolPair,
+        order_id: int,
+        side: Order.Side,
+        amount_lots: int,
+        funds: int,
+    ) -> RawMatch:
+        order_book = self._order_book(pair)
+        order = self._order(pair, order_id, side, Order.Type.Market, amount_lots)
+
+        # gateway reserved `funds` by an estimate, asks could change since then
+        required = 0
+        if side == Order.Side.Buy:
+            required = order_book.Asks.sweep_base(amount_lots).quote
+            if required > funds:
+                raise StaleEstimate(required)
+
+        reports = MatchModel.market_match_sync(order, order_book)
+        return self._result(order_book, order, required, reports)
+
+    def _order_book(self, pair: SymbolPair) -> OrderBook:
+        try:
+            return self.order_books[pair]
+        except KeyError:
+            raise UnsupportedPairs("Pair is not supported")
+
+    @staticmethod
+    def _order(
+        pair: SymbolPair,
+        order_id: int,
+        side: Order.Side,
+        order_type: Order.Type,
+        amount_lots: int,
+    ) -> Order:
+        order = Order(0, side, pair, _REMOTE_ACCOUNT, order_type, order_id=order_id)
+        order.amount_lots = amount_lots
+        return order
+
+    @classmethod
+    def _result(
+        cls,
+        order_book: OrderBook,
+        taker: Order,
+        required: int,
+        reports: t.List[MatchReport],
+    ) -> RawMatch:
+        orders = itertools.chain((taker,), (report.order for report in reports))
+        version, amounts = cls._book_change(order_book, orders)
+        return taker.status, required, cls._dump(reports), version, amounts
+
+    @staticmethod
+    def _book_change(order_book: OrderBook, orders: t.Iterable[Order]) -> BookChange:
+        # the gateway has no order books, so amounts of changed levels are sent
+        levels = {
+            (order.side, order.price_ticks)
+            for order in orders
+            if order.price_ticks is not None
+        }
+        amounts = [
+            (side, price, order_book.level_amount(side, price)) for side, price in levels
+        ]
+        return order_book.version, amounts
+
+    @staticmethod
+    def _dump(reports: t.List[MatchReport]) -> t.List[RawReport]:
+        return [
+            (
+                report.owner_type,
+                report.match_type,
+                report.order.order_id,
+                report.quote_matched,
+                report.base_matched,
+            )
+            for report in reports
+        ]
+
+
+def serve(requests: Connection, responses: Connection) -> None:
+    """Entry point of an engine worker process."""
+    engine = Engine()
+
+    # requests are drained by a thread, so the gateway is never blocked on sending
+    # while the worker is blocked on sending responses the gateway doesn't read
+    inbox: "queue.SimpleQueue[t.Any]" = queue.SimpleQueue()
+
+    def receive() -> None:
+        while True:
+            try:
+                message = requests.recv()
+            except EOFError:
+                message = None
+            inbox.put(message)
+            if message is None:
+                return
+
+    threading.Thread(target=receive, daemon=True).start()
+
+    while True:
+        message = inbox.get()
+        if message is None:
+            break
+
+        request_id, command, arguments = message
+        try:
+            response = (request_id, True, getattr(engine, command)(*arguments))
+        except Exception as e:
+            response = (request_id, False, e)
+        responses.send(response)
+
+
+async def unwrap(is_succeeded: bool, payload: t.Any) -> t.Any:
+    if not is_succeeded:
+        raise payload
+    return payload
+
+
+class EngineWorker:
+    """Gateway side of an engine worker process.
+
+    Responses are applied one by one by a single task in the order they are
+    received, therefore the ledger follows the sequence of matches of the worker.
+    """
+
+    pairs: t.Set[SymbolPair]
+
+    _process: t.Any
+    _requests: Connection
+    _responses: Connection
+    _request_ids: t.Iterator[int]
+    _pending: t.Dict[int, t.Tuple[asyncio.Future[t.Any], ResultHandler[t.Any]]]
+    # None is put when the worker process is gone
+    _received: "asyncio.Queue[t.Optional[t.Tuple[int, bool, t.Any]]]"
+    _task: t.Optional[asyncio.Task[None]]
+
+    def __init__(self) -> None:
+        self.pairs = set()
+        self._process = None
+        self._request_ids = itertools.count()
+        self._pending = {}
+        self._task = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        context = multiprocessing.get_context("spawn")
+        requests_reader, self._requests = context.Pipe(duplex=False)
+        self._responses, responses_writer = context.Pipe(duplex=False)
+        self._process = context.Process(
+            target=serve, args=(requests_reader, responses_writer), daemon=True
+        )
+        self._process.start()
+        requests_reader.close()
+        responses_writer.close()
+
+        self._received = asyncio.Queue()
+        asyncio.get_running_loop().add_reader(
+            self._responses.fileno(), self._on_readable
+        )
+        self._task = asyncio.create_task(self._apply_forever())
+
+        for pair in self.pairs:
+            self.post("create_pair", pair)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        try:
+            self._requests.send(None)
+        except OSError:
+            pass  # the worker has already exited
+        await loop.run_in_executor(None, self._process.join)
+
+        # responses sent before the exit are applied up to the end of the pipe
+        await self._task
+        self._task = None
+
+        loop.remove_reader(self._responses.fileno())
+        self._requests.close()
+        self._responses.close()
+
+    def request(
+        self, command: str, *arguments: t.Any, on_result: ResultHandler[T] = unwrap
+    ) -> "asyncio.Future[T]":
+        if not self.is_running:
+            # applied as failed, so the gateway state frozen for it is released
+            error = ExchangeNotAvailable("Engine worker is not running")
+            return asyncio.ensure_future(on_result(False, error))
+
+        request_id = next(self._request_ids)
+        future: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        try:
+            self._requests.send((request_id, command, arguments))
+        except OSError:
+            # the worker has exited, the request fails along with pending ones
+            # once the end of the responses pipe is read
+            pass
+        self._pending[request_id] = (future, on_result)
+        return future
+
+    def post(self, command: str, *arguments: t.Any) -> None:
+        # fire and forget, failure is retrieved to be not reported as lost
+        self.request(command, *arguments).add_done_callback(
+            lambda future: future.cancelled() or future.exception()
+        )
+
+    def _on_readable(self) -> None:
+        try:
+            while self._responses.poll():
+                self._received.put_nowait(self._responses.recv())
+        except (EOFError, OSError):
+            asyncio.get_running_loop().remove_reader(self._responses.fileno())
+            self._received.put_nowait(None)
+
+    async def _apply_forever(self) -> None:
+        while True:
+            response = await self._received.get()
+            if response is None:
+                break
+
+            request_id, is_succeeded, payload = response
+            await self._apply(request_id, is_succeeded, payload)
+
+        # the rest of responses never comes, requests are applied as failed
+        # ones, so funds frozen for orders sent to the worker are returned
+        for request_id in list(self._pending):
+            exited = ExchangeNotAvailable("Engine worker has exited")
+            await self._apply(request_id, False, exited)
+
+    async def _apply(self, request_id: int, is_succeeded: bool, payload: t.Any) -> None:
+        future, on_result = self._pending.pop(request_id)
+
+        # result is applied even if nobody waits for it anymore,
+        # since the worker has already changed its order books
+        try:
+            result = await on_result(is_succeeded, payload)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+
+class ClusterExchange(Exchange):
+    """Exchange gateway forwarding matching of pairs to engine worker processes.
+
+    Workers are started with ``start`` inside of a running event loop, pairs are
+    spread over them by the number of served pairs.
+    """
+
+    _workers: t.List[EngineWorker]
+    _pair_workers: t.Dict[SymbolPair, EngineWorker]
+
+    def __init__(
+        self,
+        workers_number: t.Optional[int] = None,
+        order_ids: t.Optional[OrderIdGenerator] = None,
+    ) -> None:
+        super().__init__(order_ids)
+        workers_number = workers_number or os.cpu_count() or 1
+        self._workers = [EngineWorker() for _ in range(workers_number)]
+        self._pair_workers = {}
+
+    # region workers
+    @property
+    def workers_number(self) -> int:
+        return len(self._workers)
+
+    async def start(self) -> None:
+        for worker in self._workers:
+            if not worker.is_running:
+                worker.start()
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            await worker.stop()
+
+    # endregion
+
+    # region pair management
+    def clear_order_book(self, pair: SymbolPair) -> None:
+        self._journaled(Kind.ClearOrderBook, pair)
+        self._worker(pair).post("clear_order_book", pair)
+
+    def create_pair(self, pair: SymbolPair) -> None:
+        self._journaled(Kind.CreatePair, pair)
+        if pair in self._pair_workers:
+            raise PairAlreadyExisted("Pair already exists")
+
+        worker = min(self._workers, key=lambda worker: len(worker.pairs))
+        worker.pairs.add(pair)
+        self._pair_workers[pair] = worker
+        self._open_market_data(pair)
+        if worker.is_running:
+            worker.post("create_pair", pair)
+
+    def delete_pair(self, pair: SymbolPair) -> None:
+        self._journaled(Kind.DeletePair, pair)
+        if pair not in self._pair_workers:
+            raise PairDeletionError("Pair was not found")
+
+        worker = self._pair_workers.pop(pair)
+        worker.pairs.discard(pair)
+        self._drop_market_data(pair)
+        if worker.is_running:
+            worker.post("delete_pair", pair)
+
+    @property
+    def pairs(self) -> t.List[SymbolPair]:
+        return list(self._pair_workers.keys())
+
+    async def start_auction(
+        self,
+        pair: SymbolPair,
+        allocation: Allocation = Allocation.Time,
+        interval: t.Optional[float] = None,
+    ) -> None:
+        # order books of workers are matched continuously only
+        raise AuctionError("Auctions are not supported by the cluster")
+
+    # endregion
+
+    # region order management
+    async def cancel_order(self, pair: SymbolPair, order_id: int) -> None:
+        sequence = self._journaled(Kind.CancelOrder, pair, order_id)
+        order = self._cancellable_order(pair, order_id)
+        if order.status == Order.Status.Closed:
+            raise OrderCancellationError("Order already is closed")
+
+        await self._worker(pair).request(
+            "cancel", pair, order_id, on_result=partial(self._apply_cancel, order)
+        )
+        await self._committed(sequence)
+
+    async def create_limit(
+        self,
+        pair: SymbolPair,
+        price: float,
+        side: Order.Side,
+        amount: float,
+        acc_name: str,
+    ) -> Order:
+        sequence = self._journaled(Kind.CreateLimit, pair, price, side, amount, acc_name)
+        order = self._limit_order(pair, price, side, amount, acc_name)
+        await self._froze_assets(order, order.account)
+
+        order.mark_matching()
+        order = await self._worker(pair).request(
+            "limit",
+            pair,
+            order.order_id,
+            side,
+            order.price_ticks,
+            order.amount_lots,
+            on_result=partial(self._apply_match, order),
+        )
+        await self._committed(sequence)
+        return order
+
+    async def create_market(
+        self, pair: SymbolPair, side: Order.Side, amount: float, acc_name: str
+    ) -> Order:
+        sequence = self._journaled(Kind.CreateMarket, pair, side, amount, acc_name)
+        order = self._market_order(pair, side, amount, acc_name)
+        worker = self._worker(pair)
+
+        funds = 0
+        if side == Order.Side.Buy:
+            # asks are known only to the worker, so the reserve is its estimate
+            funds = await worker.request("estimate", pair, order.amount_lots)
+
+        for _ in range(_MARKET_BUY_ATTEMPTS):
+            if side == Order.Side.Buy:
+                self._reserve_quote(order, funds)
+            else:
+                await self._froze_assets(order, order.account)
+
+            order.mark_matching()
+            try:
+                order = await worker.request(
+                    "market",
+                    pair,
+                    order.order_id,
+                    side,
+                    order.amount_lots,
+                    funds,
+                    on_result=partial(self._apply_match, order),
+                )
+            except StaleEstimate as e:
+                # reserved funds were returned, retried with the actual cost
+                funds = e.required
+            else:
+                await self._committed(sequence)
+                return order
+
+        raise OrderCreationError("Asks are changing faster than funds are reserved")
+
+    async def depth(self, pair: SymbolPair, limit: int) -> Depth:
+        return await self._worker(pair).request("depth", pair, limit)
+
+    async def execute_batch(
+        self, commands: t.Sequence[Command]
+    ) -> t.List[CommandResult]:
+        # commands are sent to workers in order without waiting for each other,
+        # a worker executes commands of its pairs one by one anyway,
+        # every command is journaled on its own
+        results = await asyncio.gather(
+            *(self.execute(command) for command in commands), return_exceptions=True
+        )
+        return t.cast(t.List[CommandResult], results)
+
+    # endregion
+
+    async def _mass_cancel_pair(
+        self, pair: SymbolPair, account: t.Optional[Account]
+    ) -> t.List[Order]:
+        order_ids = None
+        if account is not None:
+            order_ids = [order.order_id for order in self._open_limits(account, pair)]
+
+        return await self._worker(pair).request(
+            "cancel_many", pair, order_ids, on_result=self._apply_mass_cancel
+        )
+
+    def _worker(self, pair: SymbolPair) -> EngineWorker:
+        try:
+            return self._pair_workers[pair]
+        except KeyError:
+            raise UnsupportedPairs("Pair is not supported")
+
+    def _check_pair(self, pair: SymbolPair) -> None:
+        self._worker(pair)
+
+    def _reserve_quote(self, order: Order, required: int) -> None:
+        balance = order.account.balance.units
+        quote = order.symbol_pair.Quote
+        if balance[quote] < required:
+            raise InsufficientFunds
+        balance[quote] -= required
+        self._frozen_deposits[order.order_id] = (quote, required)
+
+    async def _apply_match(
+        self, taker: Order, is_succeeded: bool, payload: t.Any
+    ) -> Order:
+        account = taker.account
+        if not is_succeeded:
+            taker.mark_closed()
+            symbol, frozen_funds = self._frozen_deposits.pop(taker.order_id)
+            account.balance.units[symbol] += frozen_funds
+            raise payload
+
+        status, required, raw_reports, version, levels = t.cast(RawMatch, payload)
+        if taker.order_type == Order.Type.Market and taker.side == Order.Side.Buy:
+            symbol, frozen_funds = self._frozen_deposits[taker.order_id]
+            account.balance.units[symbol] += frozen_funds - required
+            self._frozen_deposits[taker.order_id] = (symbol, required)
+
+        self._created_orders[taker.order_id] = taker
+        account.open_orders[taker.order_id] = taker
+
+        await self.emit(
+            ExchangeEvent.OrderCreated, order_id=taker.order_id,
+        )
+        await self._emit_created(taker)
+
+        reports = [self._load_report(taker, *report) for report in raw_reports]
+        taker.status = status
+        # the gateway has no order books, changed levels are the reported ones
+        await self._process_matches(
+            [(taker, reports)], {taker.symbol_pair: (version, levels)}
+        )
+        return taker
+
+    def _load_report(
+        self,
+        taker: Order,
+        owner_type: ReportOwnerType,
+        match_type: MatchReportType,
+        order_id: int,
+        quote_matched: int,
+        base_matched: int,
+    ) -> MatchReport:
+        # gateway orders mirror fills made by the worker
+        if owner_type == ReportOwnerType.Taker:
+            order = taker
+        else:
+            order = self._created_orders[order_id]
+
+        order.filled_lots += base_matched
+        if match_type == MatchReportType.Full:
+            order.mark_closed()
+
+        return MatchReport(owner_type, match_type, order, quote_matched, base_matched)
+
+    async def _apply_cancel(
+        self, order: Order, is_succeeded: bool, payload: t.Any
+    ) -> None:
+        if not is_succeeded:
+            raise payload
+        if payload is not None:
+            await self._close_cancelled(order)
+            await self._emit_cancelled_levels(
+                order.symbol_pair, [order], t.cast(BookChange, payload)
+            )
+
+    async def _apply_mass_cancel(
+        self, is_succeeded: bool, payload: t.Any
+    ) -> t.List[Order]:
+        if not is_succeeded:
+            raise payload
+
+        order_ids, change = t.cast(t.Tuple[t.List[int], BookChange], payload)
+        orders = [self._created_orders[order_id] for order_id in order_ids]
+        await self._release_cancelled(orders)
+        if orders:
+            await self._emit_cancelled_levels(orders[0].symbol_pair, orders, change)
+        return orders
@@ -0,0 +1,29 @@
+import typing as t
+
+from .entities.order import Order
+from .entities.symbol_pair import SymbolPair
+
+
+class CreateLimit(t.NamedTuple):
+    pair: SymbolPair
+    price: float
+    side: Order.Side
+    amount: float
+    acc_name: str
+
+
+class CreateMarket(t.NamedTuple):
+    pair: SymbolPair
+    side: Order.Side
+    amount: float
+    acc_name: str
+
+
+class CancelOrder(t.NamedTuple):
+    pair: SymbolPair
+    order_id: int
+
+
+Command = t.Union[CreateLimit, CreateMarket, CancelOrder]
+# created or cancelled order, or the error the command failed with
+CommandResult = t.Union[Order, Exception]
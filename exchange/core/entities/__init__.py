@@ -1,5 +1,6 @@
 from .account import Account
 from .balance import (
+    Balance,
     BalanceRecord,
     PairBalance,
 )
@@ -10,6 +11,7 @@ from .symbol_pair import SymbolPair
 
 __all__ = [
     "Account",
+    "Balance",
     "BalanceRecord",
     "PairBalance",
     "Fee",
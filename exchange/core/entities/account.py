@@ -1,20 +1,24 @@
 import asyncio
 import typing as t
+from dataclasses import dataclass, field
+
+from .balance import Balance
 
 
 if t.TYPE_CHECKING:
     from node.engine.order import Order
 
 
-class Account(t.NamedTuple):
+@dataclass
+class Account:
     name: str
-    balance: t.DefaultDict[str, float]
+    balance: Balance
     open_orders: t.Dict[int, "Order"]
 
     maker_fee: float = 0.005
     taker_fee: float = 0.008
 
-    lock: asyncio.Lock = asyncio.Lock()
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, compare=False, repr=False)
 
     async def __aenter__(self) -> "Account":
         await self.lock.acquire()
@@ -23,3 +27,30 @@ class Account(t.NamedTuple):
     @t.no_type_check
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         self.lock.release()
+
+
+class AccountsLock:
+    # Accounts are always locked in the order of their names,
+    # so operations touching several accounts can not deadlock each other
+
+    __slots__ = ("_accounts",)
+
+    _accounts: t.List[Account]
+
+    def __init__(self, accounts: t.Iterable[Account]) -> None:
+        unique = {account.name: account for account in accounts}
+        self._accounts = [unique[name] for name in sorted(unique)]
+
+    async def __aenter__(self) -> None:
+        for position, account in enumerate(self._accounts):
+            try:
+                await account.lock.acquire()
+            except BaseException:
+                for acquired in reversed(self._accounts[:position]):
+                    acquired.lock.release()
+                raise
+
+    @t.no_type_check
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        for account in reversed(self._accounts):
+            account.lock.release()
@@ -1,4 +1,7 @@
 import typing as t
+from collections import defaultdict
+
+from .fixed_point import from_units, to_units
 
 
 class BalanceRecord(t.NamedTuple):
@@ -9,3 +12,39 @@ class BalanceRecord(t.NamedTuple):
 class PairBalance(t.NamedTuple):
     Base: BalanceRecord
     Quote: BalanceRecord
+
+
+class Balance(t.MutableMapping[str, float]):
+    """Account balance per symbol.
+
+    Amounts are stored as integer units (see ``fixed_point``) and exposed as
+    floats, missing symbols are treated as zero balance.
+    """
+
+    units: t.DefaultDict[str, int]
+
+    def __init__(self, balances: t.Optional[t.Mapping[str, float]] = None) -> None:
+        self.units = defaultdict(int)
+        for symbol, amount in (balances or {}).items():
+            self.units[symbol] = to_units(amount)
+
+    def deposit(self, symbol: str, amount: float) -> None:
+        self.units[symbol] += to_units(amount)
+
+    def __getitem__(self, symbol: str) -> float:
+        return from_units(self.units[symbol])
+
+    def __setitem__(self, symbol: str, amount: float) -> None:
+        self.units[symbol] = to_units(amount)
+
+    def __delitem__(self, symbol: str) -> None:
+        del self.units[symbol]
+
+    def __iter__(self) -> t.Iterator[str]:
+        return iter(self.units)
+
+    def __len__(self) -> int:
+        return len(self.units)
+
+    def __repr__(self) -> str:
+        return f"Balance({dict(self)})"
@@ -0,0 +1,63 @@
+"""Fixed-point representation of prices, amounts and balances.
+
+Inside the core prices are integer ticks of ``10 ** -PRICE_POWER``, amounts
+are integer lots of ``10 ** -AMOUNT_POWER`` and balances are integer units of
+``10 ** -UNIT_POWER``. A unit is exactly one lot multiplied by one tick, so
+the quote value of a fill ``lots * ticks`` is an exact balance delta.
+Floats appear only at the API edge.
+"""
+import typing as t
+
+
+PRICE_POWER = 6
+AMOUNT_POWER = 8
+UNIT_POWER = PRICE_POWER + AMOUNT_POWER
+
+PRICE_SCALE: int = 10 ** PRICE_POWER
+AMOUNT_SCALE: int = 10 ** AMOUNT_POWER
+UNIT_SCALE: int = 10 ** UNIT_POWER
+
+FEE_SCALE: int = 10 ** 6
+
+
+def to_ticks(price: float) -> int:
+    return int(round(price * PRICE_SCALE))
+
+
+def from_ticks(ticks: int) -> float:
+    return ticks / PRICE_SCALE
+
+
+def to_lots(amount: float) -> int:
+    return int(round(amount * AMOUNT_SCALE))
+
+
+def from_lots(lots: int) -> float:
+    return lots / AMOUNT_SCALE
+
+
+def to_units(value: float) -> int:
+    return int(round(value * UNIT_SCALE))
+
+
+def from_units(units: int) -> float:
+    return units / UNIT_SCALE
+
+
+def lots_to_units(lots: int) -> int:
+    # balance units of base asset amount
+    return lots * PRICE_SCALE
+
+
+def quote_units(lots: int, ticks: int) -> int:
+    # balance units of quote asset paid for amount at price
+    return lots * ticks
+
+
+def apply_fee(units: int, fee: float) -> int:
+    # amount of units left after charging fee rate
+    return units - units * int(round(fee * FEE_SCALE)) // FEE_SCALE
+
+
+def optional_ticks(price: t.Optional[float]) -> t.Optional[int]:
+    return None if price is None else to_ticks(price)
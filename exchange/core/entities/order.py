@@ -1,16 +1,42 @@
 import asyncio
 import datetime
+import time
 import typing as t
-import uuid
 from enum import Enum
 
+from .fixed_point import (
+    from_lots,
+    from_ticks,
+    optional_ticks,
+    to_lots,
+)
+from .order_id import default_order_ids
+
 
 if t.TYPE_CHECKING:
     from .symbol_pair import SymbolPair
     from .account import Account
 
 
+# offset between wall clock and monotonic clock, used to restore order creation datetime
+_WALL_CLOCK_OFFSET_NS = time.time_ns() - time.monotonic_ns()
+
+
 class Order:
+    __slots__ = (
+        "order_id",
+        "status",
+        "filled_lots",
+        "amount_lots",
+        "price_ticks",
+        "side",
+        "symbol_pair",
+        "account",
+        "created_ns",
+        "order_type",
+        "_is_in_matching",
+    )
+
     class Status(Enum):
         Opened = "opened"
         Matching = "matching"
@@ -26,16 +52,18 @@ class Order:
 
     order_id: int
     status: Status
-    filled: float
-    amount: float
-    price: t.Optional[float]
+    filled_lots: int
+    amount_lots: int
+    price_ticks: t.Optional[int]
     side: Side
     symbol_pair: "SymbolPair"
     account: "Account"
-    creation_datetime: datetime.datetime
+    # monotonic clock nanoseconds
+    created_ns: int
     order_type: Type
 
-    _is_in_matching: asyncio.Future  # type: ignore
+    # created only when somebody waits for the end of matching
+    _is_in_matching: t.Optional[asyncio.Future]  # type: ignore
 
     def __init__(
         self,
@@ -45,19 +73,42 @@ class Order:
         account: "Account",
         order_type: Type,
         price: t.Optional[float] = None,
+        order_id: t.Optional[int] = None,
     ):
-        self.order_id = uuid.uuid1().int
+        self.order_id = default_order_ids() if order_id is None else order_id
         self.status = Order.Status.Opened
-        self.filled = 0
-        self.amount = amount
-        self.price = price
+        self.filled_lots = 0
+        self.amount_lots = to_lots(amount)
+        self.price_ticks = optional_ticks(price)
         self.side = side
         self.symbol_pair = symbol_pair
         self.account = account
-        self.creation_datetime = datetime.datetime.now()
+        self.created_ns = time.monotonic_ns()
         self.order_type = order_type
 
-        self._is_in_matching = asyncio.Future()
+        self._is_in_matching = None
+
+    @property
+    def amount(self) -> float:
+        return from_lots(self.amount_lots)
+
+    @property
+    def filled(self) -> float:
+        return from_lots(self.filled_lots)
+
+    @property
+    def price(self) -> t.Optional[float]:
+        return None if self.price_ticks is None else from_ticks(self.price_ticks)
+
+    @property
+    def creation_datetime(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(
+            (self.created_ns + _WALL_CLOCK_OFFSET_NS) / 10 ** 9
+        )
+
+    @property
+    def left_lots(self) -> int:
+        return self.amount_lots - self.filled_lots
 
     def to_json(self) -> t.Dict[str, t.Union[str, float, int, None]]:
         return {
@@ -82,9 +133,11 @@ class Order:
         self.status = Order.Status.Opened
 
     def finish_matching(self) -> None:
-        if not self._is_in_matching.done():
+        if self._is_in_matching is not None and not self._is_in_matching.done():
             self._is_in_matching.set_result(None)
 
     async def is_matched(self) -> None:
         if self.status == Order.Status.Matching:
+            if self._is_in_matching is None:
+                self._is_in_matching = asyncio.get_running_loop().create_future()
             await self._is_in_matching
@@ -1,15 +1,16 @@
 import asyncio
+import bisect
+import itertools
 import typing as t
 from dataclasses import dataclass, field
 
-import numpy as np
-from exchange.libs.bisect import (
-    bisect_left,
-    bisect_right,
-    insort,
-    reverse_insort,
+from . import fixed_point
+from .fixed_point import (
+    from_lots,
+    from_ticks,
+    quote_units,
+    to_ticks,
 )
-
 from .order import Order
 
 
@@ -18,111 +19,405 @@ class Level1(t.NamedTuple):
     Bid: t.Optional[Order]
 
 
+class Depth(t.NamedTuple):
+    version: int
+    Bids: t.List[t.Tuple[float, float]]
+    Asks: t.List[t.Tuple[float, float]]
+
+
+class Sweep(t.NamedTuple):
+    # lots of base asset and balance units of quote asset taken from the side
+    base: int
+    quote: int
+
+
+class OrderHandle:
+    """Position of a resting order inside its price level queue."""
+
+    __slots__ = ("order", "level", "prev", "next")
+
+    order: Order
+    level: "PriceLevel"
+    prev: t.Optional["OrderHandle"]
+    next: t.Optional["OrderHandle"]
+
+    def __init__(self, order: Order, level: "PriceLevel") -> None:
+        self.order = order
+        self.level = level
+        self.prev = None
+        self.next = None
+
+
+class PriceLevel:
+    """FIFO queue of resting orders sharing the same price.
+
+    Orders are linked through their handles, so any order can be unlinked
+    in O(1). ``price`` is in ticks and ``amount`` is the aggregated number
+    of lots left to fill at this price.
+    """
+
+    __slots__ = ("price", "amount", "_head", "_tail", "_size")
+
+    price: int
+    amount: int
+
+    _head: t.Optional[OrderHandle]
+    _tail: t.Optional[OrderHandle]
+    _size: int
+
+    def __init__(self, price: int) -> None:
+        self.price = price
+        self.amount = 0
+        self._head = None
+        self._tail = None
+        self._size = 0
+
+    def append(self, order: Order) -> OrderHandle:
+        handle = OrderHandle(order, self)
+        if self._tail is None:
+            self._head = handle
+        else:
+            self._tail.next = handle
+            handle.prev = self._tail
+        self._tail = handle
+
+        self._size += 1
+        self.amount += order.left_lots
+        return handle
+
+    def unlink(self, handle: OrderHandle) -> None:
+        if handle.prev is None:
+            self._head = handle.next
+        else:
+            handle.prev.next = handle.next
+        if handle.next is None:
+            self._tail = handle.prev
+        else:
+            handle.next.prev = handle.prev
+        handle.prev = handle.next = None
+
+        self._size -= 1
+        self.amount -= handle.order.left_lots
+
+    def first(self) -> OrderHandle:
+        if self._head is None:
+            raise IndexError("price level is empty")
+        return self._head
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> t.Iterator[Order]:
+        handle = self._head
+        while handle is not None:
+            yield handle.order
+            handle = handle.next
+
+
+class BookSide:
+    """One side of the order book, keyed by price level.
+
+    Level prices are kept in a sorted index where the best price is the last
+    element, so the best level is accessed and removed in O(1) and new levels
+    are found by bisection. Orders inside a level are served in FIFO order.
+
+    Cumulative base and quote depth is kept aligned with the price index,
+    accumulated from the worst level, so changes near the best price only
+    invalidate the tail of the prefix sums and sweep estimations are answered
+    by bisection.
+    """
+
+    side: Order.Side
+
+    _keys: t.List[int]
+    _levels: t.Dict[int, PriceLevel]
+    _size: int
+
+    # _cum_base[i] and _cum_quote[i] hold depth of the levels _keys[:i]
+    _cum_base: t.List[int]
+    _cum_quote: t.List[int]
+
+    def __init__(self, side: Order.Side) -> None:
+        self.side = side
+        self._keys = []
+        self._levels = {}
+        self._size = 0
+        self._cum_base = [0]
+        self._cum_quote = [0]
+
+    def _key(self, price: int) -> int:
+        # asks are sorted by descending price and bids by ascending one,
+        # therefore the best price always sits at the end of the index
+        return -price if self.side == Order.Side.Sell else price
+
+    def add(self, order: Order) -> OrderHandle:
+        price = t.cast(int, order.price_ticks)
+        level = self._levels.get(price)
+        if level is None:
+            level = self._levels[price] = PriceLevel(price)
+            bisect.insort(self._keys, self._key(price))
+
+        self._invalidate(self._position(price))
+        self._size += 1
+        return level.append(order)
+
+    def remove(self, handle: OrderHandle) -> None:
+        level = handle.level
+        level.unlink(handle)
+
+        self._invalidate(self._position(level.price))
+        self._size -= 1
+        if not level:
+            self._drop_level(level.price)
+
+    def fill(self, handle: OrderHandle, amount: int) -> None:
+        handle.level.amount -= amount
+        self._invalidate(self._position(handle.level.price))
+
+    def best_level(self) -> PriceLevel:
+        try:
+            return self._levels[self._best_price()]
+        except IndexError:
+            raise IndexError("order book side is empty")
+
+    def first(self) -> Order:
+        return self.best_level().first().order
+
+    def pop_first(self) -> Order:
+        level = self.best_level()
+        handle = level.first()
+        level.unlink(handle)
+
+        self._invalidate(len(self._keys) - 1)
+        self._size -= 1
+        if not level:
+            del self._levels[level.price]
+            self._keys.pop()
+        return handle.order
+
+    def get_level(self, price: int) -> t.Optional[PriceLevel]:
+        return self._levels.get(price)
+
+    def levels(self) -> t.Iterator[PriceLevel]:
+        # iterate from the best price to the worst one
+        for key in reversed(self._keys):
+            yield self._levels[self._key(key)]
+
+    def depth(self, limit: int) -> t.List[t.Tuple[float, float]]:
+        return [
+            (from_ticks(level.price), from_lots(level.amount))
+            for level in itertools.islice(self.levels(), limit)
+        ]
+
+    def sweep_base(self, amount: int) -> Sweep:
+        """Estimate sweeping ``amount`` lots from the best price.
+
+        If the side is not deep enough, the whole side is returned.
+        """
+        cum_base, cum_quote = self._prefix_sums()
+        total_base, total_quote = cum_base[-1], cum_quote[-1]
+        if amount <= 0:
+            return Sweep(0, 0)
+        if amount >= total_base:
+            return Sweep(total_base, total_quote)
+
+        # levels after position are taken completely, the rest is taken from it
+        position = bisect.bisect_right(cum_base, total_base - amount) - 1
+        base = total_base - cum_base[position + 1]
+        quote = total_quote - cum_quote[position + 1]
+        price = self._key(self._keys[position])
+        return Sweep(amount, quote + quote_units(amount - base, price))
+
+    def sweep_quote(self, funds: int) -> Sweep:
+        """Estimate how many lots ``funds`` balance units buy from the best price.
+
+        If the side is not deep enough, the whole side is returned.
+        """
+        cum_base, cum_quote = self._prefix_sums()
+        total_base, total_quote = cum_base[-1], cum_quote[-1]
+        if funds <= 0:
+            return Sweep(0, 0)
+        if funds >= total_quote:
+            return Sweep(total_base, total_quote)
+
+        position = bisect.bisect_right(cum_quote, total_quote - funds) - 1
+        base = total_base - cum_base[position + 1]
+        quote = total_quote - cum_quote[position + 1]
+        price = self._key(self._keys[position])
+        lots = (funds - quote) // price
+        return Sweep(base + lots, quote + quote_units(lots, price))
+
+    def _prefix_sums(self) -> t.Tuple[t.List[int], t.List[int]]:
+        cum_base, cum_quote = self._cum_base, self._cum_quote
+        for key in self._keys[len(cum_base) - 1 :]:
+            level = self._levels[self._key(key)]
+            cum_base.append(cum_base[-1] + level.amount)
+            cum_quote.append(cum_quote[-1] + quote_units(level.amount, level.price))
+        return cum_base, cum_quote
+
+    def _position(self, price: int) -> int:
+        key = self._key(price)
+        if self._keys and self._keys[-1] == key:
+            return len(self._keys) - 1
+        return bisect.bisect_left(self._keys, key)
+
+    def _invalidate(self, position: int) -> None:
+        # prefix sums past the changed level have to be recalculated
+        del self._cum_base[position + 1 :]
+        del self._cum_quote[position + 1 :]
+
+    def _best_price(self) -> int:
+        return self._key(self._keys[-1])
+
+    def _drop_level(self, price: int) -> None:
+        del self._levels[price]
+        key = self._key(price)
+        del self._keys[bisect.bisect_left(self._keys, key)]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size != 0
+
+    def __iter__(self) -> t.Iterator[Order]:
+        return itertools.chain.from_iterable(self.levels())
+
+    @t.overload
+    def __getitem__(self, item: int) -> Order:
+        ...
+
+    @t.overload
+    def __getitem__(self, item: slice) -> t.List[Order]:
+        ...
+
+    def __getitem__(self, item: t.Union[int, slice]) -> t.Union[Order, t.List[Order]]:
+        # positional access walks levels from the best one,
+        # so it is cheap only for the head of the book
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self._size)
+            if step < 0:
+                return list(self)[item]
+            return list(itertools.islice(self, start, stop, step))
+
+        if item < 0:
+            item += self._size
+        if not 0 <= item < self._size:
+            raise IndexError("order book index out of range")
+        return next(itertools.islice(self, item, None))
+
+
 @dataclass
 class OrderBook:
-    Asks: t.List[Order]
-    Bids: t.List[Order]
+    Asks: BookSide = field(default_factory=lambda: BookSide(Order.Side.Sell))
+    Bids: BookSide = field(default_factory=lambda: BookSide(Order.Side.Buy))
 
-    min_price_power = 6
-    min_amount_power = 8
+    min_price_power = fixed_point.PRICE_POWER
+    min_amount_power = fixed_point.AMOUNT_POWER
 
     min_amount = 10 ** (-min_amount_power)
     min_price = 10 ** (-min_price_power)
 
-    _lock: asyncio.Lock = asyncio.Lock()
-    _amount_per_price: t.Dict[float, float] = field(default_factory=dict)
+    _lock: asyncio.Lock = field(default_factory=asyncio.Lock, compare=False, repr=False)
+    _index: t.Dict[int, OrderHandle] = field(default_factory=dict)
 
-    def get_amount(self, price: float) -> float:
-        return self._amount_per_price.get(price, 0.0)
+    # incremented on every change of the book, used to invalidate cached snapshots
+    version: int = 0
+    _depth_version: int = 0
+    _depth_cache: t.Dict[int, Depth] = field(default_factory=dict)
 
-    def add(self, order: Order) -> None:
-        if order.side == Order.Side.Sell:
-            insort(self.Asks, order, key=lambda el: el.price)
-        else:
-            reverse_insort(self.Bids, order, key=lambda el: el.price)
-        self._increase_amount(order)
+    def get_side(self, side: Order.Side) -> BookSide:
+        return self.Asks if side == Order.Side.Sell else self.Bids
 
-    def delete(self, order: Order) -> None:
-        try:
-            if order.side == Order.Side.Sell:
-                self.Asks.remove(order)
-                self._decrease_amount(order)
-                return
-            if order.side == Order.Side.Buy:
-                self.Bids.remove(order)
-                self._decrease_amount(order)
-        except ValueError:
-            pass
+    def get_amount(self, price: float) -> float:
+        ticks = to_ticks(price)
+        amount = 0
+        for side in (self.Asks, self.Bids):
+            level = side.get_level(ticks)
+            if level is not None:
+                amount += level.amount
+        return from_lots(amount)
 
-    def get_first(self, side: Order.Side) -> Order:
-        if side == Order.Side.Sell:
-            return self.Asks[0]
-        else:
-            return self.Bids[0]
+    def level_amount(self, side: Order.Side, price: int) -> int:
+        # lots left at the price level of the side, 0 if there is no such level
+        level = self.get_side(side).get_level(price)
+        return 0 if level is None else level.amount
 
-    def pop_first(self, side: Order.Side) -> None:
-        if side == Order.Side.Sell:
-            order = self.Asks.pop(0)
-        else:
-            order = self.Bids.pop(0)
+    def depth(self, limit: int) -> Depth:
+        # aggregated top-N price levels, rebuilt only after the book was changed
+        if self._depth_version != self.version:
+            self._depth_cache.clear()
+            self._depth_version = self.version
 
-        self._decrease_amount(order)
+        snapshot = self._depth_cache.get(limit)
+        if snapshot is None:
+            snapshot = self._depth_cache[limit] = Depth(
+                self.version, self.Bids.depth(limit), self.Asks.depth(limit)
+            )
+        return snapshot
 
-    def _decrease_amount(self, order: Order) -> None:
-        if order.price is None:
-            return
+    def add(self, order: Order) -> None:
+        self._index[order.order_id] = self.get_side(order.side).add(order)
+        self.version += 1
 
-        if order.price not in self._amount_per_price:
-            self._amount_per_price[order.price] = order.amount
-        else:
-            self._amount_per_price[order.price] -= order.amount
+    def delete(self, order: Order) -> None:
+        self.cancel(order.order_id)
 
-        if np.isclose(
-            self._amount_per_price[order.price], 0, rtol=self.min_amount / 10
-        ):
-            del self._amount_per_price[order.price]
+    def cancel(self, order_id: int) -> t.Optional[Order]:
+        handle = self._index.pop(order_id, None)
+        if handle is None:
+            return None
 
-    def _increase_amount(self, order: Order) -> None:
-        if order.price is None:
-            return
+        self.get_side(handle.order.side).remove(handle)
+        self.version += 1
+        return handle.order
 
-        if order.price not in self._amount_per_price:
-            self._amount_per_price[order.price] = order.amount
-        else:
-            self._amount_per_price[order.price] += order.amount
+    def cancel_many(self, order_ids: t.Iterable[int]) -> t.List[Order]:
+        orders = []
+        for order_id in order_ids:
+            handle = self._index.pop(order_id, None)
+            if handle is not None:
+                self.get_side(handle.order.side).remove(handle)
+                orders.append(handle.order)
 
-    def _order_biserch(self, order: Order) -> bool:
+        if orders:
+            self.version += 1
+        return orders
 
-        if order.side == Order.Side.Sell:
-            orders = self.Asks
-            reversed = False
-        else:
-            orders = self.Bids
-            reversed = True
+    def clear(self) -> t.List[Order]:
+        # removes all resting orders at once
+        orders = [handle.order for handle in self._index.values()]
+        self.Asks = BookSide(Order.Side.Sell)
+        self.Bids = BookSide(Order.Side.Buy)
+        self._index.clear()
+        self.version += 1
+        return orders
 
-        left = bisect_left(orders, order, key=lambda el: el.price, reversed=reversed)
-        right = bisect_right(orders, order, key=lambda el: el.price, reversed=reversed)
+    def fill(self, order: Order, amount: int) -> None:
+        # keep aggregated level amount in sync with partially filled resting order
+        handle = self._index.get(order.order_id)
+        if handle is not None:
+            self.get_side(order.side).fill(handle, amount)
+            self.version += 1
 
-        if left != right:
-            region = orders[left:right]
-            try:
-                region.index(order)
-                return True
-            except ValueError:
-                return False
+    def get_first(self, side: Order.Side) -> Order:
+        return self.get_side(side).first()
 
-        return False
+    def pop_first(self, side: Order.Side) -> None:
+        order = self.get_side(side).pop_first()
+        del self._index[order.order_id]
+        self.version += 1
 
     def __len__(self) -> int:
         return len(self.Asks) + len(self.Bids)
 
     def __contains__(self, item: t.Union[Order, int]) -> bool:
         if isinstance(item, Order):
-            return self._order_biserch(item)
+            handle = self._index.get(item.order_id)
+            return handle is not None and handle.order is item
         elif isinstance(item, int):
-            asks_ids = [order.order_id for order in self.Asks]
-            bids_ids = [order.order_id for order in self.Bids]
-            return item in asks_ids or item in bids_ids
+            return item in self._index
+        return False
 
     async def __aenter__(self) -> "OrderBook":
         await self._lock.acquire()
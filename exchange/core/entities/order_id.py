@@ -0,0 +1,51 @@
+import itertools
+import typing as t
+
+
+class OrderIdGenerator(t.Protocol):
+    def __call__(self) -> int:
+        ...
+
+
+class SequenceGenerator:
+    """Monotonic 63-bit order id sequence.
+
+    Ids are ``shard << sequence_bits | sequence``, so ids of one generator are
+    strictly increasing and gaps in the sequence part can be detected
+    on replay. Without shard bits an id is just the sequence number.
+    """
+
+    ID_BITS = 63
+
+    shard: int
+    shard_bits: int
+    sequence_bits: int
+    last: int
+
+    _prefix: int
+    _counter: t.Iterator[int]
+
+    def __init__(self, shard: int = 0, shard_bits: int = 0, start: int = 0) -> None:
+        if not 0 <= shard < 2 ** shard_bits or shard_bits >= self.ID_BITS:
+            raise ValueError("shard does not fit into shard bits")
+
+        self.shard = shard
+        self.shard_bits = shard_bits
+        self.sequence_bits = self.ID_BITS - shard_bits
+        self._prefix = shard << self.sequence_bits
+        self._counter = itertools.count(start + 1)
+        self.last = self._prefix | start
+
+    def __call__(self) -> int:
+        self.last = self._prefix | next(self._counter)
+        return self.last
+
+    def sequence_of(self, order_id: int) -> int:
+        return order_id & ((1 << self.sequence_bits) - 1)
+
+    def shard_of(self, order_id: int) -> int:
+        return order_id >> self.sequence_bits
+
+
+# used for orders created outside of an exchange
+default_order_ids = SequenceGenerator()
@@ -116,3 +116,11 @@ class IncorrectPrice(Exception):
 
 class AgentError(Exception):
     pass
+
+
+class AuctionError(Exception):
+    pass
+
+
+class JournalError(Exception):
+    pass
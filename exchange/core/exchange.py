@@ -1,57 +1,164 @@
 import asyncio
+import logging
+import time
 import typing as t
 from collections import defaultdict
+from contextlib import suppress
 from enum import Enum, auto
+from functools import partial
 
+import numpy as np
 from exchange.libs.event_emitter import EventEmitter
 
-from .entities.account import Account
+from .auction import Allocation, CallAuction, Clearing
+from .candles import Candles, summarize
+from .commands import (
+    CancelOrder,
+    Command,
+    CommandResult,
+    CreateLimit,
+    CreateMarket,
+)
+from .entities.account import Account, AccountsLock
+from .entities.balance import Balance
+from .entities.fixed_point import (
+    apply_fee,
+    from_lots,
+    from_ticks,
+    lots_to_units,
+    quote_units,
+    to_lots,
+    to_ticks,
+)
 from .entities.order import Order
-from .entities.order_book import OrderBook
+from .entities.order_id import OrderIdGenerator, SequenceGenerator
+from .entities.order_book import Depth, OrderBook
 from .entities.symbol_pair import SymbolPair
 from .errors import (
+    AuctionError,
     IncorrectPrice,
     InsufficientFunds,
     OrderCancellationError,
+    OrderCreationError,
     PairAlreadyExisted,
     PairDeletionError,
+    TooSmallOrderAmount,
     UnsupportedPairs,
     WrongCredentials,
     WrongOrderID,
 )
+from .journal import Journal, Kind, Record
 from .match_model import (
     MatchModel,
     MatchReport,
     MatchReportType,
     ReportOwnerType,
+    Trade,
 )
+from .sequencer import PairSequencer
+from .ticker import RollingTicker, Ticker
+from .trade_tape import BUY, NO_ORDER, NO_TAKER, SELL, TradeTape
+from .yield_policy import YieldPolicy
+
+
+T = t.TypeVar("T")
+
+# taker and reports of its matching, reports of an auction have no taker
+Match = t.Tuple[t.Optional[Order], t.Sequence[MatchReport]]
+logger = logging.getLogger(__name__)
+
+# failed periodic uncrosses in a row after which the auction is stopped
+_UNCROSS_ATTEMPTS = 3
+
+# side, price ticks and lots left at a level of the order book
+LevelAmount = t.Tuple[Order.Side, int, int]
+# version of the order book and amounts of the levels changed by a command
+BookChange = t.Tuple[int, t.List[LevelAmount]]
+
+
+# methods applying journaled commands of every kind
+_JOURNALED_METHODS: t.Dict[Kind, str] = {
+    Kind.CreateAccount: "create_acc",
+    Kind.DeleteAccount: "delete_acc",
+    Kind.RefillAccount: "refill_account",
+    Kind.CreatePair: "create_pair",
+    Kind.DeletePair: "delete_pair",
+    Kind.ClearOrderBook: "clear_order_book",
+    Kind.CreateLimit: "create_limit",
+    Kind.CreateMarket: "create_market",
+    Kind.CancelOrder: "cancel_order",
+    Kind.MassCancel: "mass_cancel",
+    Kind.Batch: "execute_batch",
+    Kind.StartAuction: "start_auction",
+    Kind.UncrossAuction: "uncross_auction",
+    Kind.StopAuction: "stop_auction",
+}
 
 
 class ExchangeEvent(Enum):
-    OrderBookUpdated = auto()
-    OrderClosed = auto()
+    # levels changed by a match or a cancel and orders closed by a match
+    BookDelta = auto()
+    # trades of a match
+    Trades = auto()
+    # orders and balances of an account changed by a command
+    AccountUpdate = auto()
     OrderCreated = auto()
     OrderCancelled = auto()
+    OrdersCancelled = auto()
 
 
 class Exchange(EventEmitter[ExchangeEvent]):
     # singleton initialization
-    def __new__(cls) -> "Exchange":
-        if not hasattr(cls, "instance"):
+    def __new__(cls, *args: t.Any, **kwargs: t.Any) -> "Exchange":
+        if "instance" not in cls.__dict__:
             cls.instance: "Exchange" = super(Exchange, cls).__new__(cls)
         return cls.instance
 
+    order_ids: OrderIdGenerator
+    # how often matching and report processing give control back to the event loop
+    yield_policy: YieldPolicy
+    # state changing commands are journaled before they are applied, if attached
+    journal: t.Optional[Journal]
+
     _accounts: t.Dict[str, Account]
     _created_orders: t.Dict[int, Order]
     _order_book: t.Dict[SymbolPair, OrderBook]
-
-    _frozen_deposits: t.Dict[int, t.Tuple[str, float]]
-
-    def __init__(self) -> None:
+    # single writer tasks of pairs, used instead of locks when started
+    _sequenced: bool
+    _sequencers: t.Dict[SymbolPair, PairSequencer]
+    # stops of sequencers of deleted pairs
+    _stopping_sequencers: t.Set[asyncio.Task[None]]
+    # pairs collecting orders for a call auction instead of continuous matching
+    _auctions: t.Dict[SymbolPair, CallAuction]
+    _auction_tasks: t.Dict[SymbolPair, asyncio.Task[None]]
+    # market statistics of pairs built from their trades
+    _candles: t.Dict[SymbolPair, Candles]
+    _tickers: t.Dict[SymbolPair, RollingTicker]
+    _tapes: t.Dict[SymbolPair, TradeTape]
+
+    # frozen balance units per order id
+    _frozen_deposits: t.Dict[int, t.Tuple[str, int]]
+
+    def __init__(
+        self,
+        order_ids: t.Optional[OrderIdGenerator] = None,
+        yield_policy: YieldPolicy = YieldPolicy(),
+    ) -> None:
         super().__init__()
+        self.order_ids = order_ids or SequenceGenerator()
+        self.yield_policy = yield_policy
+        self.journal = None
         self._accounts = {}
         self._created_orders = {}
         self._order_book = {}
+        self._sequenced = False
+        self._sequencers = {}
+        self._stopping_sequencers = set()
+        self._auctions = {}
+        self._auction_tasks = {}
+        self._candles = {}
+        self._tickers = {}
+        self._tapes = {}
         self._frozen_deposits = dict()
 
     # region pair management
@@ -62,22 +169,229 @@ class Exchange(EventEmitter[ExchangeEvent]):
             raise UnsupportedPairs
 
     def clear_order_book(self, pair: SymbolPair) -> None:
-        self._order_book[pair] = OrderBook([], [])
+        self._journaled(Kind.ClearOrderBook, pair)
+        self._order_book[pair] = OrderBook()
 
     def create_pair(self, pair: SymbolPair) -> None:
+        self._journaled(Kind.CreatePair, pair)
         if pair in self._order_book.keys():
             raise PairAlreadyExisted("Pair already exists")
-        self._order_book[pair] = OrderBook([], [])
+        self._order_book[pair] = OrderBook()
+        self._open_market_data(pair)
+        if self._sequenced:
+            self._start_sequencer(pair)
 
     def delete_pair(self, pair: SymbolPair) -> None:
+        self._journaled(Kind.DeletePair, pair)
         if pair not in self._order_book.keys():
             raise PairDeletionError("Pair was not found")
         self._order_book.pop(pair)
+        self._drop_market_data(pair)
+        self._auctions.pop(pair, None)
+        task = self._auction_tasks.pop(pair, None)
+        if task is not None:
+            task.cancel()
+        sequencer = self._sequencers.pop(pair, None)
+        if sequencer is not None:
+            task = asyncio.create_task(sequencer.stop())
+            self._stopping_sequencers.add(task)
+            task.add_done_callback(self._stopping_sequencers.discard)
 
     @property
     def pairs(self) -> t.List[SymbolPair]:
         return list(self._order_book.keys())
 
+    def _open_market_data(self, pair: SymbolPair) -> None:
+        self._candles[pair] = Candles()
+        self._tickers[pair] = RollingTicker()
+        self._tapes[pair] = TradeTape()
+
+    def _drop_market_data(self, pair: SymbolPair) -> None:
+        self._candles.pop(pair, None)
+        self._tickers.pop(pair, None)
+        self._tapes.pop(pair, None)
+
+    # endregion
+
+    # region market data
+    def klines(
+        self,
+        pair: SymbolPair,
+        interval: str,
+        limit: int,
+        start_ms: t.Optional[int] = None,
+        end_ms: t.Optional[int] = None,
+    ) -> np.ndarray:
+        # read only view of the latest OHLCV bars, valid until the next trade
+        try:
+            candles = self._candles[pair]
+        except KeyError:
+            raise UnsupportedPairs
+        return candles.last(interval, limit, start_ms, end_ms)
+
+    def tickers(
+        self, pairs: t.Optional[t.Iterable[SymbolPair]] = None
+    ) -> t.Dict[SymbolPair, Ticker]:
+        # rolling 24 hour statistics of the pairs or of every pair
+        now_ms = int(time.time() * 1000)
+        try:
+            return {
+                pair: self._tickers[pair].stats(now_ms)
+                for pair in (self._tickers if pairs is None else pairs)
+            }
+        except KeyError:
+            raise UnsupportedPairs
+
+    def trade_tape(self, pair: SymbolPair) -> TradeTape:
+        try:
+            return self._tapes[pair]
+        except KeyError:
+            raise UnsupportedPairs
+
+    # endregion
+
+    # region sequencers
+    @property
+    def is_sequenced(self) -> bool:
+        return self._sequenced
+
+    def start_sequencers(self) -> None:
+        # from now on every pair, including pairs created later,
+        # is served by its own single writer task
+        self._sequenced = True
+        for pair in self._order_book:
+            self._start_sequencer(pair)
+
+    async def stop_sequencers(self) -> None:
+        self._sequenced = False
+        sequencers, self._sequencers = self._sequencers, {}
+        for sequencer in sequencers.values():
+            await sequencer.stop()
+        if self._stopping_sequencers:
+            await asyncio.gather(*self._stopping_sequencers)
+
+    def _start_sequencer(self, pair: SymbolPair) -> None:
+        if pair not in self._sequencers:
+            sequencer = self._sequencers[pair] = PairSequencer()
+            sequencer.start()
+
+    # endregion
+
+    # region auctions
+    def is_in_auction(self, pair: SymbolPair) -> bool:
+        return pair in self._auctions
+
+    async def start_auction(
+        self,
+        pair: SymbolPair,
+        allocation: Allocation = Allocation.Time,
+        interval: t.Optional[float] = None,
+    ) -> None:
+        # limit orders of the pair are collected until the auction is uncrossed,
+        # with an interval it is uncrossed periodically until it is stopped
+        sequence = self._journaled(Kind.StartAuction, pair, allocation, interval)
+        self._check_pair(pair)
+        await self._exclusive(pair, partial(self._open_auction, pair, allocation))
+        if interval is not None:
+            self._auction_tasks[pair] = asyncio.create_task(
+                self._uncross_forever(pair, interval)
+            )
+        await self._committed(sequence)
+
+    async def uncross_auction(self, pair: SymbolPair) -> Clearing:
+        sequence = self._journaled(Kind.UncrossAuction, pair)
+        self._auction(pair)
+        clearing = await self._exclusive(pair, partial(self._uncross, pair))
+        await self._committed(sequence)
+        return clearing
+
+    async def stop_auction(self, pair: SymbolPair) -> Clearing:
+        # the last uncross, orders left are moved to the order book
+        self._auction(pair)
+        task = self._auction_tasks.pop(pair, None)
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+        # journaled after the periodic uncross, which may be finished above
+        sequence = self._journaled(Kind.StopAuction, pair)
+        clearing = await self._exclusive(pair, partial(self._close_auction, pair))
+        await self._committed(sequence)
+        return clearing
+
+    def _auction(self, pair: SymbolPair) -> CallAuction:
+        self._check_pair(pair)
+        try:
+            return self._auctions[pair]
+        except KeyError:
+            raise AuctionError("Pair is not in auction")
+
+    async def _open_auction(
+        self, pair: SymbolPair, allocation: Allocation, locked: bool = False
+    ) -> None:
+        if pair in self._auctions:
+            raise AuctionError("Pair is already in auction")
+
+        # resting orders take part in the auction in the order they were created
+        orders = self._order_book[pair].clear()
+        orders.sort(key=lambda order: order.created_ns)
+        self._auctions[pair] = CallAuction(allocation, orders)
+
+    async def _uncross(self, pair: SymbolPair, locked: bool = False) -> Clearing:
+        clearing, reports = self._auction(pair).uncross()
+        if reports:
+            matches: t.List[Match] = [(None, reports)]
+            async with AccountsLock(self._matched_accounts(matches) if locked else ()):
+                await self._process_matches(matches)
+        return clearing
+
+    async def _close_auction(
+        self, pair: SymbolPair, locked: bool = False
+    ) -> Clearing:
+        clearing = await self._uncross(pair, locked)
+
+        # orders left don't cross, since the executed volume was maximal
+        order_book = self._order_book[pair]
+        for order in self._auctions.pop(pair).clear():
+            order_book.add(order)
+        return clearing
+
+    async def _uncross_forever(self, pair: SymbolPair, interval: float) -> None:
+        failures = 0
+        while failures < _UNCROSS_ATTEMPTS:
+            await asyncio.sleep(interval)
+            try:
+                # stop of the auction doesn't interrupt an uncross half way
+                await asyncio.shield(self.uncross_auction(pair))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                failures += 1
+                logger.exception("Periodic uncross of %s failed", pair)
+            else:
+                failures = 0
+
+        # orders of the auction are not left without matching
+        logger.error("Auction of %s is stopped after failed uncrosses", pair)
+        self._auction_tasks.pop(pair, None)
+        try:
+            await self.stop_auction(pair)
+        except Exception:
+            logger.exception("Auction of %s failed to stop", pair)
+
+    async def _exclusive(
+        self, pair: SymbolPair, command: t.Callable[[bool], t.Awaitable[T]]
+    ) -> T:
+        # runs the command by the sequencer of the pair or under the book lock,
+        # the command gets whether accounts have to be locked
+        sequencer = self._sequencers.get(pair)
+        if sequencer is not None:
+            return await sequencer.submit(lambda: command(False))
+
+        async with self._order_book[pair]:
+            return await command(True)
+
     # endregion
 
     # region account management
@@ -85,24 +399,27 @@ class Exchange(EventEmitter[ExchangeEvent]):
     def refill_account(
         self, account_name: str, balance_map: t.Dict[str, float]
     ) -> None:
+        self._journaled(Kind.RefillAccount, account_name, balance_map)
         if account_name not in self._accounts:
             raise WrongCredentials("Account with such credentials is not found")
 
         account = self._accounts[account_name]
 
         for key, value in balance_map.items():
-            account.balance[key] += value
+            account.balance.deposit(key, value)
 
     def create_acc(self, account_name: str, balance_map: t.Dict[str, float]) -> Account:
+        self._journaled(Kind.CreateAccount, account_name, balance_map)
         if account_name in self._accounts:
             raise WrongCredentials("Account already exists")
         account = Account(
-            name=account_name, balance=defaultdict(float, **balance_map), open_orders={}
+            name=account_name, balance=Balance(balance_map), open_orders={}
         )
         self._accounts[account_name] = account
         return account
 
     def delete_acc(self, account_name: str) -> None:
+        self._journaled(Kind.DeleteAccount, account_name)
         if account_name not in self._accounts:
             raise WrongCredentials("Account with such credentials is not found")
         self._accounts.pop(account_name)
@@ -127,41 +444,191 @@ class Exchange(EventEmitter[ExchangeEvent]):
             raise WrongOrderID
 
     async def cancel_order(self, pair: SymbolPair, order_id: int) -> None:
-        if order_id not in self._created_orders:
-            raise WrongOrderID
-        if pair not in self._order_book.keys():
-            raise UnsupportedPairs
-
-        order = self._created_orders[order_id]
-
-        if order.order_type == Order.Type.Market:
-            raise OrderCancellationError("Cannot close market order")
+        sequence = self._journaled(Kind.CancelOrder, pair, order_id)
+        order = self._cancellable_order(pair, order_id)
+        order_book = self._order_book[pair]
 
-        await order.is_matched()  # wait for execution in case it's in process of matching
+        sequencer = self._sequencers.get(pair)
+        if sequencer is not None:
+            # order can't be in process of matching, since commands are sequenced
+            await sequencer.submit(lambda: self._cancel(order_book, order))
+        else:
+            # wait for execution in case it's in process of matching
+            await order.is_matched()
+            async with order_book:
+                await self._cancel(order_book, order, locked=True)
+        await self._committed(sequence)
 
-        if order.status == Order.Status.Closed:
-            raise OrderCancellationError("Order already is closed")
+    async def mass_cancel(
+        self,
+        account_name: t.Optional[str] = None,
+        pair: t.Optional[SymbolPair] = None,
+    ) -> t.List[Order]:
+        # cancels open orders of the account, of the account on the pair or of the pair,
+        # frozen funds are refunded in bulk and a single event is emitted
+        sequence = self._journaled(Kind.MassCancel, account_name, pair)
+        account, pairs = self._mass_cancel_scope(account_name, pair)
+        groups = await asyncio.gather(
+            *(self._mass_cancel_pair(pair, account) for pair in pairs)
+        )
 
-        order_book = self._order_book[pair]
-        if order in order_book:
-            order.mark_closed()
+        cancelled = [order for group in groups for order in group]
+        if cancelled:
             await self.emit(
-                ExchangeEvent.OrderCancelled, order_id=order.order_id,
+                ExchangeEvent.OrdersCancelled,
+                order_ids=[order.order_id for order in cancelled],
             )
+        await self._committed(sequence)
+        return cancelled
+
+    async def create_limit(
+        self,
+        pair: SymbolPair,
+        price: float,
+        side: Order.Side,
+        amount: float,
+        acc_name: str,
+    ) -> Order:
+        sequence = self._journaled(Kind.CreateLimit, pair, price, side, amount, acc_name)
+        order = self._limit_order(pair, price, side, amount, acc_name)
+        order = await self._perform_match(self._order_book[pair], order)
+        await self._committed(sequence)
+        return order
+
+    async def create_market(
+        self, pair: SymbolPair, side: Order.Side, amount: float, acc_name: str
+    ) -> Order:
+        sequence = self._journaled(Kind.CreateMarket, pair, side, amount, acc_name)
+        order = self._market_order(pair, side, amount, acc_name)
+        order = await self._perform_match(self._order_book[pair], order)
+        await self._committed(sequence)
+        return order
 
-            account = order.account
+    async def depth(self, pair: SymbolPair, limit: int) -> Depth:
+        return self.get_order_book(pair).depth(limit)
+
+    async def execute(self, command: Command) -> Order:
+        if isinstance(command, CreateLimit):
+            return await self.create_limit(*command)
+        if isinstance(command, CreateMarket):
+            return await self.create_market(*command)
+
+        await self.cancel_order(*command)
+        return self._created_orders[command.order_id]
+
+    async def execute_batch(
+        self, commands: t.Sequence[Command]
+    ) -> t.List[CommandResult]:
+        # Commands are grouped by pair, every group is executed in order under a single
+        # acquisition of the order book and reports of its matches are processed at once
+        sequence = self._journaled(Kind.Batch, commands)
+        results: t.List[t.Optional[CommandResult]] = [None] * len(commands)
+        groups: t.Dict[SymbolPair, t.List[t.Tuple[int, Command]]] = {}
+        for index, command in enumerate(commands):
+            if command.pair in self._order_book:
+                groups.setdefault(command.pair, []).append((index, command))
+            else:
+                results[index] = UnsupportedPairs("Pair is not supported")
 
-            # Delete order
-            order_book.delete(order)
-            del account.open_orders[order.order_id]
+        await asyncio.gather(
+            *(self._execute_group(pair, group, results) for pair, group in groups.items())
+        )
+        await self._committed(sequence)
+        return t.cast(t.List[CommandResult], results)
 
-            # Return frozen assets
-            symbol, frozen_funds = self._frozen_deposits[order.order_id]
-            account.balance[symbol] += frozen_funds
+    # endregion
+
+    # region journal
+    async def recover(self, records: t.Iterable[Record]) -> None:
+        # commands are applied again in the order they were journaled,
+        # the journal is attached after the recovery, so nothing is journaled twice
+        intervals: t.Dict[SymbolPair, t.Optional[float]] = {}
+        for record in records:
+            fields = record.fields
+            if record.kind == Kind.StartAuction:
+                # periodic uncrosses are journaled, timers start after the recovery
+                pair, allocation, intervals[pair] = fields
+                fields = (pair, allocation, None)
+
+            # a command failed when it was applied the first time fails again
+            with suppress(Exception):
+                result = getattr(self, _JOURNALED_METHODS[record.kind])(*fields)
+                if asyncio.iscoroutine(result):
+                    await result
+
+        for pair, interval in intervals.items():
+            if interval is not None and pair in self._auctions:
+                self._auction_tasks[pair] = asyncio.create_task(
+                    self._uncross_forever(pair, interval)
+                )
 
-            del self._frozen_deposits[order.order_id]
+    def _journaled(self, kind: Kind, *fields: t.Any) -> int:
+        # sequence of the journal record of the command, 0 without a journal
+        journal = self.journal
+        return 0 if journal is None else journal.append(kind, fields)
 
-    async def create_limit(
+    async def _committed(self, sequence: int) -> None:
+        # the result of a command is returned once its record is durable
+        if self.journal is not None:
+            await self.journal.commit(sequence)
+
+    # endregion
+
+    async def _execute_group(
+        self,
+        pair: SymbolPair,
+        group: t.List[t.Tuple[int, Command]],
+        results: t.List[t.Optional[CommandResult]],
+    ) -> None:
+        order_book = self._order_book[pair]
+        sequencer = self._sequencers.get(pair)
+        if sequencer is not None:
+            await sequencer.submit(
+                lambda: self._execute_commands(order_book, group, results)
+            )
+        else:
+            async with order_book:
+                await self._execute_commands(order_book, group, results, locked=True)
+
+    async def _execute_commands(
+        self,
+        order_book: OrderBook,
+        group: t.List[t.Tuple[int, Command]],
+        results: t.List[t.Optional[CommandResult]],
+        locked: bool = False,
+    ) -> None:
+        matches: t.List[Match] = []
+
+        async def process_matches() -> None:
+            async with AccountsLock(self._matched_accounts(matches) if locked else ()):
+                await self._process_matches(matches)
+            matches.clear()
+
+        for index, command in group:
+            try:
+                if isinstance(command, CancelOrder):
+                    order = self._cancellable_order(*command)
+                    # funds of the order may still be released by pending reports
+                    await process_matches()
+                    await self._cancel(order_book, order, locked)
+                else:
+                    if isinstance(command, CreateLimit):
+                        order = self._limit_order(*command)
+                    else:
+                        order = self._market_order(*command)
+                    reports = await self._match_order(order_book, order, locked)
+                    matches.append((order, reports))
+                results[index] = order
+            except Exception as e:
+                results[index] = e
+
+        await process_matches()
+
+    def _check_pair(self, pair: SymbolPair) -> None:
+        if pair not in self._order_book:
+            raise UnsupportedPairs("Pair is not supported")
+
+    def _limit_order(
         self,
         pair: SymbolPair,
         price: float,
@@ -169,48 +636,161 @@ class Exchange(EventEmitter[ExchangeEvent]):
         amount: float,
         acc_name: str,
     ) -> Order:
-        if pair not in self._order_book.keys():
-            raise UnsupportedPairs("Pair is not supported")
-
-        order_book = self._order_book[pair]
+        self._check_pair(pair)
         account = self.get_account(acc_name)
-        price = round(price, order_book.min_price_power)
 
-        if not price:
+        if to_ticks(price) <= 0:
             raise IncorrectPrice("Pair is not supported")
+        if to_lots(amount) <= 0:
+            raise TooSmallOrderAmount
 
-        order = Order(
+        return Order(
             symbol_pair=pair,
             amount=amount,
             price=price,
             side=side,
             account=account,
             order_type=Order.Type.Limit,
+            order_id=self.order_ids(),
         )
 
-        return await self._perform_match(order_book, order)
-
-    async def create_market(
+    def _market_order(
         self, pair: SymbolPair, side: Order.Side, amount: float, acc_name: str
     ) -> Order:
-        if pair not in self._order_book:
-            raise UnsupportedPairs("Pair is not supported")
+        self._check_pair(pair)
+        if to_lots(amount) <= 0:
+            raise TooSmallOrderAmount
         account = self.get_account(acc_name)
-        order = Order(
+
+        return Order(
             symbol_pair=pair,
             amount=amount,
             side=side,
             account=account,
             order_type=Order.Type.Market,
+            order_id=self.order_ids(),
         )
+
+    def _cancellable_order(self, pair: SymbolPair, order_id: int) -> Order:
+        if order_id not in self._created_orders:
+            raise WrongOrderID
+        self._check_pair(pair)
+
+        order = self._created_orders[order_id]
+
+        if order.order_type == Order.Type.Market:
+            raise OrderCancellationError("Cannot close market order")
+
+        return order
+
+    async def _cancel(
+        self, order_book: OrderBook, order: Order, locked: bool = False
+    ) -> None:
+        if order.status == Order.Status.Closed:
+            raise OrderCancellationError("Order already is closed")
+
+        book = self._auctions.get(order.symbol_pair, order_book)
+        if book.cancel(order.order_id) is not None:
+            await self._close_cancelled(order, locked)
+            if book is order_book:
+                await self._emit_cancelled_levels(order.symbol_pair, [order])
+
+    async def _close_cancelled(self, order: Order, locked: bool = False) -> None:
+        await self._release_cancelled([order], locked)
+        await self.emit(
+            ExchangeEvent.OrderCancelled, order_id=order.order_id,
+        )
+
+    async def _release_cancelled(
+        self, orders: t.Sequence[Order], locked: bool = False
+    ) -> None:
+        accounts = {order.account.name: order.account for order in orders}
+        async with AccountsLock(accounts.values() if locked else ()):
+            refunds: t.DefaultDict[t.Tuple[str, str], int] = defaultdict(int)
+            for order in orders:
+                order.mark_closed()
+
+                # Delete order
+                del order.account.open_orders[order.order_id]
+
+                # Collect frozen assets
+                symbol, frozen_funds = self._frozen_deposits.pop(order.order_id)
+                refunds[(order.account.name, symbol)] += frozen_funds
+
+            # Return frozen assets
+            for (account_name, symbol), funds in refunds.items():
+                accounts[account_name].balance.units[symbol] += funds
+
+            if self.is_subscribed(ExchangeEvent.AccountUpdate):
+                for name, account in accounts.items():
+                    cancelled = [
+                        ("cancelled", order)
+                        for order in orders
+                        if order.account is account
+                    ]
+                    symbols = [symbol for owner, symbol in refunds if owner == name]
+                    await self._emit_account_update(account, cancelled, symbols)
+
+    def _mass_cancel_scope(
+        self, account_name: t.Optional[str], pair: t.Optional[SymbolPair]
+    ) -> t.Tuple[t.Optional[Account], t.List[SymbolPair]]:
+        if pair is not None:
+            self._check_pair(pair)
+            account = None if account_name is None else self.get_account(account_name)
+            return account, [pair]
+        if account_name is None:
+            raise OrderCancellationError("Account or pair has to be specified")
+
+        account = self.get_account(account_name)
+        pairs = dict.fromkeys(order.symbol_pair for order in self._open_limits(account))
+        return account, list(pairs)
+
+    @staticmethod
+    def _open_limits(
+        account: Account, pair: t.Optional[SymbolPair] = None
+    ) -> t.List[Order]:
+        return [
+            order
+            for order in account.open_orders.values()
+            if order.order_type == Order.Type.Limit
+            and (pair is None or order.symbol_pair == pair)
+        ]
+
+    async def _mass_cancel_pair(
+        self, pair: SymbolPair, account: t.Optional[Account]
+    ) -> t.List[Order]:
         order_book = self._order_book[pair]
+        sequencer = self._sequencers.get(pair)
+        if sequencer is not None:
+            return await sequencer.submit(
+                lambda: self._cancel_in_book(order_book, pair, account)
+            )
 
-        return await self._perform_match(order_book, order)
+        async with order_book:
+            return await self._cancel_in_book(order_book, pair, account, locked=True)
 
-    # endregion
+    async def _cancel_in_book(
+        self,
+        order_book: OrderBook,
+        pair: SymbolPair,
+        account: t.Optional[Account],
+        locked: bool = False,
+    ) -> t.List[Order]:
+        book = self._auctions.get(pair, order_book)
+        if account is None:
+            orders = book.clear()
+        else:
+            orders = book.cancel_many(
+                order.order_id for order in self._open_limits(account, pair)
+            )
+
+        await self._release_cancelled(orders, locked)
+        if book is order_book and orders:
+            await self._emit_cancelled_levels(pair, orders)
+        return orders
 
-    async def _match_preparation(self, order: Order) -> None:
-        async with order.account:
+    async def _match_preparation(self, order: Order, locked: bool = False) -> None:
+        async with AccountsLock((order.account,) if locked else ()):
             await self._froze_assets(order, order.account)
 
         self._created_orders[order.order_id] = order
@@ -219,37 +799,81 @@ class Exchange(EventEmitter[ExchangeEvent]):
         await self.emit(
             ExchangeEvent.OrderCreated, order_id=order.order_id,
         )
+        await self._emit_created(order)
 
     async def _perform_match(self, order_book: OrderBook, order: Order) -> Order:
-        async with order_book:
-            await self._match_preparation(order)
+        sequencer = self._sequencers.get(order.symbol_pair)
+        if sequencer is not None:
+            await sequencer.submit(lambda: self._match(order_book, order))
+        else:
+            async with order_book:
+                await self._match(order_book, order, locked=True)
 
-            if order.status != Order.Status.Closed:
-                if order.order_type == Order.Type.Limit:
-                    reports = await MatchModel.limit_match(
-                        taker=order, order_book=order_book
-                    )
-                else:
-                    reports = await MatchModel.market_match(
-                        taker=order, order_book=order_book
-                    )
+        return order
 
-                await self._process_reports(order_book, order, *reports)
+    async def _match(
+        self, order_book: OrderBook, order: Order, locked: bool = False
+    ) -> None:
+        # Without sequencer book lock has to be held by caller and accounts are locked here
+        matches = [(order, await self._match_order(order_book, order, locked))]
+        async with AccountsLock(self._matched_accounts(matches) if locked else ()):
+            await self._process_matches(matches)
+
+    async def _match_order(
+        self, order_book: OrderBook, order: Order, locked: bool = False
+    ) -> t.List[MatchReport]:
+        auction = self._auctions.get(order.symbol_pair)
+        if auction is not None:
+            if order.order_type == Order.Type.Market:
+                raise OrderCreationError("Market orders are not accepted in auction")
+            await self._match_preparation(order, locked)
+            auction.add(order)
+            return []
+
+        await self._match_preparation(order, locked)
+
+        if self.yield_policy.is_synchronous:
+            if order.order_type == Order.Type.Limit:
+                return MatchModel.limit_match_sync(order, order_book)
+            return MatchModel.market_match_sync(order, order_book)
 
-        return order
+        if order.order_type == Order.Type.Limit:
+            return await MatchModel.limit_match(
+                taker=order, order_book=order_book, policy=self.yield_policy
+            )
+        return await MatchModel.market_match(
+            taker=order, order_book=order_book, policy=self.yield_policy
+        )
 
-    async def _process_reports(
-        self, order_book: OrderBook, taker: Order, *reports: MatchReport
+    @staticmethod
+    def _matched_accounts(matches: t.Sequence[Match]) -> t.List[Account]:
+        # reports touch balances of the taker and every matched maker
+        accounts = []
+        for taker, reports in matches:
+            if taker is not None:
+                accounts.append(taker.account)
+            accounts.extend(report.order.account for report in reports)
+        return accounts
+
+    async def _process_reports(self, taker: Order, *reports: MatchReport) -> None:
+        await self._process_matches([(taker, reports)])
+
+    async def _process_matches(
+        self,
+        matches: t.Sequence[Match],
+        changes: t.Optional[t.Mapping[SymbolPair, BookChange]] = None,
     ) -> None:
-        def restore_difference(order: Order, actual_spent: float) -> None:
-            # Restore taker difference in actual spent funds and frozen funds
+        # applies reports of takers matched one after another in a single pass,
+        # book changes of pairs are read from the order books unless given
+        def restore_difference(order: Order, filled: int, actual_spent: int) -> None:
+            # Restore difference in actual spent funds and funds frozen for filled lots
             symbol, frozen_funds = self._frozen_deposits[order.order_id]
 
             if order.order_type == Order.Type.Limit:
                 expected_to_spend = (
-                    order.filled
+                    lots_to_units(filled)
                     if order.side == Order.Side.Sell
-                    else order.filled * order.price  # type: ignore
+                    else quote_units(filled, order.price_ticks)  # type: ignore
                 )
 
                 self._frozen_deposits[order.order_id] = (
@@ -259,103 +883,240 @@ class Exchange(EventEmitter[ExchangeEvent]):
             else:
                 expected_to_spend = frozen_funds
 
-            order.account.balance[symbol] += expected_to_spend - actual_spent
-
-        taker_real_spending = 0.0
-
-        updated_prices: t.Set[t.Tuple[float, Order.Side]] = set()
+            order.account.balance.units[symbol] += expected_to_spend - actual_spent
+
+        policy = self.yield_policy
+        budget = None if policy.is_synchronous else policy.budget()
+
+        # changed levels and closed order ids of every pair
+        changed_levels: t.DefaultDict[
+            SymbolPair, t.Set[t.Tuple[Order.Side, int]]
+        ] = defaultdict(set)
+        closed_ids: t.DefaultDict[SymbolPair, t.Dict[int, None]] = defaultdict(dict)
+        trades: t.DefaultDict[SymbolPair, t.List[Trade]] = defaultdict(list)
+        # filled orders and changed symbols of accounts, if somebody follows them
+        updates: t.Optional[
+            t.Dict[str, t.Tuple[Account, t.Dict[int, Order], t.Dict[str, None]]]
+        ] = None
+        if self.is_subscribed(ExchangeEvent.AccountUpdate):
+            updates = {}
+        now = time.time()
+        now_ms = int(now * 1000)
+
+        for taker, reports in matches:
+            taker_filled = 0
+            taker_real_spending = 0
+
+            # reports of an auction don't change the order book
+            taker_id, taker_side = NO_ORDER, NO_TAKER
+            if taker is not None:
+                levels = changed_levels[taker.symbol_pair]
+                if taker.price_ticks is not None:
+                    levels.add((taker.side, taker.price_ticks))
+                taker_id = taker.order_id
+                taker_side = BUY if taker.side == Order.Side.Buy else SELL
+
+            for report in reports:
+                order = report.order
+                account = order.account
+                balance = account.balance.units
+                fee = (
+                    account.maker_fee
+                    if report.owner_type == ReportOwnerType.Maker
+                    else account.taker_fee
+                )
+                if taker is not None and order.price_ticks is not None:
+                    levels.add((order.side, order.price_ticks))
+                if order.status == Order.Status.Closed:
+                    closed_ids[order.symbol_pair][order.order_id] = None
+                if updates is not None:
+                    _, orders, symbols = updates.setdefault(
+                        account.name, (account, {}, {})
+                    )
+                    orders[order.order_id] = order
+                    symbols.update(dict.fromkeys(order.symbol_pair))
+                # a trade is reported by its maker, or by its buyer in an auction
+                if (
+                    report.owner_type == ReportOwnerType.Maker
+                    if taker is not None
+                    else order.side == Order.Side.Buy
+                ):
+                    price_ticks = report.quote_matched // report.base_matched
+                    trades[order.symbol_pair].append(
+                        (
+                            from_ticks(price_ticks),
+                            from_lots(report.base_matched),
+                            None if taker is None else taker.side.value,
+                        )
+                    )
+                    tape = self._tapes.get(order.symbol_pair)
+                    if tape is not None:
+                        tape.append(
+                            price_ticks,
+                            report.base_matched,
+                            order.order_id,
+                            taker_id,
+                            taker_side,
+                            now_ms,
+                        )
+
+                # Recalculate balance
+                if order.side == Order.Side.Buy:
+                    balance[order.symbol_pair.Base] += apply_fee(
+                        lots_to_units(report.base_matched), fee
+                    )
 
-        closed_ids = {
-            report.order.order_id
-            for report in reports
-            if report.order.status == Order.Status.Closed
-        }
+                    # Restore maker difference in actual spent funds and frozen funds
+                    if report.owner_type == ReportOwnerType.Maker:
+                        restore_difference(
+                            order, report.base_matched, report.quote_matched
+                        )
 
-        for report in reports:
-            order = report.order
-            account = order.account
-            commission = 1 - (
-                account.maker_fee
-                if report.owner_type == ReportOwnerType.Maker
-                else account.taker_fee
-            )
-            if order.price is not None:
-                updated_prices.add((order.price, order.side))
+                    # Accumulate taker actual spent funds
+                    if report.owner_type == ReportOwnerType.Taker:
+                        taker_real_spending += report.quote_matched
+                else:
+                    balance[order.symbol_pair.Quote] += apply_fee(
+                        report.quote_matched, fee
+                    )
 
-            # Recalculate balance
-            if order.side == Order.Side.Buy:
-                account.balance[order.symbol_pair.Base] += (
-                    report.base_matched * commission
-                )
+                    # Restore maker difference in actual spent funds and frozen funds
+                    if report.owner_type == ReportOwnerType.Maker:
+                        restore_difference(
+                            order,
+                            report.base_matched,
+                            lots_to_units(report.base_matched),
+                        )
 
-                # Restore maker difference in actual spent funds and frozen funds
-                if report.owner_type == ReportOwnerType.Maker:
-                    restore_difference(order, report.quote_matched)
+                    # Accumulate taker actual spent funds
+                    if report.owner_type == ReportOwnerType.Taker:
+                        taker_real_spending += lots_to_units(report.base_matched)
 
-                # Accumulate taker actual spent funds
                 if report.owner_type == ReportOwnerType.Taker:
-                    taker_real_spending += report.quote_matched
-            else:
-                account.balance[order.symbol_pair.Quote] += (
-                    report.quote_matched * commission
-                )
+                    taker_filled += report.base_matched
+
+                # Delete order if it was matched
+                if report.match_type == MatchReportType.Full:
+                    del account.open_orders[order.order_id]
+
+                if budget is not None and budget.spend():
+                    await asyncio.sleep(0)
+
+            # Restore taker difference in actual spent funds and frozen funds,
+            # taker may be filled later as a maker of the next taker
+            if taker is not None:
+                restore_difference(taker, taker_filled, taker_real_spending)
+
+        for pair_ids in closed_ids.values():
+            for order_id in pair_ids:
+                del self._frozen_deposits[order_id]
+
+        # a single event per pair instead of one per changed level and closed order
+        for pair in {**changed_levels, **closed_ids}:
+            order_ids = list(closed_ids.get(pair, ()))
+            change = changes.get(pair) if changes is not None else None
+            if change is None:
+                change = self._level_amounts(pair, changed_levels.get(pair, ()))
+            await self._emit_book_delta(pair, change, order_ids)
+
+        for pair, pair_trades in trades.items():
+            if pair in self._candles:
+                summary = summarize(pair_trades)
+                self._candles[pair].add(now_ms, summary)
+                self._tickers[pair].add(now_ms, summary)
+            await self.emit(
+                ExchangeEvent.Trades, symbol_pair=pair, time=now, trades=pair_trades
+            )
 
-                # Restore maker difference in actual spent funds and frozen funds
-                if report.owner_type == ReportOwnerType.Maker:
-                    restore_difference(order, report.base_matched)
+        for account, orders, symbols in (updates or {}).values():
+            await self._emit_account_update(
+                account, [("filled", order) for order in orders.values()], symbols
+            )
 
-                # Accumulate taker actual spent funds
-                if report.owner_type == ReportOwnerType.Taker:
-                    taker_real_spending += report.base_matched
+    async def _emit_created(self, order: Order) -> None:
+        if self.is_subscribed(ExchangeEvent.AccountUpdate):
+            symbol, _ = self._frozen_deposits[order.order_id]
+            await self._emit_account_update(
+                order.account, [("created", order)], [symbol]
+            )
 
-            # Delete order if it was matched
-            if report.match_type == MatchReportType.Full:
-                del account.open_orders[order.order_id]
+    async def _emit_account_update(
+        self,
+        account: Account,
+        orders: t.Iterable[t.Tuple[str, Order]],
+        symbols: t.Iterable[str],
+    ) -> None:
+        # orders with what happened to them and new balances of the symbols
+        balance = account.balance
+        await self.emit(
+            ExchangeEvent.AccountUpdate,
+            account_name=account.name,
+            orders=[{"event": event, **order.to_json()} for event, order in orders],
+            balances={symbol: balance[symbol] for symbol in symbols},
+        )
 
-            await asyncio.sleep(0)
+    async def _emit_cancelled_levels(
+        self,
+        pair: SymbolPair,
+        orders: t.Sequence[Order],
+        change: t.Optional[BookChange] = None,
+    ) -> None:
+        if change is None:
+            levels = {(order.side, t.cast(int, order.price_ticks)) for order in orders}
+            change = self._level_amounts(pair, levels)
+        await self._emit_book_delta(pair, change, [])
 
-        # Send Update Event:
-        for price, side in updated_prices:
-            await self.emit(
-                ExchangeEvent.OrderBookUpdated,
-                symbol_pair=taker.symbol_pair,
-                side=taker.side,
-                price=price,
-            )
+    async def _emit_book_delta(
+        self, pair: SymbolPair, change: BookChange, closed_ids: t.List[int]
+    ) -> None:
+        version, amounts = change
 
-        # Restore taker difference in actual spent funds and frozen funds
-        restore_difference(taker, taker_real_spending)
+        # levels of both sides from the best price, 0 amount means removed level
+        bids: t.List[t.Tuple[float, float]] = []
+        asks: t.List[t.Tuple[float, float]] = []
+        for side, price, amount in sorted(amounts, key=lambda level: level[1]):
+            level = (from_ticks(price), from_lots(amount))
+            (bids if side == Order.Side.Buy else asks).append(level)
+        bids.reverse()
 
-        for order_id in closed_ids:
-            del self._frozen_deposits[order_id]
-            await self.emit(
-                ExchangeEvent.OrderClosed, order_id=order_id,
-            )
+        await self.emit(
+            ExchangeEvent.BookDelta,
+            symbol_pair=pair,
+            version=version,
+            bids=bids,
+            asks=asks,
+            closed_ids=closed_ids,
+        )
+
+    def _level_amounts(
+        self, pair: SymbolPair, levels: t.Iterable[t.Tuple[Order.Side, int]]
+    ) -> BookChange:
+        # version of the order book and new aggregated amounts of the levels
+        order_book = self._order_book[pair]
+        return (
+            order_book.version,
+            [
+                (side, price, order_book.level_amount(side, price))
+                for side, price in levels
+            ],
+        )
 
     @staticmethod
-    def _market_quote_size(order_book: OrderBook, order: Order) -> float:
-        required = 0.0
-        base_left = order.amount
-        for maker in order_book.Asks:
-            if base_left != 0:
-                break
-            amount = min(maker.amount, base_left)
-            required += amount * maker.price  # type: ignore
-            base_left -= amount
-
-        return required
+    def _market_quote_size(order_book: OrderBook, order: Order) -> int:
+        return order_book.Asks.sweep_base(order.amount_lots).quote
 
     async def _froze_assets(self, order: Order, account: Account) -> None:
-        base_balance = account.balance[order.symbol_pair.Base]
-        quote_balance = account.balance[order.symbol_pair.Quote]
-        order_book = self.get_order_book(order.symbol_pair)
+        balance = account.balance.units
+        base_balance = balance[order.symbol_pair.Base]
+        quote_balance = balance[order.symbol_pair.Quote]
 
         # In case of Market buy order, we grant access for the order book and synchronously estimate required quote size
         # If order amount is more than ask size we will get accumulated ask quote size as required
         if order.order_type == Order.Type.Market and order.side == Order.Side.Buy:
+            order_book = self.get_order_book(order.symbol_pair)
             required = self._market_quote_size(order_book, order)
             if quote_balance >= required:
-                account.balance[order.symbol_pair.Quote] -= required
+                balance[order.symbol_pair.Quote] -= required
                 self._frozen_deposits[order.order_id] = (
                     order.symbol_pair.Quote,
                     required,
@@ -364,20 +1125,22 @@ class Exchange(EventEmitter[ExchangeEvent]):
                 raise InsufficientFunds
         # In other cases we can froze assets without any problem
         elif order.side == Order.Side.Buy:
-            if quote_balance >= order.amount * order.price:  # type: ignore
-                account.balance[order.symbol_pair.Quote] -= order.amount * order.price  # type: ignore
+            required = quote_units(order.amount_lots, order.price_ticks)  # type: ignore
+            if quote_balance >= required:
+                balance[order.symbol_pair.Quote] -= required
                 self._frozen_deposits[order.order_id] = (
                     order.symbol_pair.Quote,
-                    order.amount * order.price,  # type: ignore
+                    required,
                 )
             else:
                 raise InsufficientFunds
         else:
-            if base_balance >= order.amount:
-                account.balance[order.symbol_pair.Base] -= order.amount
+            required = lots_to_units(order.amount_lots)
+            if base_balance >= required:
+                balance[order.symbol_pair.Base] -= required
                 self._frozen_deposits[order.order_id] = (
                     order.symbol_pair.Base,
-                    order.amount,
+                    required,
                 )
             else:
                 raise InsufficientFunds
@@ -0,0 +1,425 @@
+"""Write ahead journal of state changing commands of an exchange.
+
+A record is ``sequence, kind, fields`` in little endian, fields of a kind are
+written in the order of arguments of its exchange method. Appending only
+encodes the record to a buffer, a background task writes and fsyncs records
+appended during ``commit_interval_us`` as a block ``length, crc32, records``,
+so concurrent commands share a single fsync. A command is acknowledged after
+its block is durable, so a torn or corrupt block at the end of the file holds
+unacknowledged records only, it is cut when the journal is opened again.
+"""
+import asyncio
+import heapq
+import os
+import struct
+import typing as t
+import zlib
+from enum import IntEnum
+from functools import lru_cache
+
+from .auction import Allocation
+from .commands import CancelOrder, Command, CreateLimit, CreateMarket
+from .entities.order import Order
+from .entities.symbol_pair import SymbolPair
+from .errors import JournalError
+
+
+class Kind(IntEnum):
+    CreateAccount = 1
+    DeleteAccount = 2
+    RefillAccount = 3
+    CreatePair = 4
+    DeletePair = 5
+    ClearOrderBook = 6
+    CreateLimit = 7
+    CreateMarket = 8
+    CancelOrder = 9
+    MassCancel = 10
+    Batch = 11
+    StartAuction = 12
+    UncrossAuction = 13
+    StopAuction = 14
+
+
+class Record(t.NamedTuple):
+    sequence: int
+    kind: Kind
+    fields: t.Tuple[t.Any, ...]
+
+
+_HEADER = struct.Struct("<II")
+_ENTRY = struct.Struct("<QB")
+_U16 = struct.Struct("<H")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+
+_Writer = t.Callable[[bytearray, t.Any], None]
+_Reader = t.Callable[[bytes, int], t.Tuple[t.Any, int]]
+
+
+@lru_cache(maxsize=4096)
+def _encoded_str(value: str) -> bytes:
+    # names of accounts and symbols repeat in almost every record
+    data = value.encode()
+    return _U16.pack(len(data)) + data
+
+
+def _put_str(out: bytearray, value: str) -> None:
+    out += _encoded_str(value)
+
+
+def _get_str(data: bytes, offset: int) -> t.Tuple[str, int]:
+    (size,) = _U16.unpack_from(data, offset)
+    offset += _U16.size
+    return data[offset : offset + size].decode(), offset + size
+
+
+@lru_cache(maxsize=1024)
+def _encoded_pair(pair: SymbolPair) -> bytes:
+    return _encoded_str(pair.Base) + _encoded_str(pair.Quote)
+
+
+def _put_pair(out: bytearray, pair: SymbolPair) -> None:
+    out += _encoded_pair(pair)
+
+
+def _get_pair(data: bytes, offset: int) -> t.Tuple[SymbolPair, int]:
+    base, offset = _get_str(data, offset)
+    quote, offset = _get_str(data, offset)
+    return SymbolPair(base, quote), offset
+
+
+def _put_number(number: struct.Struct) -> _Writer:
+    def put(out: bytearray, value: t.Any) -> None:
+        out += number.pack(value)
+
+    return put
+
+
+def _get_number(number: struct.Struct) -> _Reader:
+    def get(data: bytes, offset: int) -> t.Tuple[t.Any, int]:
+        return number.unpack_from(data, offset)[0], offset + number.size
+
+    return get
+
+
+def _put_side(out: bytearray, side: Order.Side) -> None:
+    out.append(side == Order.Side.Buy)
+
+
+def _get_side(data: bytes, offset: int) -> t.Tuple[Order.Side, int]:
+    return (Order.Side.Buy if data[offset] else Order.Side.Sell), offset + 1
+
+
+def _put_allocation(out: bytearray, allocation: Allocation) -> None:
+    out.append(allocation.value)
+
+
+def _get_allocation(data: bytes, offset: int) -> t.Tuple[Allocation, int]:
+    return Allocation(data[offset]), offset + 1
+
+
+def _put_balances(out: bytearray, balances: t.Mapping[str, float]) -> None:
+    out += _U16.pack(len(balances))
+    for symbol, amount in balances.items():
+        _put_str(out, symbol)
+        out += _F64.pack(amount)
+
+
+def _get_balances(data: bytes, offset: int) -> t.Tuple[t.Dict[str, float], int]:
+    (size,) = _U16.unpack_from(data, offset)
+    offset += _U16.size
+    balances = {}
+    for _ in range(size):
+        symbol, offset = _get_str(data, offset)
+        (balances[symbol],) = _F64.unpack_from(data, offset)
+        offset += _F64.size
+    return balances, offset
+
+
+def _optional(put: _Writer, get: _Reader) -> t.Tuple[_Writer, _Reader]:
+    # a flag byte tells whether the value follows
+    def put_optional(out: bytearray, value: t.Any) -> None:
+        out.append(value is not None)
+        if value is not None:
+            put(out, value)
+
+    def get_optional(data: bytes, offset: int) -> t.Tuple[t.Any, int]:
+        if not data[offset]:
+            return None, offset + 1
+        return get(data, offset + 1)
+
+    return put_optional, get_optional
+
+
+def _put_commands(out: bytearray, commands: t.Sequence[Command]) -> None:
+    out += _U16.pack(len(commands))
+    for command in commands:
+        kind = _COMMAND_KINDS[type(command)]
+        out.append(kind)
+        _put_fields(out, kind, command)
+
+
+def _get_commands(data: bytes, offset: int) -> t.Tuple[t.List[Command], int]:
+    (size,) = _U16.unpack_from(data, offset)
+    offset += _U16.size
+    commands = []
+    for _ in range(size):
+        kind = Kind(data[offset])
+        fields, offset = _get_fields(data, offset + 1, kind)
+        commands.append(_COMMAND_TYPES[kind](*fields))
+    return commands, offset
+
+
+_STR = (_put_str, _get_str)
+_PAIR = (_put_pair, _get_pair)
+_INT = (_put_number(_I64), _get_number(_I64))
+_FLOAT = (_put_number(_F64), _get_number(_F64))
+_SIDE = (_put_side, _get_side)
+_BALANCES = (_put_balances, _get_balances)
+
+# codecs of fields of every kind, in the order of arguments of exchange methods
+_FIELDS: t.Dict[Kind, t.Tuple[t.Tuple[_Writer, _Reader], ...]] = {
+    Kind.CreateAccount: (_STR, _BALANCES),
+    Kind.DeleteAccount: (_STR,),
+    Kind.RefillAccount: (_STR, _BALANCES),
+    Kind.CreatePair: (_PAIR,),
+    Kind.DeletePair: (_PAIR,),
+    Kind.ClearOrderBook: (_PAIR,),
+    Kind.CreateLimit: (_PAIR, _FLOAT, _SIDE, _FLOAT, _STR),
+    Kind.CreateMarket: (_PAIR, _SIDE, _FLOAT, _STR),
+    Kind.CancelOrder: (_PAIR, _INT),
+    Kind.MassCancel: (_optional(*_STR), _optional(*_PAIR)),
+    Kind.Batch: ((_put_commands, _get_commands),),
+    Kind.StartAuction: (
+        _PAIR,
+        (_put_allocation, _get_allocation),
+        _optional(*_FLOAT),
+    ),
+    Kind.UncrossAuction: (_PAIR,),
+    Kind.StopAuction: (_PAIR,),
+}
+
+_COMMAND_TYPES: t.Dict[Kind, t.Type[t.Any]] = {
+    Kind.CreateLimit: CreateLimit,
+    Kind.CreateMarket: CreateMarket,
+    Kind.CancelOrder: CancelOrder,
+}
+_COMMAND_KINDS = {command: kind for kind, command in _COMMAND_TYPES.items()}
+
+
+_LIMIT = struct.Struct("<d?d")
+_MARKET = struct.Struct("<?d")
+
+
+def _put_limit(out: bytearray, fields: t.Sequence[t.Any]) -> None:
+    pair, price, side, amount, account_name = fields
+    out += _encoded_pair(pair)
+    out += _LIMIT.pack(price, side is Order.Side.Buy, amount)
+    out += _encoded_str(account_name)
+
+
+def _put_market(out: bytearray, fields: t.Sequence[t.Any]) -> None:
+    pair, side, amount, account_name = fields
+    out += _encoded_pair(pair)
+    out += _MARKET.pack(side is Order.Side.Buy, amount)
+    out += _encoded_str(account_name)
+
+
+def _put_cancel(out: bytearray, fields: t.Sequence[t.Any]) -> None:
+    pair, order_id = fields
+    out += _encoded_pair(pair)
+    out += _I64.pack(order_id)
+
+
+# writers of kinds of the order entry, the same bytes as writers of their fields
+_ORDER_ENTRY: t.Dict[Kind, t.Callable[[bytearray, t.Sequence[t.Any]], None]] = {
+    Kind.CreateLimit: _put_limit,
+    Kind.CreateMarket: _put_market,
+    Kind.CancelOrder: _put_cancel,
+}
+
+
+def _put_fields(out: bytearray, kind: Kind, fields: t.Sequence[t.Any]) -> None:
+    put_order_entry = _ORDER_ENTRY.get(kind)
+    if put_order_entry is not None:
+        put_order_entry(out, fields)
+        return
+    for (put, _), value in zip(_FIELDS[kind], fields):
+        put(out, value)
+
+
+def _get_fields(
+    data: bytes, offset: int, kind: Kind
+) -> t.Tuple[t.Tuple[t.Any, ...], int]:
+    fields = []
+    for _, get in _FIELDS[kind]:
+        value, offset = get(data, offset)
+        fields.append(value)
+    return tuple(fields), offset
+
+
+def _blocks(data: bytes) -> t.Iterator[t.Tuple[int, t.List[Record]]]:
+    # records of blocks with offsets of their ends, up to the first torn block
+    offset = 0
+    while offset + _HEADER.size <= len(data):
+        size, checksum = _HEADER.unpack_from(data, offset)
+        start = offset + _HEADER.size
+        block = data[start : start + size]
+        # blocks are never empty, a zero header is a tail filled by the file system
+        if not size or len(block) < size or zlib.crc32(block) != checksum:
+            return
+
+        records = []
+        position = 0
+        while position < size:
+            sequence, kind = _ENTRY.unpack_from(block, position)
+            fields, position = _get_fields(block, position + _ENTRY.size, Kind(kind))
+            records.append(Record(sequence, Kind(kind), fields))
+        offset = start + size
+        yield offset, records
+
+
+def read_journal(path: str) -> t.Iterator[Record]:
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as file:
+        data = file.read()
+    for _, records in _blocks(data):
+        yield from records
+
+
+class Journal:
+    """Appends records to the journal at ``path`` and makes them durable.
+
+    ``append`` returns the sequence of the record, ``commit`` waits until the
+    record and every record before it are on disk. The commit task has to be
+    started with ``start`` inside of a running event loop.
+    """
+
+    path: str
+    commit_interval_us: int
+    # sequence of the last appended and of the last durable record
+    sequence: int
+    committed: int
+
+    _fd: int
+    _buffer: bytearray
+    # sequences and futures of commits being waited for
+    _waiters: t.List[t.Tuple[int, int, "asyncio.Future[None]"]]
+    _appended: asyncio.Event
+    _task: t.Optional["asyncio.Task[None]"]
+    _stopping: bool
+    _error: t.Optional[Exception]
+
+    def __init__(self, path: str, commit_interval_us: int = 5000) -> None:
+        self.path = path
+        self.commit_interval_us = commit_interval_us
+        self.sequence = 0
+
+        end = 0
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                data = file.read()
+            for end, records in _blocks(data):
+                self.sequence = records[-1].sequence
+        self.committed = self.sequence
+
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+        # a torn tail of the last run is cut, so new blocks are readable
+        os.ftruncate(self._fd, end)
+        os.lseek(self._fd, end, os.SEEK_SET)
+        self._buffer = bytearray()
+        self._waiters = []
+        self._appended = asyncio.Event()
+        self._task = None
+        self._stopping = False
+        self._error = None
+
+    def append(self, kind: Kind, fields: t.Sequence[t.Any]) -> int:
+        if self._error is not None:
+            raise JournalError("Journal is not writable") from self._error
+
+        self.sequence += 1
+        buffer = self._buffer
+        buffer += _ENTRY.pack(self.sequence, kind)
+        _put_fields(buffer, kind, fields)
+        self._appended.set()
+        return self.sequence
+
+    async def commit(self, sequence: int) -> None:
+        if sequence <= self.committed:
+            return
+        if self._error is not None:
+            raise JournalError("Journal is not writable") from self._error
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (sequence, id(future), future))
+        await future
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._commit_forever())
+
+    async def stop(self) -> None:
+        # records appended so far are committed before the file is closed,
+        # the task isn't cancelled, so a write is never interrupted
+        self._stopping = True
+        self._appended.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self._write()
+        os.close(self._fd)
+
+    async def _commit_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        interval = self.commit_interval_us / 10 ** 6
+        started = -interval
+        while not self._stopping:
+            await self._appended.wait()
+            # at most one fsync per interval, records of concurrent commands
+            # appended meanwhile share it
+            delay = started + interval - loop.time()
+            if delay > 0 and not self._stopping:
+                await asyncio.sleep(delay)
+            started = loop.time()
+            await self._write()
+
+    async def _write(self) -> None:
+        self._appended.clear()
+        if self._error is not None:
+            return
+
+        data, self._buffer = self._buffer, bytearray()
+        sequence = self.sequence
+        if data:
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._write_sync, data
+                )
+            except OSError as e:
+                # a failed fsync leaves the file unknown, nothing is committed anymore
+                self._error = e
+                self._release(JournalError("Journal is not writable"))
+                return
+
+        self.committed = sequence
+        self._release()
+
+    def _write_sync(self, data: bytearray) -> None:
+        view = memoryview(_HEADER.pack(len(data), zlib.crc32(data)) + data)
+        while view:
+            view = view[os.write(self._fd, view) :]
+        os.fsync(self._fd)
+
+    def _release(self, error: t.Optional[Exception] = None) -> None:
+        waiters = self._waiters
+        while waiters and (error is not None or waiters[0][0] <= self.committed):
+            _, _, future = heapq.heappop(waiters)
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
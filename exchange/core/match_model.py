@@ -3,10 +3,10 @@ import operator
 import typing as t
 from enum import Enum, auto
 
-import numpy as np
-
+from .entities.fixed_point import quote_units
 from .entities.order import Order
 from .entities.order_book import OrderBook
+from .yield_policy import YieldPolicy
 
 
 class ReportOwnerType(Enum):
@@ -19,115 +19,158 @@ class MatchReportType(Enum):
     Partial = auto()
 
 
+# price, amount and side of the taker of a trade, trades of an auction have no taker
+Trade = t.Tuple[float, float, t.Optional[str]]
+
+
 class MatchReport(t.NamedTuple):
     owner_type: ReportOwnerType
     match_type: MatchReportType
     order: Order
-    quote_matched: float
-    base_matched: float
+    # balance units of quote asset and lots of base asset
+    quote_matched: int
+    base_matched: int
 
 
 class MatchModel:
+    """Matching of a taker against resting orders of the order book.
+
+    Matching loops are generators stepping once per fill, they are either run
+    to completion at once or yield to the event loop when the budget of the
+    given YieldPolicy is spent.
+    """
+
     @classmethod
     async def limit_match(
-        cls, taker: Order, order_book: OrderBook
+        cls,
+        taker: Order,
+        order_book: OrderBook,
+        policy: YieldPolicy = YieldPolicy(),
     ) -> t.List[MatchReport]:
-        taker.mark_matching()
-        reports = []
-        rtol = 10 ** (-OrderBook.min_amount_power)
-
-        maker_orders = (
-            order_book.Asks if taker.side == Order.Side.Buy else order_book.Bids
-        )
-        comparator = operator.ge if taker.side == Order.Side.Buy else operator.le
-        if maker_orders:
-            while not np.isclose(taker.filled, taker.amount, rtol):
-                try:
-                    maker = maker_orders[0]
-                    if comparator(taker.price, maker.price):
-                        maker_report, taker_report = cls._match_orders(
-                            taker, maker, rtol
-                        )
-                        reports.append(maker_report)
-                        reports.append(taker_report)
-
-                        if maker_report.order.status == Order.Status.Closed:
-                            order_book.pop_first(maker.side)
-                    else:
-                        cls._add_to_order_book(order_book, taker)
-                        break
-                except IndexError:
-                    cls._add_to_order_book(order_book, taker)
-                    break
-
-                await asyncio.sleep(0)
-        else:
-            cls._add_to_order_book(order_book, taker)
+        reports: t.List[MatchReport] = []
+        await cls._run(cls._limit_fills(taker, order_book, reports), policy)
+        return reports
 
-        taker.finish_matching()
+    @classmethod
+    async def market_match(
+        cls,
+        taker: Order,
+        order_book: OrderBook,
+        policy: YieldPolicy = YieldPolicy(),
+    ) -> t.List[MatchReport]:
+        reports: t.List[MatchReport] = []
+        await cls._run(cls._market_fills(taker, order_book, reports), policy)
+        return reports
 
+    @classmethod
+    def limit_match_sync(
+        cls, taker: Order, order_book: OrderBook
+    ) -> t.List[MatchReport]:
+        reports: t.List[MatchReport] = []
+        for _ in cls._limit_fills(taker, order_book, reports):
+            pass
         return reports
 
     @classmethod
-    async def market_match(
+    def market_match_sync(
         cls, taker: Order, order_book: OrderBook
     ) -> t.List[MatchReport]:
-        reports = []
-        rtol = 10 ** (-OrderBook.min_amount_power)
+        reports: t.List[MatchReport] = []
+        for _ in cls._market_fills(taker, order_book, reports):
+            pass
+        return reports
 
-        maker_orders = (
-            order_book.Asks if taker.side == Order.Side.Buy else order_book.Bids
-        )
+    @staticmethod
+    async def _run(fills: t.Iterator[None], policy: YieldPolicy) -> None:
+        if policy.is_synchronous:
+            for _ in fills:
+                pass
+            return
 
-        if maker_orders:
-            while not np.isclose(taker.filled, taker.amount, rtol):
-                try:
-                    maker = maker_orders[0]
-                    maker_report, taker_report = cls._match_orders(taker, maker, rtol)
-                    reports.append(maker_report)
-                    reports.append(taker_report)
+        budget = policy.budget()
+        for _ in fills:
+            if budget.spend():
+                await asyncio.sleep(0)
 
-                    if maker_report.order.status == Order.Status.Closed:
-                        order_book.pop_first(maker.side)
+    @classmethod
+    def _limit_fills(
+        cls, taker: Order, order_book: OrderBook, reports: t.List[MatchReport]
+    ) -> t.Iterator[None]:
+        taker.mark_matching()
 
-                except IndexError:
-                    break
+        maker_side = Order.Side.Sell if taker.side == Order.Side.Buy else Order.Side.Buy
+        maker_orders = order_book.get_side(maker_side)
+        comparator = operator.ge if taker.side == Order.Side.Buy else operator.le
+        while taker.filled_lots < taker.amount_lots:
+            if not maker_orders:
+                cls._add_to_order_book(order_book, taker)
+                break
 
-                await asyncio.sleep(0)
+            maker = maker_orders.first()
+            if not comparator(taker.price_ticks, maker.price_ticks):
+                cls._add_to_order_book(order_book, taker)
+                break
 
-        taker.mark_closed()
+            maker_report, taker_report = cls._match_orders(taker, maker)
+            reports.append(maker_report)
+            reports.append(taker_report)
 
-        return reports
+            cls._fill_maker(order_book, maker_report)
+            yield
+
+        taker.finish_matching()
+
+    @classmethod
+    def _market_fills(
+        cls, taker: Order, order_book: OrderBook, reports: t.List[MatchReport]
+    ) -> t.Iterator[None]:
+        maker_side = Order.Side.Sell if taker.side == Order.Side.Buy else Order.Side.Buy
+        maker_orders = order_book.get_side(maker_side)
+
+        while maker_orders and taker.filled_lots < taker.amount_lots:
+            maker_report, taker_report = cls._match_orders(taker, maker_orders.first())
+            reports.append(maker_report)
+            reports.append(taker_report)
+
+            cls._fill_maker(order_book, maker_report)
+            yield
+
+        taker.mark_closed()
 
     @classmethod
     def _add_to_order_book(cls, order_book: OrderBook, order: Order) -> None:
         order.mark_opened()
         order_book.add(order)
 
+    @classmethod
+    def _fill_maker(cls, order_book: OrderBook, maker_report: MatchReport) -> None:
+        # matched lots leave the aggregated level amount before a closed maker
+        # is unlinked, since the unlinked order has no lots left by then
+        maker = maker_report.order
+        order_book.fill(maker, maker_report.base_matched)
+        if maker.status == Order.Status.Closed:
+            order_book.pop_first(maker.side)
+
     @classmethod
     def _match_orders(
-        cls, taker: Order, maker: Order, rtol: float
+        cls, taker: Order, maker: Order
     ) -> t.Tuple[MatchReport, MatchReport]:
 
         maker_report_type = MatchReportType.Partial
         taker_report_type = MatchReportType.Partial
 
-        maker_left = maker.amount - maker.filled
-        taker_left = taker.amount - taker.filled
-        if maker_left < taker_left:
-            taker.filled += maker_left
-            maker.filled += maker_left
-            recalculation_amount = maker_left
-        else:
-            taker.filled += taker_left
-            maker.filled += taker_left
-            recalculation_amount = taker_left
-
-        if np.isclose(taker.filled, taker.amount, rtol):
+        recalculation_amount = min(maker.left_lots, taker.left_lots)
+        taker.filled_lots += recalculation_amount
+        maker.filled_lots += recalculation_amount
+        quote_matched = quote_units(
+            recalculation_amount, t.cast(int, maker.price_ticks)
+        )
+
+        if taker.filled_lots == taker.amount_lots:
             taker.mark_closed()
             taker_report_type = MatchReportType.Full
 
-        if np.isclose(maker.filled, maker.amount, rtol):
+        if maker.filled_lots == maker.amount_lots:
             maker.mark_closed()
             maker_report_type = MatchReportType.Full
 
@@ -136,14 +179,14 @@ class MatchModel:
                 ReportOwnerType.Maker,
                 maker_report_type,
                 maker,
-                recalculation_amount * maker.price,  # type: ignore
+                quote_matched,
                 recalculation_amount,
             ),
             MatchReport(
                 ReportOwnerType.Taker,
                 taker_report_type,
                 taker,
-                recalculation_amount * maker.price,  # type: ignore
+                quote_matched,
                 recalculation_amount,
             ),
         )
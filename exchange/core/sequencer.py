@@ -0,0 +1,78 @@
+from __future__ import annotations
+import asyncio
+import typing as t
+from contextlib import suppress
+
+
+T = t.TypeVar("T")
+Command = t.Callable[[], t.Awaitable[t.Any]]
+
+
+class PairSequencer:
+    """Single writer of a symbol pair.
+
+    Commands are queued and executed one by one, each to completion, by the
+    sequencer task, so commands of the pair never interleave and need no locks.
+    Submitters await a per-command future with the command result.
+    """
+
+    _queue: asyncio.Queue[t.Tuple[Command, asyncio.Future[t.Any]]]
+    _task: t.Optional[asyncio.Task[None]]
+    # set by stop, a cancel of the task is told apart from a cancel of a command
+    _stopping: bool
+
+    def __init__(self) -> None:
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._stopping = False
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._stopping = True
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def submit(self, command: t.Callable[[], t.Awaitable[T]]) -> T:
+        future: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((command, future))
+        return await future
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                command, future = await self._queue.get()
+                if future.done():
+                    # submitter is not waiting for the result anymore
+                    continue
+
+                try:
+                    result = await command()
+                except asyncio.CancelledError:
+                    future.cancel()
+                    if self._stopping:
+                        raise
+                except BaseException as e:
+                    # the single writer outlives any failure of a command
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            # commands which were not executed are cancelled
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                future.cancel()
@@ -0,0 +1,149 @@
+import typing as t
+from collections import deque
+
+from .candles import Summary
+
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+class Ticker(t.NamedTuple):
+    # prices are None without trades in the window, the last price is kept
+    last_price: t.Optional[float]
+    open_price: t.Optional[float]
+    high_price: t.Optional[float]
+    low_price: t.Optional[float]
+    price_change: t.Optional[float]
+    price_change_percent: t.Optional[float]
+    weighted_avg_price: t.Optional[float]
+    volume: float
+    quote_volume: float
+    trades: int
+    # milliseconds of the first bucket of the window and of the last trade
+    open_time: t.Optional[int]
+    close_time: t.Optional[int]
+
+
+class _Bucket:
+    __slots__ = ("start", "open", "volume", "quote_volume", "trades")
+
+    def __init__(self, start: int, summary: Summary) -> None:
+        self.start = start
+        self.open = summary[0]
+        self.volume = summary[4]
+        self.quote_volume = summary[5]
+        self.trades = summary[6]
+
+
+class RollingTicker:
+    """Statistics of trades of a pair over a sliding window, 24 hours by default.
+
+    Trades are aggregated into buckets of ``bucket_ms`` and whole buckets
+    leave the window, so it covers from ``window_ms`` to ``window_ms`` plus one
+    bucket. Sums are kept running, highs and lows of buckets are kept in
+    monotonic deques, so a trade and a query cost amortized O(1).
+    """
+
+    window_ms: int
+    bucket_ms: int
+    last_price: t.Optional[float]
+
+    _buckets: t.Deque[_Bucket]
+    # start and high of buckets with decreasing highs, and the same for lows
+    _highs: t.Deque[t.Tuple[int, float]]
+    _lows: t.Deque[t.Tuple[int, float]]
+    _volume: float
+    _quote_volume: float
+    _trades: int
+    _last_ms: t.Optional[int]
+
+    def __init__(self, window_ms: int = DAY_MS, bucket_ms: int = 60 * 1000) -> None:
+        self.window_ms = window_ms
+        self.bucket_ms = bucket_ms
+        self.last_price = None
+        self._buckets = deque()
+        self._highs = deque()
+        self._lows = deque()
+        self._volume = 0
+        self._quote_volume = 0
+        self._trades = 0
+        self._last_ms = None
+
+    def add(self, time_ms: int, summary: Summary) -> None:
+        _, high, low, close, volume, quote_volume, trades = summary
+        start = time_ms - time_ms % self.bucket_ms
+
+        buckets = self._buckets
+        # trades of an earlier time, e.g. after a clock step back, join the last bucket
+        if not buckets or start > buckets[-1].start:
+            buckets.append(_Bucket(start, summary))
+        else:
+            bucket = buckets[-1]
+            start = bucket.start
+            bucket.volume += volume
+            bucket.quote_volume += quote_volume
+            bucket.trades += trades
+
+        self._volume += volume
+        self._quote_volume += quote_volume
+        self._trades += trades
+
+        # the newest bucket hides older ones with lower highs and higher lows
+        highs, lows = self._highs, self._lows
+        while highs and highs[-1][1] <= high:
+            highs.pop()
+        highs.append((start, high))
+        while lows and lows[-1][1] >= low:
+            lows.pop()
+        lows.append((start, low))
+
+        self.last_price = close
+        self._last_ms = max(time_ms, self._last_ms or time_ms)
+        self._expire(time_ms)
+
+    def stats(self, now_ms: int) -> Ticker:
+        self._expire(now_ms)
+        if not self._buckets:
+            return Ticker(
+                self.last_price, None, None, None, None, None, None, 0, 0, 0, None, None
+            )
+
+        last_price = t.cast(float, self.last_price)
+        open_price = self._buckets[0].open
+        change = last_price - open_price
+        return Ticker(
+            last_price,
+            open_price,
+            self._highs[0][1],
+            self._lows[0][1],
+            change,
+            change / open_price * 100,
+            self._quote_volume / self._volume,
+            self._volume,
+            self._quote_volume,
+            self._trades,
+            self._buckets[0].start,
+            self._last_ms,
+        )
+
+    def _expire(self, now_ms: int) -> None:
+        buckets = self._buckets
+        oldest = now_ms - self.window_ms
+        while buckets and buckets[0].start + self.bucket_ms <= oldest:
+            bucket = buckets.popleft()
+            self._volume -= bucket.volume
+            self._quote_volume -= bucket.quote_volume
+            self._trades -= bucket.trades
+
+        if not buckets:
+            # running sums don't keep rounding errors of expired buckets
+            self._volume = self._quote_volume = 0
+            self._highs.clear()
+            self._lows.clear()
+            return
+
+        first = buckets[0].start
+        while self._highs[0][0] < first:
+            self._highs.popleft()
+        while self._lows[0][0] < first:
+            self._lows.popleft()
@@ -0,0 +1,145 @@
+import typing as t
+
+import numpy as np
+
+from .entities.fixed_point import AMOUNT_SCALE, PRICE_SCALE
+
+
+# side of the taker, trades of an auction have no taker
+BUY, SELL, NO_TAKER = 1, -1, 0
+# taker order id of trades of an auction
+NO_ORDER = -1
+
+# named columns of trades, arrays of the same length
+Columns = t.Dict[str, np.ndarray]
+
+
+class TradeTape:
+    """The latest ``capacity`` trades of a pair in preallocated columns.
+
+    Trades get ids from 0 in the order of matching and a trade overwrites the
+    one ``capacity`` trades older, so the memory of a tape is constant.
+    The maker of a trade of an auction is its buy order.
+    """
+
+    capacity: int
+    # number of trades appended so far, the id of the next trade
+    sequence: int
+
+    _price_ticks: np.ndarray
+    _amount_lots: np.ndarray
+    _maker_ids: np.ndarray
+    _taker_ids: np.ndarray
+    _taker_sides: np.ndarray
+    _times_ms: np.ndarray
+
+    def __init__(self, capacity: int = 4096) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity has to be positive")
+
+        self.capacity = capacity
+        self.sequence = 0
+        self._price_ticks = np.zeros(capacity, np.int64)
+        self._amount_lots = np.zeros(capacity, np.int64)
+        self._maker_ids = np.zeros(capacity, np.int64)
+        self._taker_ids = np.zeros(capacity, np.int64)
+        self._taker_sides = np.zeros(capacity, np.int8)
+        self._times_ms = np.zeros(capacity, np.int64)
+
+    def __len__(self) -> int:
+        return min(self.sequence, self.capacity)
+
+    @property
+    def first_id(self) -> int:
+        # id of the oldest trade still on the tape
+        return self.sequence - len(self)
+
+    def append(
+        self,
+        price_ticks: int,
+        amount_lots: int,
+        maker_id: int,
+        taker_id: int,
+        taker_side: int,
+        time_ms: int,
+    ) -> None:
+        position = self.sequence % self.capacity
+        self._price_ticks[position] = price_ticks
+        self._amount_lots[position] = amount_lots
+        self._maker_ids[position] = maker_id
+        self._taker_ids[position] = taker_id
+        self._taker_sides[position] = taker_side
+        self._times_ms[position] = time_ms
+        self.sequence += 1
+
+    def recent(self, limit: int) -> Columns:
+        # up to `limit` latest trades, the oldest first
+        first = max(self.sequence - limit, self.first_id)
+        positions = np.arange(first, self.sequence) % self.capacity
+        return {
+            "id": np.arange(first, self.sequence),
+            "price": self._price_ticks[positions] / PRICE_SCALE,
+            "amount": self._amount_lots[positions] / AMOUNT_SCALE,
+            "maker_order_id": self._maker_ids[positions],
+            "taker_order_id": self._taker_ids[positions],
+            "taker_side": self._taker_sides[positions],
+            "time": self._times_ms[positions],
+        }
+
+    def aggregated(
+        self,
+        limit: int,
+        from_id: t.Optional[int] = None,
+        start_ms: t.Optional[int] = None,
+        end_ms: t.Optional[int] = None,
+    ) -> Columns:
+        """Fills of a taker at one price merged into one trade.
+
+        Up to ``limit`` merged trades with ids from ``from_id`` and times in
+        [``start_ms``, ``end_ms``], the earliest ones when the range has a start
+        and the latest ones otherwise. A merged trade is identified by its
+        ``first_id``.
+        """
+        first, last = self.first_id, self.sequence
+        times = self._times_ms[np.arange(first, last) % self.capacity]
+        if start_ms is not None:
+            first += int(np.searchsorted(times, start_ms))
+        if end_ms is not None:
+            last = self.first_id + int(np.searchsorted(times, end_ms, side="right"))
+        if from_id is not None:
+            first = max(first, from_id)
+        last = max(first, last)
+
+        positions = np.arange(first, last) % self.capacity
+        taker_ids = self._taker_ids[positions]
+        prices = self._price_ticks[positions]
+        # a merged trade starts at the first fill, a new taker or a new price,
+        # fills of an auction have no taker and are never merged
+        is_start = np.ones(len(positions), bool)
+        is_start[1:] = (
+            (taker_ids[1:] != taker_ids[:-1])
+            | (prices[1:] != prices[:-1])
+            | (taker_ids[1:] == NO_ORDER)
+        )
+        starts = np.flatnonzero(is_start)
+        amounts = (
+            np.add.reduceat(self._amount_lots[positions], starts)
+            if len(starts)
+            else np.zeros(0, np.int64)
+        )
+        ends = np.append(starts[1:], len(positions)) - 1
+
+        if start_ms is not None or from_id is not None:
+            selected = slice(0, limit)
+        else:
+            selected = slice(max(len(starts) - limit, 0), None)
+        starts, ends, amounts = starts[selected], ends[selected], amounts[selected]
+
+        return {
+            "first_id": starts + first,
+            "last_id": ends + first,
+            "price": prices[starts] / PRICE_SCALE,
+            "amount": amounts / AMOUNT_SCALE,
+            "taker_side": self._taker_sides[positions[starts]],
+            "time": self._times_ms[positions[starts]],
+        }
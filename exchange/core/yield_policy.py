@@ -0,0 +1,63 @@
+import time
+import typing as t
+
+
+class YieldPolicy(t.NamedTuple):
+    """How often long running loops give control back to the event loop.
+
+    A loop yields after ``fills`` steps or after ``interval_us`` microseconds
+    since its slice was started, whichever comes first. Without both limits
+    loops never yield and run synchronously.
+    """
+
+    fills: t.Optional[int] = 256
+    interval_us: t.Optional[int] = 500
+
+    @classmethod
+    def synchronous(cls) -> "YieldPolicy":
+        return cls(None, None)
+
+    @property
+    def is_synchronous(self) -> bool:
+        return self.fills is None and self.interval_us is None
+
+    def budget(self) -> "YieldBudget":
+        return YieldBudget(self)
+
+
+class YieldBudget:
+    """Work left in the current slice of a loop."""
+
+    __slots__ = ("_fills", "_interval_ns", "_fills_left", "_deadline_ns")
+
+    _fills: t.Optional[int]
+    _interval_ns: t.Optional[int]
+    _fills_left: int
+    _deadline_ns: int
+
+    def __init__(self, policy: YieldPolicy) -> None:
+        self._fills = policy.fills
+        self._interval_ns = (
+            None if policy.interval_us is None else policy.interval_us * 1000
+        )
+        self._start_slice()
+
+    def spend(self) -> bool:
+        # returns True when the slice is over and the loop has to yield
+        if self._fills is not None:
+            self._fills_left -= 1
+            if self._fills_left <= 0:
+                self._start_slice()
+                return True
+
+        if self._interval_ns is not None and time.monotonic_ns() >= self._deadline_ns:
+            self._start_slice()
+            return True
+
+        return False
+
+    def _start_slice(self) -> None:
+        if self._fills is not None:
+            self._fills_left = self._fills
+        if self._interval_ns is not None:
+            self._deadline_ns = time.monotonic_ns() + self._interval_ns
@@ -3,12 +3,16 @@ import abc
 import asyncio
 import inspect
 import typing as t
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
 
 from .flow import in_memory_flow
+from .flow.in_memory_flow import InMemoryFork, OverflowPolicy
 
 
 if t.TYPE_CHECKING:
-    from .flow import Flow, Fork
+    from .flow import Fork
 
 
 class Comparable(t.Protocol):
@@ -18,45 +22,140 @@ class Comparable(t.Protocol):
 
 EType = t.TypeVar("EType", bound=Comparable)
 Event = t.Tuple[EType, t.Dict[str, t.Any]]
+# name and value of an event argument a subscription is limited to
+Topic = t.Tuple[str, t.Hashable]
+
+
+# runs synchronous handlers of dispatchers without an executor of their own
+_handlers_executor: t.Optional[Executor] = None
+
+
+def handlers_executor() -> Executor:
+    global _handlers_executor
+    if _handlers_executor is None:
+        _handlers_executor = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="event-handler"
+        )
+    return _handlers_executor
 
 
 class Dispatcher(t.Generic[EType]):
+    """Delivers events of a subscription to its handler.
+
+    Events are delivered one by one as keyword arguments of the handler or,
+    with a batch size, as a list of keyword arguments of the events collected
+    by a single wakeup. Synchronous handlers are run in a thread pool.
+    """
+
     _event_fork: Fork[Event[EType]]
     _trigger: EType
     _is_async_callback: bool
 
     def __init__(
         self,
-        event_stream: "Flow[Event[EType]]",
+        event_fork: "Fork[Event[EType]]",
         trigger_event: EType,
         callback: t.Callable[..., t.Any],
     ) -> None:
-        self._event_fork = event_stream.fork()
+        self._event_fork = event_fork
         self._callback = callback
         self._trigger = trigger_event
         self._is_async_callback = inspect.iscoroutinefunction(callback)
 
     @property
     async def events(self) -> t.AsyncGenerator[Event[EType], None]:
+        # events are routed to the fork by their type already
         async for event, kwargs in self._event_fork:
-            if event == self._trigger:
-                yield event, kwargs
+            yield event, kwargs
+
+    def dispatch_forever(
+        self,
+        batch_size: t.Optional[int] = None,
+        max_delay: float = 0,
+        concurrency: int = 1,
+        executor: t.Optional[Executor] = None,
+    ) -> asyncio.Task[None]:
+        # a batch is delivered as soon as it's full or `max_delay` seconds after
+        # its first event, up to `concurrency` handler calls run at the same time
+        return asyncio.create_task(
+            self._dispatch(batch_size, max_delay, concurrency, executor)
+        )
 
-    def dispatch_forever(self) -> asyncio.Task[t.Any]:
-        async def handle() -> None:
-            async for event, kwargs in self.events:
-                if inspect.iscoroutinefunction(self._callback):
-                    if self._is_async_callback:
-                        await self._callback(**kwargs)
-                    else:
-                        self._callback(**kwargs)
+    async def stop(self) -> None:
+        await self._event_fork.stop()
 
-        task = asyncio.create_task(handle())
+    async def _dispatch(
+        self,
+        batch_size: t.Optional[int],
+        max_delay: float,
+        concurrency: int,
+        executor: t.Optional[Executor],
+    ) -> None:
+        slots = asyncio.Semaphore(concurrency)
+        running: t.Set[asyncio.Task[None]] = set()
+        errors: t.List[Exception] = []
+
+        async def call(*args: t.Any, **kwargs: t.Any) -> None:
+            try:
+                if self._is_async_callback:
+                    await self._callback(*args, **kwargs)
+                else:
+                    await asyncio.get_running_loop().run_in_executor(
+                        executor or handlers_executor(),
+                        partial(self._callback, *args, **kwargs),
+                    )
+            except Exception as e:
+                errors.append(e)
+            finally:
+                slots.release()
+
+        stopped = False
+        while not stopped:
+            batch, stopped = await self._next_batch(batch_size or 1, max_delay)
+            deliveries: t.List[t.Tuple[t.Tuple[t.Any, ...], t.Dict[str, t.Any]]]
+            if batch_size is None:
+                deliveries = [((), kwargs) for _, kwargs in batch]
+            else:
+                deliveries = [(([kwargs for _, kwargs in batch],), {})] if batch else []
+
+            for args, kwargs in deliveries:
+                await slots.acquire()
+                # a failed handler stops dispatching, as it's done without concurrency
+                if errors:
+                    raise errors[0]
+                task = asyncio.create_task(call(*args, **kwargs))
+                running.add(task)
+                task.add_done_callback(running.discard)
 
-        return task
+        if running:
+            await asyncio.gather(*running)
+        if errors:
+            raise errors[0]
 
-    def stop(self) -> None:
-        self._event_fork.stop()
+    async def _next_batch(
+        self, batch_size: int, max_delay: float
+    ) -> t.Tuple[t.List[Event[EType]], bool]:
+        # events taken by a wakeup and whether the fork is stopped
+        fork = self._event_fork
+        batch: t.List[Event[EType]] = []
+        loop = asyncio.get_running_loop()
+        deadline = None
+        try:
+            while len(batch) < batch_size:
+                if not batch:
+                    batch.append(await fork.__anext__())
+                    deadline = loop.time() + max_delay
+                batch.extend(fork.read_nowait(batch_size - len(batch)))
+
+                timeout = t.cast(float, deadline) - loop.time()
+                if len(batch) >= batch_size or timeout <= 0:
+                    break
+                batch.append(await asyncio.wait_for(fork.__anext__(), timeout))
+        except asyncio.TimeoutError:
+            pass
+        except StopAsyncIteration:
+            return batch, True
+        return batch, False
 
 
 class Subscriptable(t.Generic[EType]):
@@ -66,31 +165,176 @@ class Subscriptable(t.Generic[EType]):
 
     @abc.abstractmethod
     def subscribe(
-        self, event: EType, handler: t.Callable[..., t.Any]
+        self,
+        event: EType,
+        handler: t.Callable[..., t.Any],
+        maxsize: int = 0,
+        policy: OverflowPolicy = OverflowPolicy.Block,
+        key: t.Optional[t.Callable[[Event[EType]], t.Hashable]] = None,
+        topic: t.Optional[Topic] = None,
     ) -> Dispatcher[EType]:
         pass
 
 
+class _Routes(t.Generic[EType]):
+    """Forks subscribed to one type of events.
+
+    Lists of forks are replaced instead of changed in place on removal,
+    so a fork stopped while events are sent doesn't affect the iteration.
+    """
+
+    # forks of every event of the type
+    every: t.List[InMemoryFork[Event[EType]]]
+    # forks of events with the given value of an argument
+    by_topic: t.Dict[str, t.Dict[t.Hashable, t.List[InMemoryFork[Event[EType]]]]]
+    # number of forks of both kinds
+    size: int
+
+    def __init__(self) -> None:
+        self.every = []
+        self.by_topic = {}
+        self.size = 0
+
+    def add(
+        self, fork: InMemoryFork[Event[EType]], topic: t.Optional[Topic]
+    ) -> None:
+        if topic is None:
+            self.every = [*self.every, fork]
+        else:
+            name, value = topic
+            values = self.by_topic.setdefault(name, {})
+            values[value] = [*values.get(value, ()), fork]
+        self.size += 1
+
+    def remove(
+        self, fork: InMemoryFork[Event[EType]], topic: t.Optional[Topic]
+    ) -> None:
+        # topics without forks are dropped, so the index doesn't grow with
+        # every value ever subscribed to
+        if topic is None:
+            self.every = [other for other in self.every if other is not fork]
+        else:
+            name, value = topic
+            values = self.by_topic[name]
+            forks = [other for other in values[value] if other is not fork]
+            if forks:
+                values[value] = forks
+            else:
+                del values[value]
+                if not values:
+                    del self.by_topic[name]
+        self.size -= 1
+
+    def is_empty(self) -> bool:
+        return self.size == 0
+
+    def forks(
+        self, kwargs: t.Dict[str, t.Any]
+    ) -> t.Iterator[t.List[InMemoryFork[Event[EType]]]]:
+        yield self.every
+        for name, values in list(self.by_topic.items()):
+            value = kwargs.get(name)
+            if isinstance(value, t.Hashable) and value in values:
+                yield values[value]
+
+
 class EventEmitter(Subscriptable[EType]):
-    _event_stream: "Flow[Event[EType]]"
+    # forks of all events
+    _event_stream: in_memory_flow.InMemoryFlow[Event[EType]]
+    # forks of subscriptions indexed by event type and topic
+    _routes: t.Dict[EType, _Routes[EType]]
+    # emitted events which are not sent to forks yet
+    _outbox: t.Deque[Event[EType]]
+    _publisher: t.Optional[asyncio.Task[None]]
 
     def __init__(self) -> None:
         self._event_stream = in_memory_flow.InMemoryFlow[Event[EType]]()
+        self._routes = {}
+        self._outbox = deque()
+        self._publisher = None
 
     @property
     async def events(self) -> t.AsyncGenerator[Event[EType], None]:
         async for event, kwargs in self._event_stream:
             yield event, kwargs
 
-    async def filter(self, trigger: EType) -> t.AsyncGenerator[Event[EType], None]:
-        async for event, kwargs in self._event_stream:
-            if event == trigger:
+    async def filter(
+        self, trigger: EType, topic: t.Optional[Topic] = None
+    ) -> t.AsyncGenerator[Event[EType], None]:
+        fork = self._fork(trigger, topic)
+        try:
+            async for event, kwargs in fork:
                 yield event, kwargs
+        finally:
+            # the fork is detached once the generator is closed
+            await fork.stop()
 
     def subscribe(
-        self, event: EType, handler: t.Callable[..., t.Any]
+        self,
+        event: EType,
+        handler: t.Callable[..., t.Any],
+        maxsize: int = 0,
+        policy: OverflowPolicy = OverflowPolicy.Block,
+        key: t.Optional[t.Callable[[Event[EType]], t.Hashable]] = None,
+        topic: t.Optional[Topic] = None,
     ) -> Dispatcher[EType]:
-        return Dispatcher(self._event_stream, event, handler)
+        # maxsize and policy bound events waiting for the handler,
+        # key groups events replacing each other with conflation,
+        # topic limits events to the ones with the given value of an argument
+        fork = self._fork(event, topic, maxsize, policy, key)
+        return Dispatcher(fork, event, handler)
+
+    def is_subscribed(self, event: EType) -> bool:
+        # emitters skip building of payloads nobody receives
+        routes = self._routes.get(event)
+        return self._event_stream.forks_number() > 0 or (
+            routes is not None and not routes.is_empty()
+        )
 
     async def emit(self, event: EType, **kwargs: t.Any) -> None:
-        await self._event_stream.send((event, kwargs))
+        # events are sent to forks by a background task, so emitting never waits
+        # for slow subscribers, e.g. while the emitter holds a lock
+        self._outbox.append((event, kwargs))
+
+        publisher = self._publisher
+        loop = asyncio.get_running_loop()
+        if publisher is None or publisher.done() or publisher.get_loop() is not loop:
+            self._publisher = asyncio.create_task(self._publish())
+
+    async def flush(self) -> None:
+        # waits until emitted events are sent to forks
+        if self._outbox and self._publisher is not None:
+            await asyncio.shield(self._publisher)
+
+    def _fork(
+        self,
+        event: EType,
+        topic: t.Optional[Topic] = None,
+        maxsize: int = 0,
+        policy: OverflowPolicy = OverflowPolicy.Block,
+        key: t.Optional[t.Callable[[Event[EType]], t.Hashable]] = None,
+    ) -> InMemoryFork[Event[EType]]:
+        routes = self._routes.setdefault(event, _Routes())
+
+        def detach() -> None:
+            routes.remove(fork, topic)
+            if routes.is_empty() and self._routes.get(event) is routes:
+                del self._routes[event]
+
+        fork = InMemoryFork[Event[EType]](maxsize, policy, key, detach)
+        routes.add(fork, topic)
+        return fork
+
+    async def _publish(self) -> None:
+        # events are matched to subscriptions once, by lookups of the indexes
+        while self._outbox:
+            data = self._outbox.popleft()
+            await self._event_stream.send(data)
+
+            routes = self._routes.get(data[0])
+            if routes is None:
+                continue
+            # stopped and disconnected forks are detached by themselves
+            for forks in routes.forks(data[1]):
+                for fork in forks:
+                    await fork.send(data)
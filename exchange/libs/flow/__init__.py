@@ -1,9 +1,14 @@
 from .flow import Flow, Fork
-from .in_memory_flow import InMemoryFlow
+from .in_memory_flow import InMemoryFlow, InMemoryFork, OverflowPolicy
+from .ring_flow import RingFlow, RingFork
 
 
 __all__ = [
     "Flow",
     "Fork",
     "InMemoryFlow",
+    "InMemoryFork",
+    "OverflowPolicy",
+    "RingFlow",
+    "RingFork",
 ]
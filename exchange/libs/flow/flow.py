@@ -13,6 +13,9 @@ class Fork(t.Protocol[_T]):
     def is_stopped(self) -> bool:
         ...
 
+    def read_nowait(self, limit: int) -> t.List[_T]:
+        ...
+
     async def stop(self) -> None:
         ...
 
@@ -1,6 +1,8 @@
 from __future__ import annotations
 import asyncio
 import typing as t
+from collections import deque
+from enum import Enum, auto
 
 from .flow import Flow, Fork
 
@@ -8,46 +10,158 @@ from .flow import Flow, Fork
 _T = t.TypeVar("_T")
 
 
+class OverflowPolicy(Enum):
+    # sender waits until the fork has free space
+    Block = auto()
+    # the oldest waiting item is dropped
+    DropOldest = auto()
+    # the sent item is dropped
+    DropNewest = auto()
+    # a waiting item is replaced by a newer one with the same key,
+    # the oldest item is dropped if the fork is still full
+    Conflate = auto()
+    # the fork is stopped
+    Disconnect = auto()
+
+
 class InMemoryFork(Fork[_T]):
-    _queue: asyncio.Queue[_T]
+    # items dropped or replaced by the overflow policy
+    dropped: int
+
+    # waiting items, or their keys if items are conflated
+    _items: t.Deque[t.Any]
+    _conflated: t.Dict[t.Hashable, _T]
     _max_size: int
+    _policy: OverflowPolicy
+    _key: t.Optional[t.Callable[[_T], t.Hashable]]
     _active: bool
-
-    def __init__(self, maxsize: int = 0) -> None:
-        self._queue = asyncio.Queue(maxsize=maxsize)
+    # called once when the fork is stopped
+    _on_stop: t.Optional[t.Callable[[], None]]
+    # resolved when an item is added or taken
+    _readable: t.Optional[asyncio.Future[None]]
+    _writable: t.Optional[asyncio.Future[None]]
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        policy: OverflowPolicy = OverflowPolicy.Block,
+        key: t.Optional[t.Callable[[_T], t.Hashable]] = None,
+        on_stop: t.Optional[t.Callable[[], None]] = None,
+    ) -> None:
+        if policy == OverflowPolicy.Conflate and key is None:
+            raise ValueError("Conflation requires a key of items")
+
+        self.dropped = 0
+        self._items = deque()
+        self._conflated = {}
         self._max_size = maxsize
+        self._policy = policy
+        self._key = key
         self._active = True
+        self._on_stop = on_stop
+        self._readable = None
+        self._writable = None
+
+    @property
+    def lag(self) -> int:
+        # number of items waiting to be read
+        return len(self._items)
 
     async def send(self, data: _T) -> None:
-        if 0 < self._max_size < self._queue.qsize():
-            await self._queue.get()
-        await self._queue.put(data)
+        if self._policy == OverflowPolicy.Conflate:
+            key = self._key(data)  # type: ignore
+            if key in self._conflated:
+                self._conflated[key] = data
+                self.dropped += 1
+                return
+
+        while self._active and 0 < self._max_size <= len(self._items):
+            if self._policy == OverflowPolicy.Block:
+                self._writable = asyncio.get_running_loop().create_future()
+                await self._writable
+            elif self._policy == OverflowPolicy.DropNewest:
+                self.dropped += 1
+                return
+            elif self._policy == OverflowPolicy.Disconnect:
+                self.dropped += 1
+                await self.stop()
+            else:
+                self._pop()
+                self.dropped += 1
+
+        if not self._active:
+            return
+
+        if self._policy == OverflowPolicy.Conflate:
+            self._conflated[key] = data
+            self._items.append(key)
+        else:
+            self._items.append(data)
+        self._readable = self._resolve(self._readable)
 
     def is_stopped(self) -> bool:
         return not self._active
 
+    def read_nowait(self, limit: int) -> t.List[_T]:
+        # up to `limit` waiting items without waiting for new ones
+        if not self._active:
+            return []
+        items = [self._pop() for _ in range(min(limit, len(self._items)))]
+        if items:
+            self._writable = self._resolve(self._writable)
+        return items
+
     async def stop(self) -> None:
         self._active = False
-        await self.send(None)  # type: ignore
+        self._readable = self._resolve(self._readable)
+        self._writable = self._resolve(self._writable)
+
+        on_stop, self._on_stop = self._on_stop, None
+        if on_stop is not None:
+            on_stop()
 
     def __aiter__(self) -> t.AsyncIterator[_T]:
         return self
 
     async def __anext__(self) -> _T:
-        value = await self._queue.get()
-        if self._active:
-            return value
+        while self._active:
+            if self._items:
+                data = self._pop()
+                self._writable = self._resolve(self._writable)
+                return data
+
+            self._readable = asyncio.get_running_loop().create_future()
+            await self._readable
+
         raise StopAsyncIteration
 
+    def _pop(self) -> _T:
+        data = self._items.popleft()
+        if self._policy == OverflowPolicy.Conflate:
+            return self._conflated.pop(data)
+        return t.cast(_T, data)
+
+    @staticmethod
+    def _resolve(
+        future: t.Optional[asyncio.Future[None]],
+    ) -> t.Optional[asyncio.Future[None]]:
+        if future is not None and not future.done():
+            future.set_result(None)
+        return None
+
 
 class InMemoryFlow(Flow[_T]):
     _forks: t.List[InMemoryFork[_T]]
     _max_size: int
+    _policy: OverflowPolicy
     _closed: bool
 
-    def __init__(self, maxsize: int = 0):
+    def __init__(
+        self, maxsize: int = 0, policy: OverflowPolicy = OverflowPolicy.Block
+    ) -> None:
         self._forks = []
         self._max_size = maxsize
+        self._policy = policy
         self._closed = False
 
     def forks_number(self) -> int:
@@ -56,8 +170,18 @@ class InMemoryFlow(Flow[_T]):
     def is_closed(self) -> bool:
         return self._closed
 
-    def fork(self) -> InMemoryFork[_T]:
-        fork = InMemoryFork[_T](self._max_size)
+    def fork(
+        self,
+        maxsize: t.Optional[int] = None,
+        policy: t.Optional[OverflowPolicy] = None,
+        key: t.Optional[t.Callable[[_T], t.Hashable]] = None,
+    ) -> InMemoryFork[_T]:
+        # size and overflow policy of the flow are used unless given
+        fork = InMemoryFork[_T](
+            self._max_size if maxsize is None else maxsize,
+            self._policy if policy is None else policy,
+            key,
+        )
         self._forks.append(fork)
         return fork
 
@@ -65,6 +189,10 @@ class InMemoryFlow(Flow[_T]):
         for fork in self._forks:
             await fork.send(data)
 
+        # stopped and disconnected forks don't receive anything anymore
+        if any(fork.is_stopped() for fork in self._forks):
+            self._forks = [fork for fork in self._forks if not fork.is_stopped()]
+
     async def close(self) -> None:
         self._closed = True
         for fork in self._forks:
@@ -0,0 +1,155 @@
+from __future__ import annotations
+import asyncio
+import typing as t
+
+from .flow import Flow, Fork
+
+
+_T = t.TypeVar("_T")
+
+
+class RingFork(Fork[_T]):
+    """Reader of a RingFlow, which keeps only its position in the shared buffer.
+
+    A fork falling behind by more than the capacity of the buffer skips
+    overwritten items, they are counted as ``lost``.
+    """
+
+    lost: int
+
+    _flow: RingFlow[_T]
+    # sequence number of the next item to read
+    _cursor: int
+    _stopped: bool
+
+    def __init__(self, flow: RingFlow[_T]) -> None:
+        self.lost = 0
+        self._flow = flow
+        self._cursor = flow.published
+        self._stopped = False
+
+    @property
+    def lag(self) -> int:
+        # number of published items which were not read yet
+        return min(self._flow.published - self._cursor, self._flow.capacity)
+
+    async def send(self, data: _T) -> None:
+        # the buffer is shared, so data sent by a fork is seen by every fork
+        await self._flow.send(data)
+
+    def is_stopped(self) -> bool:
+        return self._stopped
+
+    def read_nowait(self, limit: int) -> t.List[_T]:
+        # up to `limit` unread items without waiting for new ones
+        flow = self._flow
+        if self._stopped:
+            return []
+        oldest = flow.published - flow.capacity
+        if self._cursor < oldest:
+            self.lost += oldest - self._cursor
+            self._cursor = oldest
+
+        end = min(flow.published, self._cursor + limit)
+        items = [flow._buffer[i % flow.capacity] for i in range(self._cursor, end)]
+        self._cursor = end
+        return t.cast(t.List[_T], items)
+
+    async def stop(self) -> None:
+        self._stopped = True
+        self._flow._detach(self)
+
+    def __aiter__(self) -> t.AsyncIterator[_T]:
+        return self
+
+    async def __anext__(self) -> _T:
+        flow = self._flow
+        while not self._stopped:
+            if self._cursor < flow.published:
+                oldest = flow.published - flow.capacity
+                if self._cursor < oldest:
+                    self.lost += oldest - self._cursor
+                    self._cursor = oldest
+
+                data = flow._buffer[self._cursor % flow.capacity]
+                self._cursor += 1
+                return t.cast(_T, data)
+
+            if flow.is_closed():
+                break
+            await flow._wait()
+
+        raise StopAsyncIteration
+
+
+class RingFlow(Flow[_T]):
+    """Broadcast flow over one bounded ring buffer shared by all forks.
+
+    Sending writes the item once and wakes waiting forks, so its cost doesn't
+    depend on the number of forks and it never waits for slow readers.
+    A fork reads items published after it was created, forks are drained
+    before they stop when the flow is closed.
+    """
+
+    capacity: int
+    # number of items sent to the flow
+    published: int
+
+    _buffer: t.List[t.Optional[_T]]
+    _forks: t.Set[RingFork[_T]]
+    _closed: bool
+    # resolved by the next send, created only when somebody waits for it
+    _published_future: t.Optional[asyncio.Future[None]]
+
+    def __init__(self, capacity: int = 4096) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity has to be positive")
+
+        self.capacity = capacity
+        self.published = 0
+        self._buffer = [None] * capacity
+        self._forks = set()
+        self._closed = False
+        self._published_future = None
+
+    def forks_number(self) -> int:
+        return len(self._forks)
+
+    def lags(self) -> t.List[int]:
+        return [fork.lag for fork in self._forks]
+
+    def is_closed(self) -> bool:
+        return self._closed
+
+    def fork(self) -> RingFork[_T]:
+        fork = RingFork[_T](self)
+        self._forks.add(fork)
+        return fork
+
+    async def send(self, data: _T) -> None:
+        self._buffer[self.published % self.capacity] = data
+        self.published += 1
+        self._wake()
+
+    async def close(self) -> None:
+        self._closed = True
+        self._forks.clear()
+        self._wake()
+
+    def __aiter__(self) -> t.AsyncIterator[_T]:
+        return self.fork()
+
+    def _detach(self, fork: RingFork[_T]) -> None:
+        self._forks.discard(fork)
+        self._wake()
+
+    async def _wait(self) -> None:
+        if self._published_future is None:
+            self._published_future = asyncio.get_running_loop().create_future()
+        # cancellation of one reader must not cancel the future shared by all
+        await asyncio.shield(self._published_future)
+
+    def _wake(self) -> None:
+        if self._published_future is not None:
+            self._published_future.set_result(None)
+            self._published_future = None
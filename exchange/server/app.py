@@ -1,10 +1,72 @@
+import typing as t
+
 from aiohttp import web
+from exchange.core.cluster import ClusterExchange
+from exchange.core.journal import Journal, read_journal
 
+from . import routing
 from .helper import status_pages
-from .routing import routes
+from .streams import AccountStreams, MarketStreams
+
+
+async def start_sequencers(app: web.Application) -> None:
+    routing.exchange_instance.start_sequencers()
+
+
+async def stop_sequencers(app: web.Application) -> None:
+    await routing.exchange_instance.stop_sequencers()
+
+
+async def start_workers(app: web.Application) -> None:
+    await app["cluster"].start()
+
 
+async def stop_workers(app: web.Application) -> None:
+    await app["cluster"].stop()
 
-async def application_factory() -> web.Application:
+
+async def open_journal(app: web.Application) -> None:
+    # state of the last run is recovered before new commands are journaled
+    path = app["journal_path"]
+    journal = Journal(path)
+    await routing.exchange_instance.recover(read_journal(path))
+    routing.exchange_instance.journal = app["journal"] = journal
+    journal.start()
+
+
+async def close_journal(app: web.Application) -> None:
+    routing.exchange_instance.journal = None
+    await app["journal"].stop()
+
+
+async def close_streams(app: web.Application) -> None:
+    await app["market_streams"].close()
+    await app["account_streams"].close()
+
+
+async def application_factory(
+    sequenced: bool = False,
+    workers_number: int = 0,
+    journal_path: t.Optional[str] = None,
+) -> web.Application:
     app = web.Application(middlewares=[status_pages])
-    app.add_routes(routes)
+    app.add_routes(routing.routes)
+    if workers_number:
+        # pairs are matched by engine worker processes, this process keeps the ledger
+        app["cluster"] = routing.exchange_instance = ClusterExchange(workers_number)
+        app.on_startup.append(start_workers)
+        app.on_cleanup.append(stop_workers)
+    elif sequenced:
+        # every pair is served by a single writer task instead of locks
+        app.on_startup.append(start_sequencers)
+        app.on_cleanup.append(stop_sequencers)
+    if journal_path is not None:
+        # after workers and sequencers, which serve commands of the recovery
+        app["journal_path"] = journal_path
+        app.on_startup.append(open_journal)
+        app.on_cleanup.append(close_journal)
+
+    app["market_streams"] = MarketStreams(routing.exchange_instance)
+    app["account_streams"] = AccountStreams(routing.exchange_instance)
+    app.on_shutdown.append(close_streams)
     return app
@@ -1,3 +1,4 @@
+import json
 import typing as t
 from collections import defaultdict
 from datetime import datetime
@@ -5,7 +6,9 @@ from functools import wraps
 
 from aiohttp import web
 from exchange.core.errors import (
+    BadRequest,
     InsufficientFunds,
+    JournalError,
     OrderCancellationError,
     OrderCreationError,
     OrderNotFound,
@@ -26,34 +29,54 @@ from . import schema
 _Handler = t.Callable[[web.Request], t.Awaitable[web.StreamResponse]]
 
 
+# error code and message of exceptions
+_errors: t.List[t.Tuple[t.Type[Exception], int, str]] = [
+    (UnsupportedPairs, 455, "Unsupported pairs error. Invalid pair format specified"),
+    (
+        WrongCredentials,
+        401,
+        "Unauthorized Error. Account with such name is not existed",
+    ),
+    (WrongOrderID, 456, "Wrong order id"),
+    (TooSmallOrderAmount, 457, "Too small order amount error"),
+    (InsufficientFunds, 476, "Insufficient funds error. Not enough funds"),
+    (OrderCreationError, 462, "Order creation error. Unable to create order"),
+    (
+        PairAlreadyExisted,
+        486,
+        "Can not create new pair, because it is already existed.",
+    ),
+    (PairDeletionError, 487, "Can not delete pair."),
+    (OrderNotFound, 477, "Order was not found"),
+    (OrderCancellationError, 463, "Order cancellation error. Unable to close order"),
+    (JournalError, 503, "Journal error. Command is not durable"),
+]
+
+
+def describe_error(e: Exception) -> t.Tuple[int, str]:
+    if isinstance(e, ValidationError):
+        return 488, e.json()
+    if isinstance(e, BadRequest):
+        return 415, str(e)
+    for error_type, error_code, message in _errors:
+        if isinstance(e, error_type):
+            return error_code, message
+    return 500, str(e.args)
+
+
 @web.middleware
 async def status_pages(request: web.Request, handler: _Handler) -> web.StreamResponse:
     try:
         return await handler(request)
-    except ValidationError as e:
-        return error(488, e.json())
-    except UnsupportedPairs:
-        return error(455, "Unsupported pairs error. Invalid pair format specified")
-    except WrongCredentials:
-        return error(401, "Unauthorized Error. Account with such name is not existed")
-    except WrongOrderID:
-        return error(456, "Wrong order id")
-    except TooSmallOrderAmount:
-        return error(457, "Too small order amount error")
-    except InsufficientFunds:
-        return error(476, "Insufficient funds error. Not enough funds")
-    except OrderCreationError:
-        return error(462, "Order creation error. Unable to create order")
-    except PairAlreadyExisted:
-        return error(486, "Can not create new pair, because it is already existed.")
-    except PairDeletionError:
-        return error(487, "Can not delete pair.")
-    except OrderNotFound:
-        return error(477, "Order was not found")
-    except OrderCancellationError:
-        return error(463, "Order cancellation error. Unable to close order")
     except Exception as e:
-        return error(500, str(e.args))
+        return error(*describe_error(e))
+
+
+async def request_json(request: web.Request) -> t.Any:
+    # request body is parsed once and shared by decorators and handler
+    if "json" not in request:
+        request["json"] = await request.json()
+    return request["json"]
 
 
 class DDoS:
@@ -74,7 +97,7 @@ class DDoS:
 
         @wraps(func)
         async def wrapped(request: web.Request) -> web.Response:
-            json_data = schema.DDoSCheck.parse_obj(await request.json())
+            json_data = schema.DDoSCheck.parse_obj(await request_json(request))
             key_value = json_data.account_name
 
             request_dict[key_value].append(datetime.now())
@@ -102,3 +125,11 @@ def error(error_code: int, custom_message: t.Optional[str] = None) -> web.Respon
 
 def success(result: t.Dict[str, t.Any]) -> web.Response:
     return web.json_response({"success": True, "result": result})
+
+
+def success_body(result: t.Dict[str, t.Any]) -> str:
+    return json.dumps({"success": True, "result": result})
+
+
+def json_body(body: str) -> web.Response:
+    return web.Response(text=body, content_type="application/json")
@@ -1,23 +1,46 @@
 import typing as t
 
 from aiohttp import web
+from exchange.core.commands import (
+    CancelOrder,
+    Command,
+    CommandResult,
+    CreateLimit,
+    CreateMarket,
+)
 from exchange.core.entities import SymbolPair
 from exchange.core.entities.order import Order
+from exchange.core.entities.order_book import Depth
+from exchange.core.errors import BadRequest
 from exchange.core.exchange import Exchange
+from exchange.core.trade_tape import Columns
 
 from . import schema
-from .helper import DDoS, error, success
+from .helper import (
+    DDoS,
+    describe_error,
+    error,
+    json_body,
+    request_json,
+    success,
+    success_body,
+)
+from .streams import AccountStreams, MarketStreams
 
 
 routes = web.RouteTableDef()
 
 exchange_instance = Exchange()
 
+# last serialized depth response of a pair with its limit,
+# reused until the order book snapshot or the requested limit changes
+depth_responses: t.Dict[SymbolPair, t.Tuple[int, Depth, str]] = {}
+
 
 # region admin endpoints
 @routes.post("/account/create")
 async def create_account(request: web.Request) -> web.Response:
-    json_data = schema.CreateAccountRequest.parse_obj(await request.json())
+    json_data = schema.CreateAccountRequest.parse_obj(await request_json(request))
     exchange_instance.create_acc(
         json_data.account_name, json_data.balances,
     )
@@ -26,7 +49,7 @@ async def create_account(request: web.Request) -> web.Response:
 
 @routes.post("/account/delete")
 async def delete_account(request: web.Request) -> web.Response:
-    json_data = schema.DeleteAccountRequest.parse_obj(await request.json())
+    json_data = schema.DeleteAccountRequest.parse_obj(await request_json(request))
     exchange_instance.delete_acc(json_data.account_name)
     return web.Response(text=f"Account {json_data.account_name} was deleted")
 
@@ -35,13 +58,13 @@ async def delete_account(request: web.Request) -> web.Response:
 async def get_all_accounts(request: web.Request) -> web.Response:
     answer = {}
     for account in exchange_instance.accounts:
-        answer[account.name] = [account.balance, account.open_orders]
+        answer[account.name] = [dict(account.balance), account.open_orders]
     return success(answer)
 
 
 @routes.post("/pair/create")
 async def create_supported_pair(request: web.Request) -> web.Response:
-    json_data = schema.CreateSupportedPair.parse_obj(await request.json())
+    json_data = schema.CreateSupportedPair.parse_obj(await request_json(request))
     pair = json_data.symbol_pair.split("_")
     exchange_instance.create_pair(SymbolPair(pair[0], pair[1]))
     return web.Response(text=f"Pair {pair} was created")
@@ -49,12 +72,21 @@ async def create_supported_pair(request: web.Request) -> web.Response:
 
 @routes.post("/pair/delete")
 async def delete_supported_pair(request: web.Request) -> web.Response:
-    json_data = schema.DeleteSupportedPair.parse_obj(await request.json())
+    json_data = schema.DeleteSupportedPair.parse_obj(await request_json(request))
     pair = json_data.symbol_pair.split("_")
     exchange_instance.delete_pair(SymbolPair(pair[0], pair[1]))
+    depth_responses.pop(SymbolPair(pair[0], pair[1]), None)
     return web.Response(text=f"Pair {pair} was deleted")
 
 
+@routes.post("/pair/cancel_orders")
+async def cancel_pair_orders(request: web.Request) -> web.Response:
+    json_data = schema.PairCancelRequest.parse_obj(await request_json(request))
+    pair = SymbolPair(*json_data.symbol_pair.split("_"))
+    orders = await exchange_instance.mass_cancel(pair=pair)
+    return success({"order_ids": [order.order_id for order in orders]})
+
+
 @routes.get("/pair/get_all")
 async def get_all_supported_pair(request: web.Request) -> web.Response:
     return success({"pairs": exchange_instance.pairs})
@@ -66,7 +98,7 @@ async def get_all_supported_pair(request: web.Request) -> web.Response:
 @routes.post("/order/create")
 @DDoS(request_count=5, time_limit=1)
 async def create_order(request: web.Request) -> web.Response:
-    order_data = schema.CreateOrderRequest.parse_obj(await request.json())
+    order_data = schema.CreateOrderRequest.parse_obj(await request_json(request))
     pair = SymbolPair(*order_data.symbol_pair.split("_"))
     acc_name = order_data.account_name
     if order_data.side.lower() == "buy":
@@ -96,10 +128,72 @@ async def create_order(request: web.Request) -> web.Response:
     return success(order.to_json())
 
 
+@routes.post("/order/batch")
+@DDoS(request_count=5, time_limit=1)
+async def execute_order_batch(request: web.Request) -> web.Response:
+    batch = schema.BatchOrderRequest.parse_obj(await request_json(request))
+
+    commands: t.List[t.Union[Command, Exception]] = []
+    for command_data in batch.commands:
+        try:
+            commands.append(parse_command(batch.account_name, command_data))
+        except Exception as e:
+            commands.append(e)
+
+    executed = iter(
+        await exchange_instance.execute_batch(
+            [command for command in commands if not isinstance(command, Exception)]
+        )
+    )
+    results = [
+        command_result(command if isinstance(command, Exception) else next(executed))
+        for command in commands
+    ]
+    return success({"results": results})
+
+
+def parse_command(account_name: str, command_data: schema.OrderCommand) -> Command:
+    pair = SymbolPair(*command_data.symbol_pair.split("_"))
+    if command_data.action.lower() == "cancel":
+        if command_data.order_id is None:
+            raise BadRequest("Order id is required to cancel order")
+        return CancelOrder(pair, command_data.order_id)
+    elif command_data.action.lower() != "create":
+        raise BadRequest(
+            f"Action expected ether create or cancel, got {command_data.action}"
+        )
+
+    side = (command_data.side or "").lower()
+    if side not in ("buy", "sell"):
+        raise BadRequest(f"Side expected ether sell or buy, got {command_data.side}")
+    order_side = Order.Side.Buy if side == "buy" else Order.Side.Sell
+
+    if command_data.amount is None:
+        raise BadRequest("Amount is required to create order")
+
+    order_type = (command_data.type or "").lower()
+    if order_type == "market":
+        return CreateMarket(pair, order_side, command_data.amount, account_name)
+    elif order_type == "limit" and command_data.price is not None:
+        return CreateLimit(
+            pair, command_data.price, order_side, command_data.amount, account_name
+        )
+    raise BadRequest(
+        f"Order type expected ether limit with price or market, got {command_data.type}"
+    )
+
+
+def command_result(result: CommandResult) -> t.Dict[str, t.Any]:
+    if isinstance(result, Exception):
+        error_code, message = describe_error(result)
+        return {"success": False, "error_code": error_code, "message": message}
+    return {"success": True, "result": result.to_json()}
+
+
 @routes.get("/order")
 @DDoS(request_count=5, time_limit=1)
 async def get_order_info(request: web.Request) -> web.Response:
-    json_data = schema.OrderInfoRequest.parse_obj(await request.json())
+    json_data = schema.OrderInfoRequest.parse_obj(await request_json(request))
     order_id = json_data.order_id
     order = exchange_instance.get_order(order_id)
     order_info = order.to_json()
@@ -109,21 +203,87 @@ async def get_order_info(request: web.Request) -> web.Response:
 @routes.get("/depth")
 @DDoS(request_count=5, time_limit=1)
 async def get_order_book(request: web.Request) -> web.Response:
-    json_data = schema.DepthInfoRequest.parse_obj(await request.json())
+    json_data = schema.DepthInfoRequest.parse_obj(await request_json(request))
     pair = SymbolPair(*json_data.symbol_pair.split("_"))
-    order_book = exchange_instance.get_order_book(pair)
+    limit = json_data.limit
+    depth = await exchange_instance.depth(pair, limit)
+
+    cached = depth_responses.get(pair)
+    if cached is None or cached[0] != limit or cached[1] != depth:
+        answer = {
+            "symbol_pair": pair,
+            "bids": depth.Bids,
+            "asks": depth.Asks,
+        }
+        cached = depth_responses[pair] = (limit, depth, success_body(answer))
+
+    return json_body(cached[2])
+
+
+@routes.get("/klines")
+async def get_klines(request: web.Request) -> web.Response:
+    json_data = schema.KlinesRequest.parse_obj(await request_json(request))
+    pair = SymbolPair(*json_data.symbol_pair.split("_"))
+    bars = exchange_instance.klines(
+        pair,
+        json_data.interval,
+        json_data.limit,
+        json_data.start_time,
+        json_data.end_time,
+    )
+    # open time, open, high, low, close, volume, quote volume and number of trades
     answer = {
-        "symbol_pair": pair,
-        "bids": [[info.price, info.amount] for info in order_book.Bids],
-        "asks": [[info.price, info.amount] for info in order_book.Asks],
+        "symbol_pair": str(pair),
+        "interval": json_data.interval,
+        "klines": bars.tolist(),
     }
     return success(answer)
 
 
+def trade_rows(columns: Columns) -> t.List[t.Dict[str, t.Any]]:
+    # a dict per trade from columns of trades
+    lists = {name: column.tolist() for name, column in columns.items()}
+    return [dict(zip(lists, row)) for row in zip(*lists.values())]
+
+
+@routes.get("/trades")
+async def get_trades(request: web.Request) -> web.Response:
+    json_data = schema.TradesRequest.parse_obj(await request_json(request))
+    pair = SymbolPair(*json_data.symbol_pair.split("_"))
+    trades = exchange_instance.trade_tape(pair).recent(json_data.limit)
+    return success({"symbol_pair": str(pair), "trades": trade_rows(trades)})
+
+
+@routes.get("/agg_trades")
+async def get_agg_trades(request: web.Request) -> web.Response:
+    json_data = schema.AggTradesRequest.parse_obj(await request_json(request))
+    pair = SymbolPair(*json_data.symbol_pair.split("_"))
+    trades = exchange_instance.trade_tape(pair).aggregated(
+        json_data.limit,
+        json_data.from_id,
+        json_data.start_time,
+        json_data.end_time,
+    )
+    return success({"symbol_pair": str(pair), "trades": trade_rows(trades)})
+
+
+@routes.get("/ticker")
+async def get_tickers(request: web.Request) -> web.Response:
+    body = await request_json(request) if request.can_read_body else {}
+    json_data = schema.TickerRequest.parse_obj(body)
+    pairs = None
+    if json_data.symbol_pair is not None:
+        pairs = [SymbolPair(*json_data.symbol_pair.split("_"))]
+
+    tickers = exchange_instance.tickers(pairs)
+    answer = {str(pair): ticker._asdict() for pair, ticker in tickers.items()}
+    return success(answer)
+
+
 @routes.get("/account/balance")
 @DDoS(request_count=5, time_limit=1)
 async def get_account_balance(request: web.Request) -> web.Response:
-    json_data = schema.AccountBalanceRequest.parse_obj(await request.json())
+    json_data = schema.AccountBalanceRequest.parse_obj(await request_json(request))
     answer = {}
     symbols = json_data.symbols
     acc = exchange_instance.get_account(json_data.account_name)
@@ -135,11 +295,39 @@ async def get_account_balance(request: web.Request) -> web.Response:
 @routes.post("/order/cancel")
 @DDoS(request_count=5, time_limit=1)
 async def cancel_order(request: web.Request) -> web.Response:
-    json_data = schema.OrderCancelRequest.parse_obj(await request.json())
+    json_data = schema.OrderCancelRequest.parse_obj(await request_json(request))
     pair = SymbolPair(*json_data.symbol_pair.split("_"))
     order_id = json_data.order_id
     await exchange_instance.cancel_order(pair, order_id)
     return success({"order_id": order_id})
 
 
+@routes.post("/order/cancel_all")
+@DDoS(request_count=5, time_limit=1)
+async def cancel_all_orders(request: web.Request) -> web.Response:
+    json_data = schema.MassCancelRequest.parse_obj(await request_json(request))
+    pair = None
+    if json_data.symbol_pair is not None:
+        pair = SymbolPair(*json_data.symbol_pair.split("_"))
+    orders = await exchange_instance.mass_cancel(json_data.account_name, pair)
+    return success({"order_ids": [order.order_id for order in orders]})
+
+
+# endregion
+
+# websocket endpoints
+@routes.get("/ws/market")
+async def stream_market_data(request: web.Request) -> web.StreamResponse:
+    # depth snapshot, then depth diffs and trades of every subscribed pair
+    streams: MarketStreams = request.app["market_streams"]
+    return await streams.connect(request)
+
+
+@routes.get("/ws/account")
+async def stream_account_updates(request: web.Request) -> web.StreamResponse:
+    # snapshot, then order and balance updates of every subscribed account
+    streams: AccountStreams = request.app["account_streams"]
+    return await streams.connect(request)
+
+
 # endregion
@@ -1,6 +1,18 @@
 import typing as t
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+
+# deeper snapshots are not served, it bounds the size of the response
+MAX_DEPTH_LIMIT = 1000
+# candles kept per interval of a pair
+MAX_KLINES_LIMIT = 1000
+# trades served per request, a tape keeps more of them
+MAX_TRADES_LIMIT = 1000
+# commands of a batch, it bounds the time a batch holds the exchange
+MAX_BATCH_SIZE = 1000
+# order ids are signed 64 bit integers in the journal
+ORDER_ID_BOUND = 2 ** 63
 
 
 class CreateAccountRequest(BaseModel):
@@ -29,15 +41,70 @@ class CreateOrderRequest(BaseModel):
     symbol_pair: str
 
 
+class OrderCommand(BaseModel):
+    action: str = "create"
+    symbol_pair: str
+    type: t.Optional[str] = None
+    amount: t.Optional[float] = None
+    price: t.Optional[float] = None
+    side: t.Optional[str] = None
+    order_id: t.Optional[int] = Field(None, ge=0, lt=ORDER_ID_BOUND)
+
+
+class BatchOrderRequest(BaseModel):
+    account_name: str
+    commands: t.List[OrderCommand] = Field(..., max_length=MAX_BATCH_SIZE)
+
+
 class OrderInfoRequest(BaseModel):
     account_name: str
     symbol_pair: str
-    order_id: int
+    order_id: int = Field(..., ge=0, lt=ORDER_ID_BOUND)
 
 
 class DepthInfoRequest(BaseModel):
     account_name: str
     symbol_pair: str
+    limit: int = Field(100, ge=1, le=MAX_DEPTH_LIMIT)
+
+
+class KlinesRequest(BaseModel):
+    symbol_pair: str
+    interval: str = "1m"
+    limit: int = Field(500, ge=1, le=MAX_KLINES_LIMIT)
+    # open time of bars in milliseconds
+    start_time: t.Optional[int] = None
+    end_time: t.Optional[int] = None
+
+
+class TradesRequest(BaseModel):
+    symbol_pair: str
+    limit: int = Field(500, ge=1, le=MAX_TRADES_LIMIT)
+
+
+class AggTradesRequest(BaseModel):
+    symbol_pair: str
+    limit: int = Field(500, ge=1, le=MAX_TRADES_LIMIT)
+    from_id: t.Optional[int] = Field(None, ge=0)
+    # time of trades in milliseconds
+    start_time: t.Optional[int] = None
+    end_time: t.Optional[int] = None
+
+
+class TickerRequest(BaseModel):
+    # every pair if not given
+    symbol_pair: t.Optional[str] = None
+
+
+class StreamRequest(BaseModel):
+    action: str
+    symbol_pair: str
+    limit: int = Field(100, ge=1, le=MAX_DEPTH_LIMIT)
+
+
+class AccountStreamRequest(BaseModel):
+    action: str
+    account_name: str
 
 
 class AccountInfoRequest(BaseModel):
@@ -52,7 +119,16 @@ class AccountBalanceRequest(BaseModel):
 class OrderCancelRequest(BaseModel):
     account_name: str
     symbol_pair: str
-    order_id: int
+    order_id: int = Field(..., ge=0, lt=ORDER_ID_BOUND)
+
+
+class MassCancelRequest(BaseModel):
+    account_name: str
+    symbol_pair: t.Optional[str] = None
+
+
+class PairCancelRequest(BaseModel):
+    symbol_pair: str
 
 
 class DDoSCheck(BaseModel):
@@ -0,0 +1,510 @@
+import asyncio
+import json
+import typing as t
+from collections import deque
+from functools import partial
+
+from aiohttp import web, WSCloseCode, WSMsgType
+from exchange.core.entities import SymbolPair
+from exchange.core.entities.order_book import Depth
+from exchange.core.errors import BadRequest
+from exchange.core.exchange import Exchange, ExchangeEvent, Trade
+from exchange.libs.event_emitter import Dispatcher
+from exchange.libs.flow import OverflowPolicy
+
+from . import schema
+from .helper import describe_error
+
+
+# price and amount of levels, 0 amount means removed level
+Levels = t.Dict[float, float]
+# dispatcher and forwarding task of every account followed by a connection
+_Subscriptions = t.Dict[str, t.Tuple[Dispatcher[ExchangeEvent], "asyncio.Task[None]"]]
+
+
+def depth_message(
+    pair: SymbolPair, version: int, bids: Levels, asks: Levels, snapshot: bool = False
+) -> str:
+    # levels of both sides from the best price
+    return json.dumps(
+        {
+            "channel": "depth",
+            "symbol_pair": str(pair),
+            "snapshot": snapshot,
+            "version": version,
+            "bids": sorted(bids.items(), reverse=True),
+            "asks": sorted(asks.items()),
+        }
+    )
+
+
+def trades_message(pair: SymbolPair, time: float, trades: t.Iterable[Trade]) -> str:
+    return json.dumps(
+        {
+            "channel": "trades",
+            "symbol_pair": str(pair),
+            "time": time,
+            "trades": list(trades),
+        }
+    )
+
+
+def account_message(
+    account_name: str,
+    orders: t.List[t.Dict[str, t.Any]],
+    balances: t.Dict[str, float],
+    snapshot: bool = False,
+) -> str:
+    return json.dumps(
+        {
+            "channel": "account",
+            "account_name": account_name,
+            "snapshot": snapshot,
+            "orders": orders,
+            "balances": balances,
+        }
+    )
+
+
+def error_message(e: Exception) -> str:
+    error_code, message = describe_error(e)
+    return json.dumps({"success": False, "error_code": error_code, "message": message})
+
+
+class _Conflated:
+    """Depth diffs and trades of a pair merged while a client is behind.
+
+    Diffs carry new amounts of levels, so merged diffs are applied to any
+    snapshot older than the last of them.
+    """
+
+    version: int
+    bids: Levels
+    asks: Levels
+    # time of the last trades and the most recent trades
+    time: float
+    trades: t.Deque[Trade]
+    # diffs are not sent before the snapshot of the pair
+    is_ready: bool
+
+    def __init__(self, max_trades: int, is_ready: bool = True) -> None:
+        self.version = -1
+        self.bids = {}
+        self.asks = {}
+        self.time = 0
+        self.trades = deque(maxlen=max_trades)
+        self.is_ready = is_ready
+
+
+class MarketClient:
+    """Messages of followed pairs queued to a websocket connection.
+
+    Messages are serialized once for all clients and sent by the writer of
+    the client. A client with ``maxsize`` unsent messages is behind, then
+    new diffs and trades of a pair are merged until the writer catches up.
+    """
+
+    ws: web.WebSocketResponse
+    # diffs and trades merged instead of queued
+    conflated: int
+
+    _messages: t.Deque[str]
+    _maxsize: int
+    _conflated: t.Dict[SymbolPair, _Conflated]
+    # version of the last depth message of followed pairs
+    _versions: t.Dict[SymbolPair, int]
+    _wakeup: asyncio.Event
+
+    def __init__(self, ws: web.WebSocketResponse, maxsize: int = 1000) -> None:
+        self.ws = ws
+        self.conflated = 0
+        self._messages = deque()
+        self._maxsize = maxsize
+        self._conflated = {}
+        self._versions = {}
+        self._wakeup = asyncio.Event()
+
+    @property
+    def pairs(self) -> t.List[SymbolPair]:
+        return list(self._versions)
+
+    def is_following(self, pair: SymbolPair) -> bool:
+        return pair in self._versions
+
+    def follow(self, pair: SymbolPair) -> None:
+        # events of the pair are merged until its snapshot is queued
+        self._versions[pair] = -1
+        self._conflated[pair] = _Conflated(self._maxsize, is_ready=False)
+
+    def unfollow(self, pair: SymbolPair) -> None:
+        self._versions.pop(pair, None)
+        self._conflated.pop(pair, None)
+
+    def send(self, message: str) -> None:
+        self._messages.append(message)
+        self._wakeup.set()
+
+    def snapshot(self, pair: SymbolPair, depth: Depth) -> None:
+        if pair not in self._versions:
+            return
+        self._versions[pair] = depth.version
+        self.send(
+            depth_message(
+                pair, depth.version, dict(depth.Bids), dict(depth.Asks), snapshot=True
+            )
+        )
+        # nothing was merged while the snapshot was taken
+        conflated = self._conflated[pair]
+        if conflated.version < 0 and not conflated.trades:
+            del self._conflated[pair]
+        conflated.is_ready = True
+
+    def diff(
+        self, pair: SymbolPair, version: int, bids: Levels, asks: Levels, message: str
+    ) -> None:
+        if version <= self._versions.get(pair, version):
+            return
+
+        conflated = self._conflate(pair)
+        if conflated is None:
+            self._versions[pair] = version
+            self.send(message)
+        else:
+            conflated.version = version
+            conflated.bids.update(bids)
+            conflated.asks.update(asks)
+            self._wakeup.set()
+
+    def trades(
+        self, pair: SymbolPair, time: float, trades: t.List[Trade], message: str
+    ) -> None:
+        if pair not in self._versions:
+            return
+
+        conflated = self._conflate(pair)
+        if conflated is None:
+            self.send(message)
+        else:
+            conflated.time = time
+            conflated.trades.extend(trades)
+            self._wakeup.set()
+
+    async def write_forever(self) -> None:
+        with_messages = True
+        while True:
+            if not with_messages:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            message = self._next_message()
+            with_messages = message is not None
+            if message is not None:
+                try:
+                    await self.ws.send_str(message)
+                except ConnectionResetError:
+                    return
+
+    def _conflate(self, pair: SymbolPair) -> t.Optional[_Conflated]:
+        # messages of a pair with merged events wait until they are sent
+        conflated = self._conflated.get(pair)
+        if conflated is None and len(self._messages) >= self._maxsize:
+            conflated = self._conflated[pair] = _Conflated(self._maxsize)
+        if conflated is not None:
+            self.conflated += 1
+        return conflated
+
+    def _next_message(self) -> t.Optional[str]:
+        # merged events are sent after the messages queued before them
+        if not self._messages:
+            conflated = self._conflated.items()
+            for pair in [pair for pair, merged in conflated if merged.is_ready]:
+                self._flush(pair, self._conflated.pop(pair))
+
+        return self._messages.popleft() if self._messages else None
+
+    def _flush(self, pair: SymbolPair, conflated: _Conflated) -> None:
+        if conflated.version > self._versions[pair]:
+            self._versions[pair] = conflated.version
+            self._messages.append(
+                depth_message(pair, conflated.version, conflated.bids, conflated.asks)
+            )
+        if conflated.trades:
+            self._messages.append(
+                trades_message(pair, conflated.time, conflated.trades)
+            )
+
+
+class MarketStreams:
+    """Depth snapshots, depth diffs and trades of pairs sent to websockets.
+
+    Events of a pair are routed to the streams by the pair topic only while
+    it is followed, and events of a dispatched batch are merged into single
+    messages serialized once for all clients.
+    """
+
+    _exchange: Exchange
+    _maxsize: int
+    _batch_size: int
+    _clients: t.Set[MarketClient]
+    _followers: t.Dict[SymbolPair, t.Set[MarketClient]]
+    _dispatchers: t.Dict[
+        SymbolPair, t.List[t.Tuple[Dispatcher[ExchangeEvent], asyncio.Task[None]]]
+    ]
+
+    def __init__(
+        self, exchange: Exchange, maxsize: int = 1000, batch_size: int = 100
+    ) -> None:
+        self._exchange = exchange
+        self._maxsize = maxsize
+        self._batch_size = batch_size
+        self._clients = set()
+        self._followers = {}
+        self._dispatchers = {}
+
+    async def connect(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        client = MarketClient(ws, self._maxsize)
+        self._clients.add(client)
+        writer = asyncio.create_task(client.write_forever())
+        try:
+            async for message in ws:
+                if message.type == WSMsgType.TEXT:
+                    await self._handle(client, message.data)
+        finally:
+            writer.cancel()
+            self._clients.discard(client)
+            for pair in client.pairs:
+                await self._unfollow(client, pair)
+        return ws
+
+    async def close(self) -> None:
+        for client in list(self._clients):
+            await client.ws.close()
+        for pair in list(self._dispatchers):
+            await self._stop(pair)
+
+    async def _handle(self, client: MarketClient, data: str) -> None:
+        try:
+            request = schema.StreamRequest.parse_raw(data)
+            pair = SymbolPair(*request.symbol_pair.split("_"))
+            action = request.action.lower()
+            if action == "subscribe":
+                await self._follow(client, pair, request.limit)
+            elif action == "unsubscribe":
+                await self._unfollow(client, pair)
+            else:
+                raise BadRequest(
+                    f"Action expected ether subscribe or unsubscribe, got {action}"
+                )
+        except Exception as e:
+            client.send(error_message(e))
+
+    async def _follow(self, client: MarketClient, pair: SymbolPair, limit: int) -> None:
+        if client.is_following(pair):
+            return
+
+        # events emitted while the snapshot is taken are merged by the client
+        client.follow(pair)
+        self._followers.setdefault(pair, set()).add(client)
+        if pair not in self._dispatchers:
+            self._start(pair)
+
+        try:
+            depth = await self._exchange.depth(pair, limit)
+        except Exception:
+            await self._unfollow(client, pair)
+            raise
+        client.snapshot(pair, depth)
+
+    async def _unfollow(self, client: MarketClient, pair: SymbolPair) -> None:
+        client.unfollow(pair)
+        followers = self._followers.get(pair, set())
+        followers.discard(client)
+        if not followers:
+            self._followers.pop(pair, None)
+            await self._stop(pair)
+
+    def _start(self, pair: SymbolPair) -> None:
+        topic = ("symbol_pair", pair)
+        dispatchers = [
+            self._exchange.subscribe(
+                ExchangeEvent.BookDelta, partial(self._send_diffs, pair), topic=topic
+            ),
+            self._exchange.subscribe(
+                ExchangeEvent.Trades, partial(self._send_trades, pair), topic=topic
+            ),
+        ]
+        self._dispatchers[pair] = [
+            (dispatcher, dispatcher.dispatch_forever(batch_size=self._batch_size))
+            for dispatcher in dispatchers
+        ]
+
+    async def _stop(self, pair: SymbolPair) -> None:
+        for dispatcher, task in self._dispatchers.pop(pair, []):
+            await dispatcher.stop()
+            await task
+
+    async def _send_diffs(
+        self, pair: SymbolPair, events: t.List[t.Dict[str, t.Any]]
+    ) -> None:
+        bids: Levels = {}
+        asks: Levels = {}
+        for event in events:
+            bids.update(event["bids"])
+            asks.update(event["asks"])
+        version = events[-1]["version"]
+
+        message = depth_message(pair, version, bids, asks)
+        for client in self._followers.get(pair, ()):
+            client.diff(pair, version, bids, asks, message)
+
+    async def _send_trades(
+        self, pair: SymbolPair, events: t.List[t.Dict[str, t.Any]]
+    ) -> None:
+        trades = [trade for event in events for trade in event["trades"]]
+        time = events[-1]["time"]
+
+        message = trades_message(pair, time, trades)
+        for client in self._followers.get(pair, ()):
+            client.trades(pair, time, trades, message)
+
+
+class AccountStreams:
+    """Order and balance updates of accounts sent to websockets.
+
+    Updates are routed to a connection by the account topic, so it never
+    receives updates of other accounts. Updates can't be merged or dropped,
+    a connection with ``maxsize`` unsent updates is closed instead and its
+    client subscribes again to get a new snapshot.
+    """
+
+    _exchange: Exchange
+    _maxsize: int
+    _batch_size: int
+    _connections: t.Set[web.WebSocketResponse]
+
+    def __init__(
+        self, exchange: Exchange, maxsize: int = 1000, batch_size: int = 100
+    ) -> None:
+        self._exchange = exchange
+        self._maxsize = maxsize
+        self._batch_size = batch_size
+        self._connections = set()
+
+    async def connect(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        # subscriptions of the connection by account name
+        subscriptions: _Subscriptions = {}
+        self._connections.add(ws)
+        try:
+            async for message in ws:
+                if message.type == WSMsgType.TEXT:
+                    await self._handle(ws, subscriptions, message.data)
+        finally:
+            self._connections.discard(ws)
+            for account_name in list(subscriptions):
+                await self._unfollow(subscriptions, account_name)
+        return ws
+
+    async def close(self) -> None:
+        for ws in list(self._connections):
+            await ws.close()
+
+    async def _handle(
+        self, ws: web.WebSocketResponse, subscriptions: _Subscriptions, data: str
+    ) -> None:
+        try:
+            request = schema.AccountStreamRequest.parse_raw(data)
+            action = request.action.lower()
+            if action == "subscribe":
+                await self._follow(ws, subscriptions, request.account_name)
+            elif action == "unsubscribe":
+                await self._unfollow(subscriptions, request.account_name)
+            else:
+                raise BadRequest(
+                    f"Action expected ether subscribe or unsubscribe, got {action}"
+                )
+        except Exception as e:
+            await ws.send_str(error_message(e))
+
+    async def _follow(
+        self,
+        ws: web.WebSocketResponse,
+        subscriptions: _Subscriptions,
+        account_name: str,
+    ) -> None:
+        if account_name in subscriptions:
+            return
+        account = self._exchange.get_account(account_name)
+
+        # updates published before the subscription are in the snapshot already
+        await self._exchange.flush()
+        dispatcher = self._exchange.subscribe(
+            ExchangeEvent.AccountUpdate,
+            partial(self._send, ws, account_name),
+            maxsize=self._maxsize,
+            policy=OverflowPolicy.Disconnect,
+            topic=("account_name", account_name),
+        )
+        snapshot = account_message(
+            account_name,
+            [order.to_json() for order in account.open_orders.values()],
+            dict(account.balance),
+            snapshot=True,
+        )
+
+        # updates wait in the fork of the subscription until the snapshot is sent
+        forwarding = asyncio.create_task(
+            self._forward(ws, subscriptions, account_name, snapshot, dispatcher)
+        )
+        subscriptions[account_name] = (dispatcher, forwarding)
+
+    async def _unfollow(
+        self, subscriptions: _Subscriptions, account_name: str
+    ) -> None:
+        subscription = subscriptions.pop(account_name, None)
+        if subscription is not None:
+            dispatcher, forwarding = subscription
+            await dispatcher.stop()
+            await forwarding
+
+    async def _forward(
+        self,
+        ws: web.WebSocketResponse,
+        subscriptions: _Subscriptions,
+        account_name: str,
+        snapshot: str,
+        dispatcher: Dispatcher[ExchangeEvent],
+    ) -> None:
+        try:
+            await ws.send_str(snapshot)
+            await dispatcher.dispatch_forever(batch_size=self._batch_size)
+        except ConnectionResetError:
+            return
+
+        # the subscription wasn't stopped by unsubscribing, so it was
+        # disconnected while the connection lagged behind
+        subscription = subscriptions.get(account_name)
+        if subscription is not None and subscription[0] is dispatcher:
+            del subscriptions[account_name]
+            await ws.close(
+                code=WSCloseCode.TRY_AGAIN_LATER,
+                message=b"Updates are not read fast enough",
+            )
+
+    @staticmethod
+    async def _send(
+        ws: web.WebSocketResponse,
+        account_name: str,
+        updates: t.List[t.Dict[str, t.Any]],
+    ) -> None:
+        # updates of a batch are sent as one message, the last balances win
+        orders = [order for update in updates for order in update["orders"]]
+        balances: t.Dict[str, float] = {}
+        for update in updates:
+            balances.update(update["balances"])
+        await ws.send_str(account_message(account_name, orders, balances))
@@ -0,0 +1,80 @@
+from collections import defaultdict
+
+import pytest
+from exchange.core.auction import Allocation, CallAuction, Clearing
+from exchange.core.entities import SymbolPair
+from exchange.core.entities.account import Account
+from exchange.core.entities.order import Order
+from exchange.core.match_model import MatchReportType
+
+
+PAIR = SymbolPair("btc", "usdt")
+ACCOUNT = Account(name="Vladimir", balance=defaultdict(float), open_orders={})
+
+
+def limit(side: Order.Side, price: float, amount: float) -> Order:
+    return Order(amount, side, PAIR, ACCOUNT, Order.Type.Limit, price)
+
+
+def test_clearing_price():
+    auction = CallAuction()
+    assert auction.clearing() == Clearing(None, 0)
+
+    buys = [limit(Order.Side.Buy, 105, 10), limit(Order.Side.Buy, 100, 5)]
+    sells = [limit(Order.Side.Sell, 95, 8), limit(Order.Side.Sell, 102, 6)]
+    for order in buys + sells:
+        auction.add(order)
+
+    # 10 lots are executable at 102 and 105 with the same imbalance
+    clearing = auction.clearing()
+    assert clearing.price_ticks == 102 * 10 ** 6
+    assert clearing.volume_lots == 10 * 10 ** 8
+
+    _, reports = auction.uncross()
+    assert [(report.order, report.base_matched) for report in reports] == [
+        (buys[0], 10 * 10 ** 8),
+        (sells[0], 8 * 10 ** 8),
+        (sells[1], 2 * 10 ** 8),
+    ]
+    assert all(
+        report.quote_matched == report.base_matched * 102 * 10 ** 6
+        for report in reports
+    )
+    assert [report.match_type for report in reports] == [
+        MatchReportType.Full,
+        MatchReportType.Full,
+        MatchReportType.Partial,
+    ]
+    assert list(auction) == [buys[1], sells[1]]
+    assert auction.clearing() == Clearing(None, 0)
+
+
+@pytest.mark.parametrize(
+    "allocation, filled",
+    [(Allocation.Time, [4, 0, 0]), (Allocation.ProRata, [2.4, 0.8, 0.8])],
+)
+def test_allocation(allocation: Allocation, filled):
+    auction = CallAuction(allocation)
+    # the better priced order is filled before the marginal level is shared
+    better = limit(Order.Side.Sell, 99, 1)
+    sells = [limit(Order.Side.Sell, 100, amount) for amount in (6, 2, 2)]
+    for order in [*sells, better, limit(Order.Side.Buy, 101, 5)]:
+        auction.add(order)
+
+    clearing, _ = auction.uncross()
+    assert clearing == Clearing(100 * 10 ** 6, 5 * 10 ** 8)
+    assert better.status == Order.Status.Closed
+    assert [order.filled for order in sells] == filled
+
+
+def test_pro_rata_of_large_amounts():
+    auction = CallAuction(Allocation.ProRata)
+    sells = [limit(Order.Side.Sell, 1, 10 ** 6) for _ in range(3)]
+    for order in [*sells, limit(Order.Side.Buy, 1, 10 ** 6)]:
+        auction.add(order)
+
+    auction.uncross()
+    assert sum(order.filled_lots for order in sells) == 10 ** 14
+    assert max(order.filled_lots for order in sells) - min(
+        order.filled_lots for order in sells
+    ) <= 1
@@ -0,0 +1,53 @@
+import pytest
+from exchange.core.candles import Candles, CandleSeries, summarize
+from exchange.core.errors import BadRequest
+
+
+def test_ring_buffer():
+    series = CandleSeries(1000, capacity=3)
+    assert len(series.last(10)) == 0
+
+    for time_ms, price in ((0, 1), (1000, 2), (1500, 4), (1700, 3), (2000, 5)):
+        series.add(time_ms, (price, price, price, price, 1, price, 1))
+    series.add(3999, (6, 7, 6, 7, 2, 13, 2))
+
+    bars = series.last(10)
+    assert bars["open_time"].tolist() == [1000, 2000, 3000]
+    assert bars[0].tolist() == (1000, 2, 4, 2, 3, 3, 9, 3)
+    assert bars[2].tolist() == (3000, 6, 7, 6, 7, 2, 13, 2)
+    # the latest bars are a read only view of the buffer
+    assert not bars.flags.writeable
+    assert bars.base is not None
+    assert series.last(2)["open_time"].tolist() == [2000, 3000]
+
+    # a trade of an earlier time updates the last bar
+    series.add(0, (1, 1, 1, 1, 1, 1, 1))
+    assert series.last(1)[0].tolist() == (3000, 6, 7, 1, 1, 3, 14, 3)
+
+
+def test_time_range():
+    series = CandleSeries(1000)
+    for second in range(10):
+        series.add(second * 1000, (1, 1, 1, 1, 1, 1, 1))
+
+    def open_seconds(*args):
+        return (series.last(*args)["open_time"] // 1000).tolist()
+
+    assert open_seconds(3, 2000) == [2, 3, 4]
+    assert open_seconds(3, None, 5500) == [3, 4, 5]
+    assert open_seconds(10, 2000, 4000) == [2, 3, 4]
+
+
+def test_candles_of_trades():
+    candles = Candles(capacity=10)
+    candles.add(61500, summarize([(2, 1, "buy"), (3, 2, "buy"), (1, 1, None)]))
+    candles.add(62500, summarize([(4, 1, "sell")]))
+
+    assert candles.last("1s", 10).tolist() == [
+        (61000, 2, 3, 1, 1, 4, 9, 3),
+        (62000, 4, 4, 4, 4, 1, 4, 1),
+    ]
+    assert candles.last("1m", 10).tolist() == [(60000, 2, 4, 1, 4, 5, 13, 4)]
+    assert candles.last("1d", 10)["trades"].tolist() == [4]
+    with pytest.raises(BadRequest):
+        candles.last("2m", 10)
@@ -0,0 +1,239 @@
+import asyncio
+
+import pytest
+from exchange.core.cluster import ClusterExchange, Engine, StaleEstimate
+from exchange.core.entities import SymbolPair
+from exchange.core.entities.order import Order
+from exchange.core.errors import (
+    ExchangeNotAvailable,
+    InsufficientFunds,
+    OrderCreationError,
+    UnsupportedPairs,
+)
+from exchange.core.match_model import MatchReportType, ReportOwnerType
+
+
+BTC = SymbolPair("btc", "usdt")
+ETH = SymbolPair("eth", "usdt")
+
+
+@pytest.fixture
+def cluster():
+    exchange = ClusterExchange(workers_number=2)
+    exchange.create_pair(BTC)
+    exchange.create_pair(ETH)
+    exchange.create_acc("Vladimir", dict(btc=100, eth=100, usdt=100))
+    exchange.create_acc("Ewriji", dict(btc=100, eth=100, usdt=100))
+    return exchange
+
+
+def test_engine_match():
+    engine = Engine()
+    engine.create_pair(BTC)
+
+    status, _, reports, _, levels = engine.limit(BTC, 1, Order.Side.Sell, 2, 3)
+    assert status == Order.Status.Opened
+    assert reports == []
+    assert levels == [(Order.Side.Sell, 2, 3)]
+    assert engine.estimate(BTC, 2) == 4
+
+    status, required, reports, _, levels = engine.market(BTC, 2, Order.Side.Buy, 2, 10)
+    assert status == Order.Status.Closed
+    assert required == 4
+    assert reports == [
+        (ReportOwnerType.Maker, MatchReportType.Partial, 1, 4, 2),
+        (ReportOwnerType.Taker, MatchReportType.Full, 2, 4, 2),
+    ]
+    assert levels == [(Order.Side.Sell, 2, 1)]
+
+    with pytest.raises(StaleEstimate) as error:
+        engine.market(BTC, 3, Order.Side.Buy, 1, 1)
+    assert error.value.required == 2
+
+    # cancels return the version of the book and the changed levels
+    assert engine.cancel(BTC, 1) == (
+        engine.order_books[BTC].version,
+        [(Order.Side.Sell, 2, 0)],
+    )
+    assert engine.cancel(BTC, 1) is None
+    with pytest.raises(UnsupportedPairs):
+        engine.depth(ETH, 10)
+
+
+@pytest.mark.asyncio
+async def test_pairs_are_spread_over_workers(cluster: ClusterExchange):
+    assert cluster.workers_number == 2
+    assert cluster._worker(BTC) is not cluster._worker(ETH)
+
+    with pytest.raises(UnsupportedPairs):
+        await cluster.create_limit(
+            SymbolPair("xrp", "usdt"), 1, Order.Side.Buy, 1, "Vladimir"
+        )
+    with pytest.raises(ExchangeNotAvailable):
+        await cluster.depth(BTC, 10)
+
+
+@pytest.mark.asyncio
+async def test_cluster_matching(cluster: ClusterExchange):
+    await cluster.start()
+    try:
+        await check_matching(cluster)
+    finally:
+        await cluster.stop()
+
+
+async def check_matching(cluster: ClusterExchange) -> None:
+    makers = await asyncio.gather(
+        *(
+            cluster.create_limit(pair, 1 + i, Order.Side.Sell, 1, "Ewriji")
+            for pair in (BTC, ETH)
+            for i in range(3)
+        )
+    )
+    btc_taker, eth_taker = await asyncio.gather(
+        cluster.create_limit(BTC, 2, Order.Side.Buy, 1.5, "Vladimir"),
+        cluster.create_market(ETH, Order.Side.Buy, 2.5, "Vladimir"),
+    )
+
+    assert btc_taker.filled == 1.5
+    assert btc_taker.status == eth_taker.status == Order.Status.Closed
+    assert [maker.status for maker in makers[:3]] == [
+        Order.Status.Closed,
+        Order.Status.Opened,
+        Order.Status.Opened,
+    ]
+    assert makers[1].filled == 0.5
+    assert makers[4].status == Order.Status.Closed
+    assert makers[5].filled == 0.5
+
+    buyer = cluster.get_account("Vladimir")
+    seller = cluster.get_account("Ewriji")
+    # 1 + 0.5 * 2 for btc and 1 + 2 + 0.5 * 3 for eth
+    assert buyer.balance["usdt"] == 100 - 2 - 4.5
+    assert buyer.balance["btc"] == 100 + 1.5 * (1 - buyer.taker_fee)
+    assert seller.balance["usdt"] == 100 + 6.5 * (1 - seller.maker_fee)
+
+    depth = await cluster.depth(ETH, 10)
+    assert depth.Asks == [(3, 0.5)]
+
+    await cluster.cancel_order(BTC, makers[2].order_id)
+    assert makers[2].status == Order.Status.Closed
+    # sold 1.5 and 0.5 is still frozen by the partially filled maker
+    assert seller.balance["btc"] == 100 - 1.5 - 0.5
+    assert (await cluster.depth(BTC, 10)).Asks == [(2, 0.5)]
+
+    # market buy reserves only its estimated cost, other orders use the rest
+    cluster.create_acc("Buyer", dict(usdt=10))
+    market, limit = await asyncio.gather(
+        cluster.create_market(ETH, Order.Side.Buy, 0.25, "Buyer"),
+        cluster.create_limit(BTC, 1, Order.Side.Buy, 9, "Buyer"),
+    )
+    assert market.status == Order.Status.Closed
+    assert limit.status == Order.Status.Opened
+    assert cluster.get_account("Buyer").balance["usdt"] == 10 - 0.75 - 9
+
+    cluster.create_acc("Poor", dict(usdt=0.5))
+    with pytest.raises(InsufficientFunds):
+        await cluster.create_market(ETH, Order.Side.Buy, 0.5, "Poor")
+    assert cluster.get_account("Poor").balance["usdt"] == 0.5
+
+    cancelled = await cluster.mass_cancel("Ewriji")
+    assert sorted(order.order_id for order in cancelled) == [
+        makers[1].order_id,
+        makers[5].order_id,
+    ]
+    assert seller.balance["btc"] == 100 - 1.5
+    assert seller.balance["eth"] == 100 - 2.75
+
+
+@pytest.mark.asyncio
+async def test_stale_estimate_is_retried(cluster: ClusterExchange):
+    await cluster.start()
+    try:
+        await cluster.create_limit(ETH, 2, Order.Side.Sell, 1, "Ewriji")
+        # the maker is replaced by a more expensive one after the estimate
+        worker = cluster._worker(ETH)
+        estimate = worker.request("estimate", ETH, 100_000_000)
+        await estimate
+        await cluster.mass_cancel("Ewriji")
+        await cluster.create_limit(ETH, 3, Order.Side.Sell, 1, "Ewriji")
+
+        with pytest.raises(StaleEstimate):
+            await worker.request(
+                "market", ETH, 100, Order.Side.Buy, 100_000_000, estimate.result()
+            )
+
+        order = await cluster.create_market(ETH, Order.Side.Buy, 1, "Vladimir")
+        assert order.status == Order.Status.Closed
+        assert cluster.get_account("Vladimir").balance["usdt"] == 100 - 3
+    finally:
+        await cluster.stop()
+
+
+@pytest.mark.asyncio
+async def test_stale_estimate_retries_are_limited(cluster: ClusterExchange):
+    await cluster.start()
+    try:
+        await cluster.create_limit(ETH, 2, Order.Side.Sell, 1, "Ewriji")
+        worker = cluster._worker(ETH)
+        request = worker.request
+
+        def underestimated(command, *arguments, **kwargs):
+            # asks always get more expensive than the reserve
+            if command == "market":
+                arguments = (*arguments[:-1], 0)
+            return request(command, *arguments, **kwargs)
+
+        worker.request = underestimated  # type: ignore
+        with pytest.raises(OrderCreationError):
+            await cluster.create_market(ETH, Order.Side.Buy, 1, "Vladimir")
+        assert cluster.get_account("Vladimir").balance["usdt"] == 100
+    finally:
+        await cluster.stop()
+
+
+@pytest.mark.asyncio
+async def test_worker_exit(cluster: ClusterExchange):
+    await cluster.start()
+    try:
+        worker = cluster._worker(BTC)
+        pending = worker.request("depth", BTC, 10)
+        await pending
+        worker._process.kill()
+
+        with pytest.raises(ExchangeNotAvailable):
+            while True:
+                await cluster.depth(BTC, 10)
+        # sending may fail before the end of the responses pipe is read
+        for _ in range(100):
+            if not worker.is_running:
+                break
+            await asyncio.sleep(0.01)
+        assert not worker.is_running
+        assert worker._pending == {}
+
+        # pairs of other workers are still served
+        assert (await cluster.depth(ETH, 10)).Asks == []
+    finally:
+        await cluster.stop()
+
+
+@pytest.mark.asyncio
+async def test_worker_exit_returns_frozen_funds(cluster: ClusterExchange):
+    await cluster.start()
+    try:
+        worker = cluster._worker(BTC)
+        worker._process.kill()
+        worker._process.join()
+
+        # orders sent to the exited worker are never matched
+        with pytest.raises(ExchangeNotAvailable):
+            await cluster.create_limit(BTC, 2, Order.Side.Buy, 1, "Vladimir")
+        with pytest.raises(ExchangeNotAvailable):
+            await cluster.create_market(BTC, Order.Side.Sell, 1, "Ewriji")
+
+        assert cluster.get_account("Vladimir").balance["usdt"] == 100
+        assert cluster.get_account("Ewriji").balance["btc"] == 100
+        assert cluster._frozen_deposits == {}
+    finally:
+        await cluster.stop()
@@ -1,4 +1,5 @@
 import asyncio
+import typing as t
 from enum import Enum, auto
 
 import pytest
@@ -42,4 +43,141 @@ async def test_event_receiving() -> None:
 
     messages = [msg for event, msg in EVENTS if event == Events.Message]
     await emit_task
+    # events are published and dispatched by background tasks
+    await emitter.flush()
+    for _ in range(10):
+        await asyncio.sleep(0)
     assert received_messages == messages
+
+
+@pytest.mark.asyncio
+async def test_emit_does_not_wait_for_subscribers() -> None:
+    emitter = Emitter()
+    # nobody reads events of the subscriber, so publishing is stuck on the second one
+    dispatcher = emitter.subscribe(Events.Message, lambda **_: None, maxsize=1)
+
+    for event, kwargs in EVENTS:
+        await asyncio.wait_for(emitter.emit(event, **kwargs), timeout=1)
+    await asyncio.sleep(0)
+    assert len(emitter._outbox) == len(EVENTS) - 2
+
+    _, kwargs = await dispatcher.events.__anext__()
+    assert kwargs == dict(id=5, msg="hello")
+
+
+@pytest.mark.asyncio
+async def test_topic_routing() -> None:
+    emitter = Emitter()
+    errors = emitter.subscribe(Events.Error, lambda **_: None)
+    messages = emitter.subscribe(Events.Message, lambda **_: None)
+    strangers = emitter.subscribe(
+        Events.Message, lambda **_: None, topic=("msg", "stranger")
+    )
+
+    for event, kwargs in EVENTS:
+        await emitter.emit(event, **kwargs)
+    await emitter.flush()
+
+    # events are copied only to forks of interested subscriptions
+    assert errors._event_fork.lag == 1
+    assert messages._event_fork.lag == 4
+    assert strangers._event_fork.lag == 2
+
+    _, kwargs = await strangers.events.__anext__()
+    assert kwargs == dict(id=7, msg="stranger")
+
+
+@pytest.mark.asyncio
+async def test_stopped_subscriptions_are_detached() -> None:
+    emitter = Emitter()
+    everything = emitter.subscribe(Events.Message, lambda **_: None)
+    strangers = emitter.subscribe(
+        Events.Message, lambda **_: None, topic=("msg", "stranger")
+    )
+    errors = emitter.filter(Events.Error, topic=("msg", "pipeline is broken"))
+    await emit_all(emitter)
+    assert await errors.__anext__() == EVENTS[-1]
+    assert emitter.is_subscribed(Events.Message)
+    assert emitter.is_subscribed(Events.Error)
+
+    # routes of stopped subscriptions and closed filters are removed
+    await strangers.stop()
+    assert emitter._routes[Events.Message].by_topic == {}
+    await everything.stop()
+    await errors.aclose()
+    assert emitter._routes == {}
+    assert not emitter.is_subscribed(Events.Message)
+    assert not emitter.is_subscribed(Events.Error)
+
+
+async def emit_all(emitter: Emitter) -> None:
+    for event, kwargs in EVENTS:
+        await emitter.emit(event, **kwargs)
+    await emitter.flush()
+
+
+async def wait_for_messages(received: t.List[t.Any], number: int) -> None:
+    for _ in range(100):
+        if len(received) >= number:
+            return
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_sync_handler() -> None:
+    received = []
+    emitter = Emitter()
+    dispatcher = emitter.subscribe(
+        Events.Message, lambda **kwargs: received.append(kwargs)
+    )
+    task = dispatcher.dispatch_forever()
+
+    await emit_all(emitter)
+    await wait_for_messages(received, 4)
+    assert received == [msg for event, msg in EVENTS if event == Events.Message]
+
+    await dispatcher.stop()
+    await task
+
+
+@pytest.mark.asyncio
+async def test_batched_dispatch() -> None:
+    batches = []
+    emitter = Emitter()
+    dispatcher = emitter.subscribe(Events.Message, batches.append)
+    task = dispatcher.dispatch_forever(batch_size=3, max_delay=0.01)
+
+    await emit_all(emitter)
+    await wait_for_messages(batches, 2)
+    # the last batch is delivered after the delay without being full
+    assert [[msg["id"] for msg in batch] for batch in batches] == [[5, 7, 9], [1]]
+
+    await dispatcher.stop()
+    await task
+
+
+@pytest.mark.asyncio
+async def test_concurrent_dispatch() -> None:
+    running = 0
+    most_running = 0
+    received = []
+
+    async def handle(**kwargs: t.Any) -> None:
+        nonlocal running, most_running
+        running += 1
+        most_running = max(most_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        received.append(kwargs)
+
+    emitter = Emitter()
+    dispatcher = emitter.subscribe(Events.Message, handle)
+    task = dispatcher.dispatch_forever(concurrency=2)
+
+    await emit_all(emitter)
+    await wait_for_messages(received, 4)
+    assert len(received) == 4
+    assert most_running == 2
+
+    await dispatcher.stop()
+    await task
@@ -1,3 +1,4 @@
+import asyncio
 import itertools
 import random
 import typing as t
@@ -5,15 +6,27 @@ from collections import defaultdict
 
 import numpy as np
 import pytest
+from exchange.core.auction import Allocation, Clearing
+from exchange.core.commands import (
+    CancelOrder,
+    CreateLimit,
+    CreateMarket,
+)
 from exchange.core.entities import SymbolPair
-from exchange.core.entities.account import Account
+from exchange.core.entities.account import Account, AccountsLock
 from exchange.core.entities.order import Order
+from exchange.core.entities.order_id import SequenceGenerator
 from exchange.core.errors import (
+    AuctionError,
+    InsufficientFunds,
+    OrderCreationError,
     PairAlreadyExisted,
     PairDeletionError,
+    UnsupportedPairs,
     WrongCredentials,
+    WrongOrderID,
 )
-from exchange.core.exchange import Exchange
+from exchange.core.exchange import Exchange, ExchangeEvent
 
 
 PAIRS = [
@@ -565,3 +578,352 @@ async def test_partial_with_close_balance_recalculation(exchange: Exchange):
     await exchange.cancel_order(pair, to_close.order_id)
 
     assert np.isclose(snapshot_ewriji_base - amount * 3, ewriji.balance[pair.Base])
+
+
+@pytest.mark.asyncio
+async def test_exact_balance_after_repeated_partial_fills(exchange: Exchange):
+    pair = SymbolPair("exact", "balance")
+    exchange.create_pair(pair)
+    maker = exchange.create_acc("exact_maker", {pair.Base: 1})
+    taker = exchange.create_acc("exact_taker", {pair.Quote: 1})
+
+    await exchange.create_limit(pair, 0.1, Order.Side.Sell, 0.3, "exact_maker")
+    for _ in range(3):
+        await exchange.create_limit(pair, 0.1, Order.Side.Buy, 0.1, "exact_taker")
+
+    assert len(exchange.get_order_book(pair)) == 0
+    assert maker.balance[pair.Base] == 0.7
+    assert maker.balance[pair.Quote] == 0.02985
+    assert taker.balance[pair.Quote] == 0.97
+    assert taker.balance[pair.Base] == 0.2976
+
+
+@pytest.mark.asyncio
+async def test_order_id_sequence(exchange: Exchange):
+    pair = SymbolPair("sequence", "test")
+    exchange.create_pair(pair)
+    exchange.refill_account("Vladimir", {pair.Quote: 10})
+
+    first = await exchange.create_limit(pair, 1, Order.Side.Buy, 1, "Vladimir")
+    second = await exchange.create_limit(pair, 1, Order.Side.Buy, 1, "Vladimir")
+    assert second.order_id == first.order_id + 1
+
+    generator = SequenceGenerator(shard=3, shard_bits=8)
+    ids = [generator() for _ in range(3)]
+    assert ids == sorted(ids)
+    assert [generator.sequence_of(order_id) for order_id in ids] == [1, 2, 3]
+    assert all(generator.shard_of(order_id) == 3 for order_id in ids)
+    assert ids[-1] < 2 ** 63
+
+
+@pytest.mark.asyncio
+async def test_independent_locks(exchange: Exchange):
+    first_book = exchange.get_order_book(PAIRS[0])
+    second_book = exchange.get_order_book(PAIRS[1])
+    vladimir = exchange.get_account("Vladimir")
+    ewriji = exchange.get_account("Ewriji")
+
+    async with first_book, vladimir:
+        assert not second_book._lock.locked()
+        assert not ewriji.lock.locked()
+
+    async def lock_in_order(accounts: t.List[Account]) -> None:
+        async with AccountsLock(accounts):
+            await asyncio.sleep(0)
+
+    # opposite acquisition orders must not deadlock
+    await asyncio.wait_for(
+        asyncio.gather(
+            lock_in_order([vladimir, ewriji]), lock_in_order([ewriji, vladimir])
+        ),
+        timeout=1,
+    )
+
+
+@pytest.mark.asyncio
+async def test_batch_execution(exchange: Exchange):
+    pair = SymbolPair("batch", "test")
+    exchange.create_pair(pair)
+    maker = exchange.create_acc("batch_maker", {pair.Base: 10, pair.Quote: 10})
+    taker = exchange.create_acc("batch_taker", {pair.Base: 10, pair.Quote: 10})
+    resting = await exchange.create_limit(pair, 3, Order.Side.Sell, 1, "batch_maker")
+
+    results = await exchange.execute_batch(
+        [
+            CreateLimit(pair, 1, Order.Side.Sell, 1, "batch_maker"),
+            CreateLimit(pair, 2, Order.Side.Sell, 1, "batch_maker"),
+            CancelOrder(pair, resting.order_id),
+            CreateLimit(SymbolPair("unknown", "pair"), 1, Order.Side.Buy, 1, "x"),
+            # fills 1 at 1 and then maker at 2 twice
+            CreateLimit(pair, 2, Order.Side.Buy, 1.5, "batch_taker"),
+            CreateMarket(pair, Order.Side.Buy, 0.25, "batch_taker"),
+            # rests and then is filled as a maker inside of the batch
+            CreateLimit(pair, 0.5, Order.Side.Buy, 1, "batch_taker"),
+            CreateLimit(pair, 0.5, Order.Side.Sell, 1, "batch_maker"),
+            CreateLimit(pair, 1, Order.Side.Buy, 1000, "batch_taker"),
+            CancelOrder(pair, -1),
+        ]
+    )
+
+    assert [type(result) for result in results] == [
+        Order,
+        Order,
+        Order,
+        UnsupportedPairs,
+        Order,
+        Order,
+        Order,
+        Order,
+        InsufficientFunds,
+        WrongOrderID,
+    ]
+    assert results[2] is resting
+    assert resting.status == Order.Status.Closed
+    assert results[1].filled == 0.75
+    assert results[6].status == Order.Status.Closed
+    assert exchange.get_order_book(pair).depth(10).Asks == [(2, 0.25)]
+
+    # 1 + 0.5 * 2 + 0.25 * 2 + 0.5
+    assert taker.balance[pair.Quote] == 10 - 3
+    # 1.75 bought as a taker and 1 as a maker
+    assert taker.balance[pair.Base] == 12.731
+    # 2.5 sold as a maker and 0.5 as a taker
+    assert maker.balance[pair.Quote] == 12.9835
+    assert maker.balance[pair.Base] == 10 - 3
+
+
+@pytest.mark.asyncio
+async def test_mass_cancel(exchange: Exchange):
+    first, second = SymbolPair("mass", "usdt"), SymbolPair("cancel", "usdt")
+    exchange.create_pair(first)
+    exchange.create_pair(second)
+    trader = exchange.create_acc("mass_trader", {"mass": 10, "cancel": 10, "usdt": 10})
+    other = exchange.create_acc("mass_other", {"mass": 10, "usdt": 10})
+
+    # fork of the event stream has to exist before the event is emitted
+    dispatcher = exchange.subscribe(ExchangeEvent.OrdersCancelled, lambda **_: None)
+    for pair in (first, second):
+        await exchange.create_limit(pair, 1, Order.Side.Buy, 2, "mass_trader")
+        await exchange.create_limit(pair, 2, Order.Side.Sell, 3, "mass_trader")
+    others = await exchange.create_limit(first, 3, Order.Side.Sell, 1, "mass_other")
+
+    cancelled = await exchange.mass_cancel("mass_trader", first)
+    assert len(cancelled) == 2
+    assert all(order.status == Order.Status.Closed for order in cancelled)
+    # orders of the second pair are still open
+    assert dict(trader.balance) == {"mass": 10, "cancel": 10 - 3, "usdt": 10 - 2}
+
+    _, payload = await asyncio.wait_for(dispatcher.events.__anext__(), timeout=1)
+    assert payload["order_ids"] == [order.order_id for order in cancelled]
+
+    cancelled = await exchange.mass_cancel("mass_trader")
+    assert len(cancelled) == 2
+    assert dict(trader.balance) == {"mass": 10, "cancel": 10, "usdt": 10}
+    assert trader.open_orders == {}
+
+    # pair halt cancels orders of every account
+    cancelled = await exchange.mass_cancel(pair=first)
+    assert cancelled == [others]
+    assert other.balance["mass"] == 10
+    assert len(exchange.get_order_book(first)) == 0
+    assert await exchange.mass_cancel(pair=first) == []
+
+
+@pytest.mark.asyncio
+async def test_market_buy_cost_after_maker_is_filled(exchange: Exchange):
+    pair = SymbolPair("sweep", "usdt")
+    exchange.create_pair(pair)
+    exchange.create_acc("sweep_maker", {"sweep": 7})
+    exchange.create_acc("sweep_taker", {"usdt": 2})
+    buyer = exchange.create_acc("sweep_buyer", {"usdt": 4})
+
+    for price, amount in ((2, 1), (2, 1), (3, 5)):
+        await exchange.create_limit(pair, price, Order.Side.Sell, amount, "sweep_maker")
+    await exchange.create_limit(pair, 2, Order.Side.Buy, 1, "sweep_taker")
+
+    # 1 at 2 and 1 at 3 costs 5
+    with pytest.raises(InsufficientFunds):
+        await exchange.create_market(pair, Order.Side.Buy, 2, "sweep_buyer")
+    assert buyer.balance["usdt"] == 4
+
+    exchange.refill_account("sweep_buyer", {"usdt": 1})
+    order = await exchange.create_market(pair, Order.Side.Buy, 2, "sweep_buyer")
+    assert order.filled == 2
+    assert buyer.balance["usdt"] == 0
+
+
+@pytest.mark.asyncio
+async def test_call_auction(exchange: Exchange):
+    pair = SymbolPair("auct", "usdt")
+    exchange.create_pair(pair)
+    buyer = exchange.create_acc("auction_buyer", {"usdt": 1000})
+    seller = exchange.create_acc("auction_seller", {"auct": 100})
+
+    # resting orders take part in the auction
+    resting = await exchange.create_limit(
+        pair, 10, Order.Side.Sell, 2, "auction_seller"
+    )
+    await exchange.start_auction(pair, Allocation.Time)
+    assert exchange.is_in_auction(pair)
+    with pytest.raises(AuctionError):
+        await exchange.start_auction(pair)
+
+    taker = await exchange.create_limit(pair, 12, Order.Side.Buy, 3, "auction_buyer")
+    low = await exchange.create_limit(pair, 9, Order.Side.Buy, 1, "auction_buyer")
+    marginal = await exchange.create_limit(
+        pair, 11, Order.Side.Sell, 2, "auction_seller"
+    )
+    assert taker.status == Order.Status.Opened
+    assert len(exchange.get_order_book(pair)) == 0
+    with pytest.raises(OrderCreationError):
+        await exchange.create_market(pair, Order.Side.Buy, 1, "auction_buyer")
+
+    clearing = await exchange.uncross_auction(pair)
+    assert clearing == Clearing(11 * 10 ** 6, 3 * 10 ** 8)
+    assert taker.status == resting.status == Order.Status.Closed
+    assert marginal.filled == 1
+    # the buyer pays the clearing price, not its limit price
+    assert buyer.balance["usdt"] == 1000 - 3 * 11 - 9
+    assert buyer.balance["auct"] == 3 * (1 - buyer.maker_fee)
+    assert seller.balance["usdt"] == 3 * 11 * (1 - seller.maker_fee)
+
+    await exchange.cancel_order(pair, low.order_id)
+    assert buyer.balance["usdt"] == 1000 - 3 * 11
+
+    assert await exchange.stop_auction(pair) == Clearing(None, 0)
+    assert not exchange.is_in_auction(pair)
+    assert (await exchange.depth(pair, 10)).Asks == [(11, 1)]
+
+    # periodic auction
+    await exchange.start_auction(pair, interval=0.01)
+    order = await exchange.create_limit(pair, 11, Order.Side.Buy, 1, "auction_buyer")
+    for _ in range(100):
+        if order.status == Order.Status.Closed:
+            break
+        await asyncio.sleep(0.01)
+    assert order.status == marginal.status == Order.Status.Closed
+    await exchange.stop_auction(pair)
+    with pytest.raises(AuctionError):
+        await exchange.uncross_auction(pair)
+
+
+@pytest.mark.asyncio
+async def test_failed_periodic_uncross(exchange: Exchange, monkeypatch, caplog):
+    pair = SymbolPair("failed", "usdt")
+    exchange.create_pair(pair)
+    exchange.create_acc("failed_seller", {"failed": 10})
+    order = await exchange.create_limit(pair, 1, Order.Side.Sell, 1, "failed_seller")
+
+    async def uncross_auction(pair: SymbolPair) -> Clearing:
+        raise RuntimeError("uncross failed")
+
+    monkeypatch.setattr(exchange, "uncross_auction", uncross_auction)
+    await exchange.start_auction(pair, interval=0.01)
+    for _ in range(100):
+        if not exchange.is_in_auction(pair):
+            break
+        await asyncio.sleep(0.01)
+
+    # failures are logged and the auction is stopped after a few of them
+    assert not exchange.is_in_auction(pair)
+    assert "uncross failed" in caplog.text
+    assert (await exchange.depth(pair, 10)).Asks == [(1, 1)]
+    assert order.status == Order.Status.Opened
+
+
+@pytest.mark.asyncio
+async def test_book_delta(exchange: Exchange):
+    pair = SymbolPair("delta", "usdt")
+    exchange.create_pair(pair)
+    exchange.create_acc("delta_maker", {"delta": 10})
+    exchange.create_acc("delta_taker", {"usdt": 100})
+    makers = [
+        await exchange.create_limit(pair, price, Order.Side.Sell, amount, "delta_maker")
+        for price, amount in ((1, 1), (2, 1), (3, 2))
+    ]
+
+    # events of makers are published before the subscription
+    await exchange.flush()
+    dispatcher = exchange.subscribe(ExchangeEvent.BookDelta, lambda **_: None)
+    taker = await exchange.create_limit(pair, 3, Order.Side.Buy, 3, "delta_taker")
+
+    # a single event with all levels swept by the taker
+    _, payload = await asyncio.wait_for(dispatcher.events.__anext__(), timeout=1)
+    assert payload["symbol_pair"] == pair
+    assert payload["version"] == exchange.get_order_book(pair).version
+    assert payload["bids"] == [(3, 0)]
+    assert payload["asks"] == [(1, 0), (2, 0), (3, 1)]
+    assert sorted(payload["closed_ids"]) == sorted(
+        [makers[0].order_id, makers[1].order_id, taker.order_id]
+    )
+
+
+@pytest.mark.asyncio
+async def test_trades_and_cancelled_levels(exchange: Exchange):
+    pair = SymbolPair("tape", "usdt")
+    exchange.create_pair(pair)
+    exchange.create_acc("tape_maker", {"tape": 10})
+    exchange.create_acc("tape_taker", {"usdt": 100})
+    maker = await exchange.create_limit(pair, 2, Order.Side.Sell, 3, "tape_maker")
+    await exchange.create_limit(pair, 1, Order.Side.Sell, 1, "tape_maker")
+
+    await exchange.flush()
+    trades = exchange.subscribe(ExchangeEvent.Trades, lambda **_: None)
+    deltas = exchange.subscribe(ExchangeEvent.BookDelta, lambda **_: None)
+    await exchange.create_market(pair, Order.Side.Buy, 2, "tape_taker")
+
+    # trades are printed at prices of makers with the side of the taker
+    _, payload = await asyncio.wait_for(trades.events.__anext__(), timeout=1)
+    assert payload["symbol_pair"] == pair
+    assert payload["trades"] == [(1, 1, "buy"), (2, 1, "buy")]
+    await deltas.events.__anext__()
+
+    # a cancel removes the amount of the order from its level
+    await exchange.cancel_order(pair, maker.order_id)
+    _, payload = await asyncio.wait_for(deltas.events.__anext__(), timeout=1)
+    assert payload["version"] == exchange.get_order_book(pair).version
+    assert (payload["bids"], payload["asks"], payload["closed_ids"]) == (
+        [],
+        [(2, 0)],
+        [],
+    )
+
+
+@pytest.mark.asyncio
+async def test_account_updates(exchange: Exchange):
+    pair = SymbolPair("private", "usdt")
+    exchange.create_pair(pair)
+    exchange.create_acc("private_maker", {"private": 10})
+    exchange.create_acc("private_taker", {"usdt": 10})
+
+    await exchange.flush()
+    dispatcher = exchange.subscribe(
+        ExchangeEvent.AccountUpdate,
+        lambda **_: None,
+        topic=("account_name", "private_maker"),
+    )
+    updates = dispatcher.events.__aiter__()
+    first = await exchange.create_limit(pair, 2, Order.Side.Sell, 3, "private_maker")
+    second = await exchange.create_limit(pair, 3, Order.Side.Sell, 1, "private_maker")
+    await exchange.create_market(pair, Order.Side.Buy, 1, "private_taker")
+    await exchange.cancel_order(pair, second.order_id)
+
+    # updates of the taker are not routed to the maker
+    payloads = [
+        (await asyncio.wait_for(updates.__anext__(), timeout=1))[1] for _ in range(4)
+    ]
+    assert {payload["account_name"] for payload in payloads} == {"private_maker"}
+    assert [
+        [(order["event"], order["order_id"]) for order in payload["orders"]]
+        for payload in payloads
+    ] == [
+        [("created", first.order_id)],
+        [("created", second.order_id)],
+        [("filled", first.order_id)],
+        [("cancelled", second.order_id)],
+    ]
+    assert payloads[1]["balances"] == {"private": 6}
+    assert payloads[2]["orders"][0]["filled"] == 1
+    # the maker fee is charged from the received quote
+    assert payloads[2]["balances"] == {"private": 6, "usdt": 1.99}
+    assert payloads[3]["balances"] == {"private": 7}
@@ -2,7 +2,7 @@ import asyncio
 import typing as t
 
 import pytest
-from exchange.libs.flow import InMemoryFlow
+from exchange.libs.flow import InMemoryFlow, OverflowPolicy
 
 
 async def produce_numbers(number: int, stream: InMemoryFlow[int]) -> None:
@@ -55,3 +55,45 @@ async def test_multiple_consumer() -> None:
 
     assert list(range(number)) == await first_consumer
     assert list(range(number)) == await second_consumer
+
+
+@pytest.mark.parametrize(
+    "policy, received",
+    [
+        (OverflowPolicy.DropOldest, [3, 4]),
+        (OverflowPolicy.DropNewest, [0, 1]),
+        (OverflowPolicy.Conflate, [4, 3]),
+    ],
+)
+@pytest.mark.asyncio
+async def test_overflow_policy(policy: OverflowPolicy, received: t.List[int]) -> None:
+    flow = InMemoryFlow[int]()
+    # conflated items with the same parity replace each other
+    fork = flow.fork(2, policy, key=lambda number: number % 2)
+    for i in range(5):
+        await flow.send(i)
+
+    assert fork.lag == 2
+    assert fork.dropped == 3
+    assert [await fork.__anext__() for _ in range(2)] == received
+    assert fork.lag == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_policies() -> None:
+    flow = InMemoryFlow[int](maxsize=1)
+    disconnected = flow.fork(policy=OverflowPolicy.Disconnect)
+    blocking = flow.fork()
+
+    await flow.send(0)
+    sender = asyncio.create_task(flow.send(1))
+    await asyncio.sleep(0)
+    # the flow waits for the blocking fork, the other one is disconnected
+    assert not sender.done()
+    assert disconnected.is_stopped()
+    assert disconnected.dropped == 1
+
+    assert await blocking.__anext__() == 0
+    await sender
+    assert await blocking.__anext__() == 1
+    assert flow.forks_number() == 1
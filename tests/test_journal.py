@@ -0,0 +1,127 @@
+import asyncio
+import os
+
+import pytest
+from exchange.core.auction import Allocation
+from exchange.core.commands import CancelOrder, CreateLimit
+from exchange.core.entities import SymbolPair
+from exchange.core.entities.order import Order
+from exchange.core.exchange import Exchange
+from exchange.core.journal import Journal, Kind, read_journal
+
+
+PAIR = SymbolPair("btc", "usdt")
+
+RECORDS = [
+    (Kind.CreateAccount, ("Vladimir", {"btc": 1.5, "usdt": 100.0})),
+    (Kind.CreatePair, (PAIR,)),
+    (Kind.CreateLimit, (PAIR, 2.5, Order.Side.Sell, 0.1, "Vladimir")),
+    (Kind.CreateMarket, (PAIR, Order.Side.Buy, 0.2, "Vladimir")),
+    (Kind.CancelOrder, (PAIR, 2 ** 62)),
+    (Kind.MassCancel, (None, PAIR)),
+    (Kind.MassCancel, ("Vladimir", None)),
+    (
+        Kind.Batch,
+        (
+            [
+                CreateLimit(PAIR, 3, Order.Side.Buy, 1, "Vladimir"),
+                CancelOrder(PAIR, 7),
+            ],
+        ),
+    ),
+    (Kind.StartAuction, (PAIR, Allocation.ProRata, 0.5)),
+    (Kind.StopAuction, (PAIR,)),
+]
+
+
+@pytest.mark.asyncio
+async def test_records(tmp_path):
+    path = str(tmp_path / "journal")
+    journal = Journal(path)
+    for kind, fields in RECORDS:
+        journal.append(kind, fields)
+    await journal.stop()
+
+    records = list(read_journal(path))
+    assert [record.sequence for record in records] == list(range(1, 11))
+    assert [(record.kind, record.fields) for record in records] == RECORDS
+
+    # a torn frame of a crash is cut, new records follow the last complete one
+    size = os.path.getsize(path)
+    with open(path, "ab") as file:
+        file.write(b"\x20\x00\x00\x00\x01")
+    journal = Journal(path)
+    await journal.stop()
+    with open(path, "ab") as file:
+        file.write(bytes(64))
+    journal = Journal(path)
+    assert journal.sequence == 10
+    assert os.path.getsize(path) == size
+    journal.append(Kind.DeletePair, (PAIR,))
+    await journal.stop()
+    assert [record.sequence for record in read_journal(path)][-2:] == [10, 11]
+
+
+@pytest.mark.asyncio
+async def test_group_commit(tmp_path):
+    journal = Journal(str(tmp_path / "journal"), commit_interval_us=1000)
+    writes = []
+    write = journal._write_sync
+    journal._write_sync = lambda data: (writes.append(data), write(data))
+    journal.start()
+
+    sequences = [journal.append(Kind.CancelOrder, (PAIR, i)) for i in range(10)]
+    assert journal.committed == 0
+    await asyncio.gather(*(journal.commit(sequence) for sequence in sequences))
+    # concurrent commands share a single write and fsync
+    assert journal.committed == 10
+    assert len(writes) == 1
+
+    await journal.commit(5)
+    await journal.stop()
+    assert len(writes) == 1
+
+
+def state(exchange: Exchange):
+    return (
+        {
+            account.name: (dict(account.balance.units), sorted(account.open_orders))
+            for account in exchange.accounts
+        },
+        exchange.get_order_book(PAIR).depth(10),
+    )
+
+
+@pytest.mark.asyncio
+async def test_recovery(tmp_path):
+    path = str(tmp_path / "journal")
+    exchange = Exchange()
+    exchange.journal = journal = Journal(path, commit_interval_us=100)
+    journal.start()
+
+    exchange.create_pair(PAIR)
+    exchange.create_acc("Vladimir", dict(btc=10, usdt=100))
+    exchange.create_acc("Ewriji", dict(btc=10, usdt=100))
+    sell = await exchange.create_limit(PAIR, 2, Order.Side.Sell, 3, "Vladimir")
+    await exchange.create_market(PAIR, Order.Side.Buy, 1, "Ewriji")
+    buy = await exchange.create_limit(PAIR, 1, Order.Side.Buy, 2, "Ewriji")
+    await exchange.cancel_order(PAIR, buy.order_id)
+    await exchange.execute_batch(
+        [
+            CreateLimit(PAIR, 3, Order.Side.Sell, 1, "Vladimir"),
+            CancelOrder(PAIR, sell.order_id),
+            CreateLimit(PAIR, 1.5, Order.Side.Buy, 1, "Ewriji"),
+        ]
+    )
+    # failed commands are journaled and fail again on recovery
+    with pytest.raises(Exception):
+        await exchange.create_limit(PAIR, 2, Order.Side.Sell, 10 ** 6, "Vladimir")
+    expected = state(exchange)
+
+    exchange.journal = None
+    await journal.stop()
+
+    recovered = Exchange()
+    assert recovered.accounts == []
+    await recovered.recover(read_journal(path))
+    assert state(recovered) == expected
@@ -0,0 +1,75 @@
+import asyncio
+import datetime
+from collections import defaultdict
+
+import pytest
+from exchange.core.entities import SymbolPair
+from exchange.core.entities.account import Account
+from exchange.core.entities.order import Order
+
+
+PAIR = SymbolPair("btc", "usdt")
+ACCOUNT = Account(name="Vladimir", balance=defaultdict(float), open_orders={})
+
+
+def limit(price: float = 2.5, amount: float = 1.5) -> Order:
+    return Order(amount, Order.Side.Buy, PAIR, ACCOUNT, Order.Type.Limit, price, 7)
+
+
+def test_compact_record():
+    # created without a running event loop and without a matching future
+    order = limit()
+    assert not hasattr(order, "__dict__")
+    assert order._is_in_matching is None
+    with pytest.raises(AttributeError):
+        order.comment = "no room for it"
+
+    assert (order.amount_lots, order.price_ticks) == (150000000, 2500000)
+    assert (order.amount, order.price, order.filled) == (1.5, 2.5, 0)
+    assert order.left_lots == order.amount_lots
+
+
+def test_creation_time():
+    before = datetime.datetime.now()
+    orders = [limit() for _ in range(100)]
+    after = datetime.datetime.now()
+
+    created = [order.created_ns for order in orders]
+    assert created == sorted(created)
+    for order in orders:
+        tolerance = datetime.timedelta(milliseconds=5)
+        assert before - tolerance <= order.creation_datetime <= after + tolerance
+
+
+def test_to_json():
+    order = limit()
+    order.filled_lots = 50000000
+    assert order.to_json() == {
+        "order_id": 7,
+        "symbol_pair": "btc/usdt",
+        "status": "opened",
+        "amount": 1.5,
+        "filled": 0.5,
+        "price": 2.5,
+        "side": "buy",
+        "type": "limit",
+        "creation_datetime": str(order.creation_datetime),
+    }
+
+
+@pytest.mark.asyncio
+async def test_lazy_matching_future():
+    order = limit()
+    # an order out of matching doesn't create a future to wait for
+    await order.is_matched()
+    assert order._is_in_matching is None
+
+    order.mark_matching()
+    waiter = asyncio.create_task(order.is_matched())
+    await asyncio.sleep(0)
+    assert order._is_in_matching is not None
+    assert not waiter.done()
+
+    order.finish_matching()
+    order.mark_opened()
+    await asyncio.wait_for(waiter, 1)
@@ -0,0 +1,181 @@
+import typing as t
+from collections import defaultdict
+
+import pytest
+from exchange.core.entities import SymbolPair
+from exchange.core.entities.account import Account
+from exchange.core.entities.fixed_point import (
+    from_lots,
+    from_units,
+    to_lots,
+    to_units,
+)
+from exchange.core.entities.order import Order
+from exchange.core.entities.order_book import OrderBook
+from exchange.core.match_model import MatchModel
+
+
+PAIR = SymbolPair("btc", "usdt")
+
+
+@pytest.fixture
+def account():
+    return Account(name="Vladimir", balance=defaultdict(float), open_orders={})
+
+
+def limit(account: Account, side: Order.Side, price: float, amount: float) -> Order:
+    return Order(amount, side, PAIR, account, Order.Type.Limit, price)
+
+
+@pytest.mark.asyncio
+async def test_price_time_priority(account: Account):
+    order_book = OrderBook()
+    first = limit(account, Order.Side.Sell, 2, 1)
+    second = limit(account, Order.Side.Sell, 2, 3)
+    best = limit(account, Order.Side.Sell, 1, 5)
+    worst = limit(account, Order.Side.Sell, 3, 1)
+
+    for order in (first, second, best, worst):
+        order_book.add(order)
+
+    assert list(order_book.Asks) == [best, first, second, worst]
+    assert order_book.Asks[0] is best
+    assert order_book.Asks[1:3] == [first, second]
+    assert order_book.get_first(Order.Side.Sell) is best
+
+    bids = [limit(account, Order.Side.Buy, price, 1) for price in (0.3, 0.5, 0.1)]
+    for order in bids:
+        order_book.add(order)
+
+    assert [order.price for order in order_book.Bids] == [0.5, 0.3, 0.1]
+    assert len(order_book) == 7
+
+
+@pytest.mark.asyncio
+async def test_aggregated_level_amount(account: Account):
+    order_book = OrderBook()
+    first = limit(account, Order.Side.Buy, 2, 1)
+    second = limit(account, Order.Side.Buy, 2, 3)
+    order_book.add(first)
+    order_book.add(second)
+
+    assert order_book.get_amount(2) == 4
+
+    first.filled_lots = to_lots(0.5)
+    order_book.fill(first, to_lots(0.5))
+    assert order_book.get_amount(2) == 3.5
+
+    order_book.delete(second)
+    assert order_book.get_amount(2) == 0.5
+    assert second not in order_book
+
+    order_book.pop_first(Order.Side.Buy)
+    assert order_book.get_amount(2) == 0
+    assert len(order_book.Bids) == 0
+
+    with pytest.raises(IndexError):
+        order_book.get_first(Order.Side.Buy)
+
+
+@pytest.mark.asyncio
+async def test_cancel_by_order_id(account: Account):
+    order_book = OrderBook()
+    orders = [limit(account, Order.Side.Sell, 1, amount) for amount in (1, 2, 3)]
+    for order in orders:
+        order_book.add(order)
+
+    assert orders[1].order_id in order_book
+    assert order_book.cancel(orders[1].order_id) is orders[1]
+    assert orders[1].order_id not in order_book
+    assert orders[1] not in order_book
+    assert order_book.cancel(orders[1].order_id) is None
+
+    assert list(order_book.Asks) == [orders[0], orders[2]]
+    assert order_book.get_amount(1) == 4
+
+    order_book.pop_first(Order.Side.Sell)
+    assert orders[0].order_id not in order_book
+    assert order_book.get_first(Order.Side.Sell) is orders[2]
+
+
+@pytest.mark.asyncio
+async def test_depth_snapshot(account: Account):
+    order_book = OrderBook()
+    for price, amount in ((1, 1), (1, 2), (2, 1), (3, 4)):
+        order_book.add(limit(account, Order.Side.Sell, price, amount))
+    order_book.add(limit(account, Order.Side.Buy, 0.5, 3))
+
+    depth = order_book.depth(2)
+    assert depth.Asks == [(1, 3), (2, 1)]
+    assert depth.Bids == [(0.5, 3)]
+    assert order_book.depth(2) is depth
+
+    order_book.pop_first(Order.Side.Sell)
+    new_depth = order_book.depth(2)
+    assert new_depth is not depth
+    assert new_depth.Asks == [(1, 2), (2, 1)]
+
+
+@pytest.mark.asyncio
+async def test_sweep_estimation(account: Account):
+    order_book = OrderBook()
+    for price, amount in ((1, 1), (2, 2), (2, 1), (4, 1)):
+        order_book.add(limit(account, Order.Side.Sell, price, amount))
+
+    def sweep_base(amount: float) -> t.Tuple[float, float]:
+        base, quote = order_book.Asks.sweep_base(to_lots(amount))
+        return from_lots(base), from_units(quote)
+
+    def sweep_quote(funds: float) -> t.Tuple[float, float]:
+        base, quote = order_book.Asks.sweep_quote(to_units(funds))
+        return from_lots(base), from_units(quote)
+
+    assert sweep_base(0.5) == (0.5, 0.5)
+    assert sweep_base(2.5) == (2.5, 4)
+    assert sweep_base(4) == (4, 7)
+    assert sweep_base(10) == (5, 11)
+
+    assert sweep_quote(4) == (2.5, 4)
+    assert sweep_quote(9) == (4.5, 9)
+    assert sweep_quote(100) == (5, 11)
+
+    # prefix sums follow fills and cancels
+    best = order_book.get_first(Order.Side.Sell)
+    best.filled_lots = to_lots(0.5)
+    order_book.fill(best, to_lots(0.5))
+    assert sweep_base(2.5) == (2.5, 4.5)
+
+    order_book.pop_first(Order.Side.Sell)
+    order_book.add(limit(account, Order.Side.Sell, 3, 1))
+    assert sweep_base(4) == (4, 9)
+
+
+@pytest.mark.asyncio
+async def test_level_amount_after_maker_is_filled(account: Account):
+    order_book = OrderBook()
+    for _ in range(2):
+        order_book.add(limit(account, Order.Side.Sell, 2, 1))
+
+    MatchModel.limit_match_sync(limit(account, Order.Side.Buy, 2, 1), order_book)
+    assert order_book.get_amount(2) == 1
+    assert order_book.depth(10).Asks == [(2, 1)]
+
+    MatchModel.limit_match_sync(limit(account, Order.Side.Buy, 2, 0.25), order_book)
+    assert order_book.get_amount(2) == 0.75
+
+    MatchModel.limit_match_sync(limit(account, Order.Side.Buy, 2, 0.75), order_book)
+    assert order_book.get_amount(2) == 0
+    assert order_book.depth(10).Asks == []
+
+
+@pytest.mark.asyncio
+async def test_sweep_after_maker_is_filled(account: Account):
+    order_book = OrderBook()
+    for price, amount in ((2, 1), (2, 1), (3, 5)):
+        order_book.add(limit(account, Order.Side.Sell, price, amount))
+    assert order_book.Asks.sweep_base(to_lots(2)).quote == to_units(4)
+
+    # head maker of the best level is filled completely
+    MatchModel.limit_match_sync(limit(account, Order.Side.Buy, 2, 1), order_book)
+    assert order_book.Asks.sweep_base(to_lots(2)) == (to_lots(2), to_units(5))
+    assert order_book.Asks.sweep_quote(to_units(5)) == (to_lots(2), to_units(5))
@@ -0,0 +1,64 @@
+import asyncio
+import typing as t
+
+import pytest
+from exchange.libs.flow import RingFlow
+
+
+async def read_numbers(stream: t.AsyncIterator[int]) -> t.List[int]:
+    return [num async for num in stream]
+
+
+@pytest.mark.asyncio
+async def test_multiple_consumers() -> None:
+    flow = RingFlow[int](capacity=4)
+    consumers = [asyncio.create_task(read_numbers(flow.fork())) for _ in range(100)]
+    assert flow.forks_number() == 100
+
+    for i in range(10):
+        await flow.send(i)
+        await asyncio.sleep(0)
+    await flow.close()
+
+    for consumer in consumers:
+        assert await consumer == list(range(10))
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_loses_overwritten_items() -> None:
+    flow = RingFlow[int](capacity=4)
+    fork = flow.fork()
+    for i in range(10):
+        await flow.send(i)
+
+    assert fork.lag == 4
+    assert flow.lags() == [4]
+    assert await fork.__anext__() == 6
+    assert fork.lost == 6
+    assert fork.lag == 3
+
+    # remaining items are read after the flow is closed
+    await flow.close()
+    assert await read_numbers(fork) == [7, 8, 9]
+
+
+@pytest.mark.asyncio
+async def test_stop_fork() -> None:
+    flow = RingFlow[int]()
+    fork = flow.fork()
+    consumer = asyncio.create_task(read_numbers(fork))
+    await flow.send(1)
+    await asyncio.sleep(0)
+
+    await fork.stop()
+    assert await consumer == [1]
+    assert fork.is_stopped()
+    assert flow.forks_number() == 0
+
+    # cancelled reader doesn't break the others waiting for the same item
+    first = asyncio.create_task(flow.fork().__anext__())
+    second = asyncio.create_task(flow.fork().__anext__())
+    await asyncio.sleep(0)
+    first.cancel()
+    await flow.send(2)
+    assert await second == 2
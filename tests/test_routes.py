@@ -8,6 +8,7 @@ from aiohttp.test_utils import (
     unittest_run_loop,
 )
 from exchange.core.entities import SymbolPair
+from exchange.core.entities.order import Order
 from exchange.core.exchange import Exchange
 from exchange.server.app import application_factory
 
@@ -53,6 +54,81 @@ class APITestCase(AioHTTPTestCase):
                 == 0
             )
 
+    @unittest_run_loop
+    async def test_order_batch(self):
+        async with aiohttp.ClientSession() as session:
+            response = await session.post(
+                f"{self.server_address}/order/batch",
+                json={
+                    "account_name": "Ewriji",
+                    "commands": [
+                        {
+                            "type": "limit",
+                            "amount": 1,
+                            "price": 50,
+                            "side": "sell",
+                            "symbol_pair": "eth_usdt",
+                        },
+                        {
+                            "type": "limit",
+                            "amount": 1,
+                            "price": 40,
+                            "side": "sell",
+                            "symbol_pair": "eth_usdt",
+                        },
+                        {"type": "limit", "side": "up", "symbol_pair": "eth_usdt"},
+                        {
+                            "action": "cancel",
+                            "order_id": 10 ** 9,
+                            "symbol_pair": "eth_usdt",
+                        },
+                    ],
+                },
+            )
+            assert response.status == 200
+            data = await response.json()
+            assert data["success"] is True
+            results = data["result"]["results"]
+            assert [result["success"] for result in results] == [
+                True,
+                True,
+                False,
+                False,
+            ]
+            assert results[1]["result"]["price"] == 40
+            assert results[2]["error_code"] == 415
+            assert results[3]["error_code"] == 456
+
+            response = await session.post(
+                f"{self.server_address}/order/batch",
+                json={
+                    "account_name": "Ewriji",
+                    "commands": [
+                        {
+                            "action": "cancel",
+                            "order_id": result["result"]["order_id"],
+                            "symbol_pair": "eth_usdt",
+                        }
+                        for result in results[:2]
+                    ],
+                },
+            )
+            data = await response.json()
+            assert all(result["success"] for result in data["result"]["results"])
+            order_book = self.model_manager.get_order_book(SymbolPair("eth", "usdt"))
+            assert len(order_book) == 0
+
+            # sizes of batches and order ids are bounded
+            cancel = {"action": "cancel", "order_id": 1, "symbol_pair": "eth_usdt"}
+            for commands in ([cancel] * 1001, [{**cancel, "order_id": 2 ** 63}]):
+                response = await session.post(
+                    f"{self.server_address}/order/batch",
+                    json={"account_name": "Ewriji", "commands": commands},
+                )
+                data = await response.json()
+                assert data["success"] is False
+                assert data["error_code"] == 488
+
     @unittest_run_loop
     async def test_get_order_info(self):
         async with aiohttp.ClientSession() as session:
@@ -117,6 +193,19 @@ class APITestCase(AioHTTPTestCase):
             )
             assert data["success"] is True
 
+            for limit in (0, 1001):
+                response = await session.get(
+                    f"{self.server_address}/depth",
+                    json={
+                        "account_name": "Vladimir",
+                        "symbol_pair": "btc_usdt",
+                        "limit": limit,
+                    },
+                )
+                data = await response.json()
+                assert data["success"] is False
+                assert data["error_code"] == 488
+
     @unittest_run_loop
     async def test_get_account_balance(self):
         async with aiohttp.ClientSession() as session:
@@ -238,3 +327,159 @@ class APITestCase(AioHTTPTestCase):
             assert data["success"] is False
             assert data["message"] == "DDoS protection error. Too Many Requests"
             await asyncio.sleep(1)
+
+    @unittest_run_loop
+    async def test_market_stream(self):
+        pair = SymbolPair("btc", "eth")
+        async with aiohttp.ClientSession() as session:
+            ws = await session.ws_connect(f"{self.server_address}/ws/market")
+            await ws.send_json({"action": "subscribe", "symbol_pair": "btc_bpm"})
+            data = await ws.receive_json(timeout=1)
+            assert data["success"] is False
+            assert data["error_code"] == 455
+
+            await ws.send_json(
+                {"action": "subscribe", "symbol_pair": "btc_eth", "limit": 5}
+            )
+            snapshot = await ws.receive_json(timeout=1)
+            assert snapshot["channel"] == "depth"
+            assert snapshot["snapshot"] is True
+            assert snapshot["symbol_pair"] == "btc/eth"
+
+            await self.model_manager.create_limit(
+                pair, 3, Order.Side.Sell, 1, "Vladimir"
+            )
+            diff = await ws.receive_json(timeout=1)
+            assert diff["snapshot"] is False
+            assert diff["version"] > snapshot["version"]
+            assert [3, 1] in diff["asks"]
+
+            await self.model_manager.create_market(pair, Order.Side.Buy, 1, "Ewriji")
+            messages = [await ws.receive_json(timeout=1) for _ in range(2)]
+            trades = next(data for data in messages if data["channel"] == "trades")
+            assert trades["trades"][0][2] == "buy"
+
+            await ws.send_json({"action": "unsubscribe", "symbol_pair": "btc_eth"})
+            await ws.close()
+
+    @unittest_run_loop
+    async def test_account_stream(self):
+        pair = SymbolPair("eth", "usdt")
+        async with aiohttp.ClientSession() as session:
+            ws = await session.ws_connect(f"{self.server_address}/ws/account")
+            await ws.send_json({"action": "subscribe", "account_name": "Nobody"})
+            data = await ws.receive_json(timeout=1)
+            assert data["success"] is False
+            assert data["error_code"] == 401
+
+            await ws.send_json({"action": "subscribe", "account_name": "Ewriji"})
+            snapshot = await ws.receive_json(timeout=1)
+            assert snapshot["channel"] == "account"
+            assert snapshot["snapshot"] is True
+            assert snapshot["balances"] == dict(
+                self.model_manager.get_account("Ewriji").balance
+            )
+
+            # updates of other accounts are not sent
+            await self.model_manager.create_limit(
+                pair, 1, Order.Side.Buy, 1, "Vladimir"
+            )
+            order = await self.model_manager.create_limit(
+                pair, 1, Order.Side.Buy, 1, "Ewriji"
+            )
+            update = await ws.receive_json(timeout=1)
+            assert update["snapshot"] is False
+            assert update["orders"][0]["event"] == "created"
+            assert update["orders"][0]["order_id"] == order.order_id
+
+            await ws.send_json({"action": "unsubscribe", "account_name": "Ewriji"})
+            await ws.close()
+            await self.model_manager.mass_cancel(pair=pair)
+
+    @unittest_run_loop
+    async def test_get_klines(self):
+        pair = SymbolPair("btc", "eth")
+        await self.model_manager.create_limit(pair, 2, Order.Side.Sell, 1, "Vladimir")
+        await self.model_manager.create_market(pair, Order.Side.Buy, 1, "Ewriji")
+
+        async with aiohttp.ClientSession() as session:
+            response = await session.get(
+                f"{self.server_address}/klines",
+                json={"symbol_pair": "btc_eth", "interval": "1h", "limit": 1},
+            )
+            data = await response.json()
+            assert data["success"] is True
+            assert data["result"]["interval"] == "1h"
+            [bar] = data["result"]["klines"]
+            assert bar[4] == 2
+            assert bar[5] >= 1
+
+            response = await session.get(
+                f"{self.server_address}/klines",
+                json={"symbol_pair": "btc_eth", "interval": "2h"},
+            )
+            data = await response.json()
+            assert data["error_code"] == 415
+
+    @unittest_run_loop
+    async def test_get_trades(self):
+        pair = SymbolPair("btc", "eth")
+        await self.model_manager.create_limit(pair, 2, Order.Side.Sell, 1, "Vladimir")
+        await self.model_manager.create_limit(pair, 2, Order.Side.Sell, 1, "Vladimir")
+        await self.model_manager.create_market(pair, Order.Side.Buy, 2, "Ewriji")
+
+        async with aiohttp.ClientSession() as session:
+            response = await session.get(
+                f"{self.server_address}/trades",
+                json={"symbol_pair": "btc_eth", "limit": 2},
+            )
+            data = await response.json()
+            assert data["success"] is True
+            first, second = data["result"]["trades"]
+            assert second["id"] == first["id"] + 1
+            assert (second["price"], second["amount"]) == (2, 1)
+            assert second["taker_order_id"] == first["taker_order_id"]
+            assert second["taker_side"] == 1
+
+            response = await session.get(
+                f"{self.server_address}/agg_trades",
+                json={"symbol_pair": "btc_eth", "limit": 1},
+            )
+            data = await response.json()
+            [trade] = data["result"]["trades"]
+            assert (trade["first_id"], trade["last_id"]) == (first["id"], second["id"])
+            assert (trade["price"], trade["amount"]) == (2, 2)
+
+            response = await session.get(
+                f"{self.server_address}/trades", json={"symbol_pair": "btc_bpm"}
+            )
+            data = await response.json()
+            assert data["error_code"] == 455
+
+    @unittest_run_loop
+    async def test_get_tickers(self):
+        pair = SymbolPair("btc", "eth")
+        await self.model_manager.create_limit(pair, 2, Order.Side.Sell, 1, "Vladimir")
+        await self.model_manager.create_market(pair, Order.Side.Buy, 1, "Ewriji")
+
+        async with aiohttp.ClientSession() as session:
+            response = await session.get(f"{self.server_address}/ticker")
+            data = await response.json()
+            assert data["success"] is True
+            assert set(data["result"]) == {
+                str(pair) for pair in self.model_manager.pairs
+            }
+            assert data["result"]["btc/eth"]["last_price"] == 2
+            assert data["result"]["btc/eth"]["trades"] >= 1
+
+            response = await session.get(
+                f"{self.server_address}/ticker", json={"symbol_pair": "btc_eth"}
+            )
+            data = await response.json()
+            assert list(data["result"]) == ["btc/eth"]
+
+            response = await session.get(
+                f"{self.server_address}/ticker", json={"symbol_pair": "btc_bpm"}
+            )
+            data = await response.json()
+            assert data["error_code"] == 455
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+from exchange.core.entities import SymbolPair
+from exchange.core.entities.order import Order
+from exchange.core.errors import InsufficientFunds
+from exchange.core.exchange import Exchange
+from exchange.core.sequencer import PairSequencer
+
+
+PAIR = SymbolPair("btc", "usdt")
+
+
+@pytest.fixture
+def exchange():
+    mock_exchange = Exchange()
+    mock_exchange.create_pair(PAIR)
+    mock_exchange.create_acc("Vladimir", dict(btc=100, usdt=100))
+    mock_exchange.create_acc("Ewriji", dict(btc=100, usdt=100))
+    return mock_exchange
+
+
+@pytest.mark.asyncio
+async def test_commands_are_executed_in_order():
+    sequencer = PairSequencer()
+    sequencer.start()
+    executed = []
+
+    async def command(number: int) -> int:
+        await asyncio.sleep(0.01 if number % 2 else 0)
+        executed.append(number)
+        return number
+
+    results = await asyncio.gather(
+        *(
+            sequencer.submit(lambda number=number: command(number))
+            for number in range(6)
+        )
+    )
+    await sequencer.stop()
+
+    assert results == list(range(6))
+    assert executed == list(range(6))
+
+
+@pytest.mark.asyncio
+async def test_failed_commands():
+    sequencer = PairSequencer()
+    sequencer.start()
+
+    async def cancelled() -> None:
+        raise asyncio.CancelledError
+
+    async def interrupted() -> None:
+        raise KeyboardInterrupt
+
+    async def command() -> int:
+        return 1
+
+    # a cancel or an interrupt of a command doesn't stop the sequencer
+    with pytest.raises(asyncio.CancelledError):
+        await sequencer.submit(cancelled)
+    with pytest.raises(KeyboardInterrupt):
+        await sequencer.submit(interrupted)
+    assert await asyncio.wait_for(sequencer.submit(command), 1) == 1
+
+    # commands queued behind a stop are cancelled instead of hanging
+    blocked = asyncio.Event()
+
+    async def block() -> None:
+        await blocked.wait()
+
+    running = asyncio.ensure_future(sequencer.submit(block))
+    queued = asyncio.ensure_future(sequencer.submit(command))
+    await asyncio.sleep(0)
+    await sequencer.stop()
+    for future in (running, queued):
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(future, 1)
+
+
+@pytest.mark.asyncio
+async def test_sequenced_exchange(exchange: Exchange):
+    exchange.start_sequencers()
+    assert exchange.is_sequenced
+
+    makers = await asyncio.gather(
+        *(
+            exchange.create_limit(PAIR, 1 + i, Order.Side.Sell, 1, "Ewriji")
+            for i in range(5)
+        )
+    )
+    taker = await exchange.create_limit(PAIR, 3, Order.Side.Buy, 2.5, "Vladimir")
+
+    assert [maker.status for maker in makers[:2]] == [Order.Status.Closed] * 2
+    assert makers[2].status == Order.Status.Opened
+    assert taker.status == Order.Status.Closed
+    assert exchange.get_account("Vladimir").balance["usdt"] == 100 - 1 - 2 - 1.5
+
+    await exchange.cancel_order(PAIR, makers[4].order_id)
+    assert makers[4].order_id not in exchange.get_order_book(PAIR)
+
+    with pytest.raises(InsufficientFunds):
+        await exchange.create_limit(PAIR, 1, Order.Side.Buy, 1000, "Vladimir")
+
+    await exchange.stop_sequencers()
+    assert not exchange.is_sequenced
+
+
+@pytest.mark.asyncio
+async def test_pairs_created_after_start(exchange: Exchange):
+    exchange.start_sequencers()
+    pair = SymbolPair("late", "usdt")
+    exchange.create_pair(pair)
+    assert exchange.is_sequenced
+    assert pair in exchange._sequencers
+
+    exchange.delete_pair(pair)
+    assert pair not in exchange._sequencers
+    await exchange.stop_sequencers()
+    assert not exchange.is_sequenced
+    assert not exchange._stopping_sequencers
+
+    # nothing is started for new pairs once sequencers are stopped
+    exchange.create_pair(pair)
+    assert not exchange._sequencers
+
+
+@pytest.mark.asyncio
+async def test_start_without_pairs():
+    exchange = Exchange()
+    exchange.start_sequencers()
+    exchange.create_pair(PAIR)
+    assert exchange.is_sequenced
+    assert PAIR in exchange._sequencers
+    await exchange.stop_sequencers()
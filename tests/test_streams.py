@@ -0,0 +1,80 @@
+import asyncio
+import json
+import typing as t
+
+import pytest
+from exchange.core.entities import SymbolPair
+from exchange.core.entities.order_book import Depth
+from exchange.server.streams import depth_message, MarketClient, trades_message
+
+
+PAIR = SymbolPair("btc", "usdt")
+
+
+class Socket:
+    def __init__(self) -> None:
+        self.sent: t.List[t.Any] = []
+
+    async def send_str(self, message: str) -> None:
+        self.sent.append(json.loads(message))
+
+
+async def write(client: MarketClient) -> t.List[t.Any]:
+    writer = asyncio.create_task(client.write_forever())
+    await asyncio.sleep(0.01)
+    writer.cancel()
+    return client.ws.sent  # type: ignore
+
+
+def diff(client: MarketClient, version: int, bids: t.Dict[float, float]) -> None:
+    client.diff(PAIR, version, bids, {}, depth_message(PAIR, version, bids, {}))
+
+
+def trade(client: MarketClient, time: float, price: float) -> None:
+    trades = [(price, 1.0, "buy")]
+    client.trades(PAIR, time, trades, trades_message(PAIR, time, trades))
+
+
+@pytest.mark.asyncio
+async def test_diffs_before_snapshot():
+    client = MarketClient(Socket())  # type: ignore
+    client.follow(PAIR)
+    # the diff is older than the snapshot, the next one is merged after it
+    diff(client, 1, {1: 1})
+    diff(client, 3, {2: 1})
+    client.snapshot(PAIR, Depth(2, [(1, 1)], [(5, 1)]))
+    diff(client, 2, {1: 2})
+
+    sent = await write(client)
+    assert [(data["snapshot"], data["version"]) for data in sent] == [
+        (True, 2),
+        (False, 3),
+    ]
+    assert sent[1]["bids"] == [[2, 1], [1, 1]]
+
+
+@pytest.mark.asyncio
+async def test_conflation_of_lagging_client():
+    client = MarketClient(Socket(), maxsize=2)  # type: ignore
+    client.follow(PAIR)
+    client.snapshot(PAIR, Depth(0, [], []))
+    diff(client, 1, {1: 1})
+    # the client is behind, diffs and trades are merged
+    diff(client, 2, {1: 2, 2: 1})
+    diff(client, 3, {1: 3})
+    for time in range(3):
+        trade(client, time, 10 + time)
+    assert client.conflated == 5
+
+    sent = await write(client)
+    assert [data["channel"] for data in sent] == ["depth", "depth", "depth", "trades"]
+    assert (sent[2]["version"], sent[2]["bids"]) == (3, [[2, 1], [1, 3]])
+    # only the most recent trades are kept
+    assert sent[3]["time"] == 2
+    assert sent[3]["trades"] == [[11, 1, "buy"], [12, 1, "buy"]]
+
+    # the client caught up, so messages are queued again
+    diff(client, 4, {1: 4})
+    client.unfollow(PAIR)
+    diff(client, 5, {1: 5})
+    assert [data["version"] for data in (await write(client))[4:]] == [4]
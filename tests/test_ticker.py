@@ -0,0 +1,49 @@
+import random
+
+from exchange.core.candles import summarize
+from exchange.core.ticker import RollingTicker
+
+
+def trade(ticker: RollingTicker, time_ms: int, price: float, amount: float = 1):
+    ticker.add(time_ms, summarize([(price, amount, "buy")]))
+
+
+def test_rolling_window():
+    ticker = RollingTicker(window_ms=100, bucket_ms=10)
+    assert ticker.stats(0).last_price is None
+
+    for time_ms, price in ((0, 4), (5, 6), (30, 2), (55, 3)):
+        trade(ticker, time_ms, price)
+    stats = ticker.stats(60)
+    assert (stats.open_price, stats.high_price, stats.low_price) == (4, 6, 2)
+    assert (stats.last_price, stats.price_change, stats.price_change_percent) == (
+        3,
+        -1,
+        -25,
+    )
+    assert (stats.volume, stats.quote_volume, stats.trades) == (4, 15, 4)
+    assert stats.weighted_avg_price == 15 / 4
+    assert (stats.open_time, stats.close_time) == (0, 55)
+
+    # the first bucket leaves the window with the high of 6
+    stats = ticker.stats(110)
+    assert (stats.open_price, stats.high_price, stats.low_price) == (2, 3, 2)
+    assert (stats.volume, stats.trades) == (2, 2)
+
+    # the last price is kept after every trade left the window
+    stats = ticker.stats(1000)
+    assert (stats.last_price, stats.open_price, stats.volume) == (3, None, 0)
+
+
+def test_against_full_scan():
+    ticker = RollingTicker(window_ms=1000, bucket_ms=1)
+    trades = []
+    for time_ms in range(0, 5000, 3):
+        price = random.uniform(1, 100)
+        trades.append((time_ms, price))
+        trade(ticker, time_ms, price)
+
+        stats = ticker.stats(time_ms)
+        window = [price for start, price in trades if start > time_ms - 1000]
+        assert (stats.high_price, stats.low_price) == (max(window), min(window))
+        assert stats.trades == len(window)
@@ -0,0 +1,51 @@
+from exchange.core.trade_tape import BUY, NO_ORDER, NO_TAKER, SELL, TradeTape
+
+
+def test_bounded_tape():
+    tape = TradeTape(capacity=3)
+    assert tape.recent(10)["id"].tolist() == []
+
+    for price in range(1, 6):
+        tape.append(price * 10 ** 6, 10 ** 8, price, 100 + price, BUY, price * 1000)
+
+    assert (len(tape), tape.first_id, tape.sequence) == (3, 2, 5)
+    trades = tape.recent(10)
+    assert trades["id"].tolist() == [2, 3, 4]
+    assert trades["price"].tolist() == [3, 4, 5]
+    assert trades["amount"].tolist() == [1, 1, 1]
+    assert trades["maker_order_id"].tolist() == [3, 4, 5]
+    assert trades["taker_order_id"].tolist() == [103, 104, 105]
+    assert trades["time"].tolist() == [3000, 4000, 5000]
+    assert tape.recent(1)["id"].tolist() == [4]
+
+
+def test_aggregated_trades():
+    tape = TradeTape()
+    # a buyer takes two makers at 1 and one at 2, a seller takes one at 2
+    for maker_id, price, taker_id, side, time_ms in (
+        (1, 1, 10, BUY, 100),
+        (2, 1, 10, BUY, 100),
+        (3, 2, 10, BUY, 100),
+        (4, 2, 11, SELL, 200),
+        # fills of an auction are not merged
+        (5, 3, NO_ORDER, NO_TAKER, 300),
+        (6, 3, NO_ORDER, NO_TAKER, 300),
+    ):
+        tape.append(price * 10 ** 6, 2 * 10 ** 8, maker_id, taker_id, side, time_ms)
+
+    trades = tape.aggregated(10)
+    assert trades["first_id"].tolist() == [0, 2, 3, 4, 5]
+    assert trades["last_id"].tolist() == [1, 2, 3, 4, 5]
+    assert trades["price"].tolist() == [1, 2, 2, 3, 3]
+    assert trades["amount"].tolist() == [4, 2, 2, 2, 2]
+    assert trades["taker_side"].tolist() == [BUY, BUY, SELL, NO_TAKER, NO_TAKER]
+
+    assert tape.aggregated(2)["first_id"].tolist() == [4, 5]
+    assert tape.aggregated(2, from_id=1)["first_id"].tolist() == [1, 2]
+    assert tape.aggregated(10, start_ms=150, end_ms=300)["first_id"].tolist() == [
+        3,
+        4,
+        5,
+    ]
+    assert tape.aggregated(10, end_ms=100)["amount"].tolist() == [4, 2]
+    assert tape.aggregated(10, start_ms=1000)["first_id"].tolist() == []
@@ -0,0 +1,70 @@
+import asyncio
+from collections import defaultdict
+
+import pytest
+from exchange.core.entities import SymbolPair
+from exchange.core.entities.account import Account
+from exchange.core.entities.order import Order
+from exchange.core.entities.order_book import OrderBook
+from exchange.core.match_model import MatchModel
+from exchange.core.yield_policy import YieldPolicy
+
+
+PAIR = SymbolPair("btc", "usdt")
+
+
+def test_budget_of_fills():
+    budget = YieldPolicy(fills=3, interval_us=None).budget()
+    assert [budget.spend() for _ in range(7)] == [
+        False,
+        False,
+        True,
+        False,
+        False,
+        True,
+        False,
+    ]
+
+    budget = YieldPolicy(fills=None, interval_us=0).budget()
+    assert budget.spend()
+
+    budget = YieldPolicy.synchronous().budget()
+    assert not any(budget.spend() for _ in range(1000))
+
+
+@pytest.mark.parametrize(
+    "policy, slices",
+    [
+        (YieldPolicy(fills=10, interval_us=None), 10),
+        (YieldPolicy(fills=1000, interval_us=None), 0),
+        (YieldPolicy.synchronous(), 0),
+    ],
+)
+@pytest.mark.asyncio
+async def test_sweep_slices(policy: YieldPolicy, slices: int):
+    account = Account(name="Vladimir", balance=defaultdict(float), open_orders={})
+    order_book = OrderBook()
+    for i in range(100):
+        order_book.add(
+            Order(1, Order.Side.Sell, PAIR, account, Order.Type.Limit, 1 + i)
+        )
+    taker = Order(100, Order.Side.Buy, PAIR, account, Order.Type.Limit, 100)
+
+    switches = 0
+
+    async def count_switches() -> None:
+        nonlocal switches
+        while True:
+            await asyncio.sleep(0)
+            switches += 1
+
+    counter = asyncio.create_task(count_switches())
+    await asyncio.sleep(0)
+    switches = 0
+
+    reports = await MatchModel.limit_match(taker, order_book, policy)
+    counter.cancel()
+
+    assert len(reports) == 200
+    assert taker.status == Order.Status.Closed
+    assert switches == slices